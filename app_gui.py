@@ -1,25 +1,63 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import subprocess
-import threading
+import tempfile
+import time
+import json
 import os
 import sys
 
+STAGE_LABELS = {
+    'prescan': "Pre-escaneo del STEP",
+    'symmetry': "Buscando simetría",
+    'load': "Cargando STEP",
+    'fingerprints': "Huellas de caras (revisión)",
+    'mesh': "Mallando caras",
+    'extract': "Extrayendo caras",
+    'analyze': "Analizando familias",
+    'legacy': "Clustering de respaldo",
+    'merge': "Fusionando familias",
+    'preview': "Vista previa (topológica)",
+    'refine': "Refinando (espacial + CoG exacto)",
+}
+
+# Estados de un trabajo de la cola
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "En cola", "Procesando", "✅ OK", "❌ Error", "⛔ Cancelado"
+
+def kill_job(process):
+    """Mata el trabajo con todo su grupo de procesos (run_process y los hijos que haya lanzado)."""
+    if sys.platform == "win32":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], capture_output=True)
+    else:
+        import signal
+        try:
+            os.killpg(process.pid, signal.SIGKILL)  # start_new_session: el pgid es el pid del trabajo
+        except ProcessLookupError:
+            pass
+    process.wait()
+
 class HeatStakeLauncher:
     def __init__(self, root):
         self.root = root
         self.root.title("Launcher GM - Heat Stakes")
-        self.root.geometry("500x420")
-        self.root.resizable(False, False)
-        
+        self.root.geometry("640x680")
+        self.root.minsize(560, 600)
+
         style = ttk.Style()
         style.theme_use('clam')
-        
+
         # Variables
-        self.file_path = tk.StringVar()
         self.view_3d = tk.BooleanVar(value=True)
         self.show_rejected = tk.BooleanVar(value=False)
         self.custom_rules = tk.BooleanVar(value=True)
+        self.progressive = tk.BooleanVar(value=False)
+        self.deadline = tk.IntVar(value=0)
+        self.parallel = tk.IntVar(value=max(1, min(4, (os.cpu_count() or 2) // 2)))
+
+        # Cola de trabajos: un dict por archivo (estado, proceso, canal de eventos, resultado)
+        self.jobs = {}
+        self._job_counter = 0
+        self._polling = False
 
         # UI Layout
         main_frame = ttk.Frame(root, padding="20")
@@ -27,12 +65,26 @@ class HeatStakeLauncher:
 
         ttk.Label(main_frame, text="Detector de Heat Stakes GM", font=("Arial", 16, "bold")).pack(pady=(0, 20))
 
-        # Archivo
-        file_frame = ttk.LabelFrame(main_frame, text="1. Archivo STEP", padding="10")
-        file_frame.pack(fill=tk.X, pady=5)
-        self.lbl_file = ttk.Label(file_frame, text="Sin archivo...", foreground="gray")
-        self.lbl_file.pack(side=tk.LEFT, fill=tk.X, expand=True)
-        ttk.Button(file_frame, text="📂 Buscar", command=self.browse_file).pack(side=tk.RIGHT)
+        # Archivos (cola)
+        file_frame = ttk.LabelFrame(main_frame, text="1. Archivos STEP", padding="10")
+        file_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        btns = ttk.Frame(file_frame)
+        btns.pack(fill=tk.X)
+        ttk.Button(btns, text="📂 Agregar", command=self.browse_file).pack(side=tk.LEFT)
+        ttk.Button(btns, text="🗑 Quitar", command=self.remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="⛔ Cancelar", command=self.cancel_selected).pack(side=tk.LEFT)
+        ttk.Button(btns, text="🧹 Limpiar terminados", command=self.clear_finished).pack(side=tk.RIGHT)
+
+        columns = ("archivo", "estado", "tiempo", "stakes")
+        self.table = ttk.Treeview(file_frame, columns=columns, show="headings", height=8)
+        for col, text, width, anchor in (("archivo", "Archivo", 230, "w"), ("estado", "Estado", 190, "w"),
+                                         ("tiempo", "Tiempo", 70, "e"), ("stakes", "Stakes", 60, "e")):
+            self.table.heading(col, text=text)
+            self.table.column(col, width=width, anchor=anchor, stretch=(col in ("archivo", "estado")))
+        scroll = ttk.Scrollbar(file_frame, orient=tk.VERTICAL, command=self.table.yview)
+        self.table.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y, pady=(5, 0))
+        self.table.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
 
         # Opciones
         opts_frame = ttk.LabelFrame(main_frame, text="2. Configuración", padding="10")
@@ -40,87 +92,279 @@ class HeatStakeLauncher:
         ttk.Checkbutton(opts_frame, text="Ver en 3D", variable=self.view_3d).pack(anchor="w")
         ttk.Checkbutton(opts_frame, text="Ver Rechazados (Debug)", variable=self.show_rejected).pack(anchor="w")
         ttk.Checkbutton(opts_frame, text="Fusión de Familias", variable=self.custom_rules).pack(anchor="w")
-        
+        ttk.Checkbutton(opts_frame, text="Vista previa rápida y luego refinado",
+                        variable=self.progressive).pack(anchor="w")
+        deadline_frame = ttk.Frame(opts_frame)
+        deadline_frame.pack(anchor="w")
+        ttk.Label(deadline_frame, text="Límite por archivo (s, 0 = sin límite):").pack(side=tk.LEFT)
+        ttk.Spinbox(deadline_frame, from_=0, to=3600, increment=30, width=6,
+                    textvariable=self.deadline).pack(side=tk.LEFT, padx=5)
+        parallel_frame = ttk.Frame(opts_frame)
+        parallel_frame.pack(anchor="w")
+        ttk.Label(parallel_frame, text="Archivos en paralelo:").pack(side=tk.LEFT)
+        ttk.Spinbox(parallel_frame, from_=1, to=max(1, os.cpu_count() or 1), width=4,
+                    textvariable=self.parallel).pack(side=tk.LEFT, padx=5)
+
         # Botón Run
-        self.btn_run = ttk.Button(main_frame, text="🚀 EJECUTAR", command=self.run_process)
+        self.btn_run = ttk.Button(main_frame, text="🚀 EJECUTAR COLA", command=self.run_process)
         self.btn_run.pack(fill=tk.X, pady=15)
-        
-        # Progreso
-        self.progress = ttk.Progressbar(main_frame, orient=tk.HORIZONTAL, mode='indeterminate')
+
+        # Progreso (trabajos terminados / total)
+        self.progress = ttk.Progressbar(main_frame, orient=tk.HORIZONTAL, mode='determinate')
         self.status_var = tk.StringVar(value="Listo.")
         ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN).pack(side=tk.BOTTOM, fill=tk.X)
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def browse_file(self):
-        f = filedialog.askopenfilename(filetypes=[("STEP", "*.stp *.step")])
-        if f:
-            self.file_path.set(f)
-            self.lbl_file.config(text=os.path.basename(f), foreground="black")
+        files = filedialog.askopenfilenames(filetypes=[("STEP", "*.stp *.step"),
+                                                       ("Escaneo", "*.stl *.ply *.xyz")])
+        queued = {job['path'] for job in self.jobs.values() if job['status'] in (QUEUED, RUNNING)}
+        for f in files:
+            if f in queued:
+                continue
+            self._job_counter += 1
+            job_id = f"job{self._job_counter}"
+            self.jobs[job_id] = {'path': f, 'status': QUEUED, 'detail': "", 'process': None,
+                                 'events_path': None, 'result_path': None, 'offset': 0, 'buffer': "",
+                                 'stakes': None, 't0': None, 'elapsed': None, 'stage_t0': None}
+            self.table.insert("", tk.END, iid=job_id, values=(os.path.basename(f), QUEUED, "", ""))
+        self._update_summary()
+
+    def remove_selected(self):
+        for job_id in self.table.selection():
+            if self.jobs[job_id]['status'] == RUNNING:
+                continue  # Primero hay que cancelarlo
+            del self.jobs[job_id]
+            self.table.delete(job_id)
+        self._update_summary()
+
+    def clear_finished(self):
+        for job_id in [j for j, job in self.jobs.items() if job['status'] in (DONE, FAILED, CANCELLED)]:
+            del self.jobs[job_id]
+            self.table.delete(job_id)
+        self._update_summary()
+
+    def cancel_selected(self):
+        for job_id in self.table.selection():
+            job = self.jobs[job_id]
+            if job['status'] == RUNNING:
+                kill_job(job['process'])  # Inmediato: sin esperar a que el worker termine la etapa
+                self._finish_job(job_id, CANCELLED)
+            elif job['status'] == QUEUED:
+                job['status'] = CANCELLED
+                self._refresh_row(job_id)
+        self._update_summary()
+        self._start_pending()
 
     def run_process(self):
-        if not self.file_path.get():
-            messagebox.showwarning("!", "Selecciona un archivo.")
+        if not any(job['status'] == QUEUED for job in self.jobs.values()):
+            messagebox.showwarning("!", "Agrega archivos a la cola.")
             return
 
-        self.btn_run.config(state="disabled")
-        self.progress.pack(fill=tk.X, pady=5)
-        self.progress.start(10)
-        self.status_var.set("⏳ Procesando... (Revisa la consola para logs)")
-        
-        # Ejecutar en hilo
-        threading.Thread(target=self._execute_subprocess, daemon=True).start()
-
-    def _execute_subprocess(self):
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        script_path = os.path.join(current_dir, "run_process.py")
-        
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_process.py")
         if not os.path.exists(script_path):
-            self.root.after(0, lambda: self._on_finish(1, f"Falta run_process.py en {current_dir}"))
+            messagebox.showerror("Error", f"Falta run_process.py en {os.path.dirname(script_path)}")
             return
 
-        cmd = [sys.executable, script_path, self.file_path.get()]
+        self.progress.pack(fill=tk.X, pady=5)
+        if not self._polling:
+            self._polling = True
+            self.root.after(200, self._poll_jobs)
+        self._start_pending()
+
+    def _start_pending(self):
+        """Lanza trabajos en cola hasta el límite de paralelismo (solo con la cola en marcha)."""
+        if not self._polling:
+            return
+        running = sum(1 for job in self.jobs.values() if job['status'] == RUNNING)
+        limit = max(1, self.parallel.get())
+        for job_id, job in self.jobs.items():
+            if running >= limit:
+                break
+            if job['status'] == QUEUED:
+                self._launch(job_id)
+                running += 1
+        self._update_summary()
+
+    def _launch(self, job_id):
+        job = self.jobs[job_id]
+        # Canales por trabajo: eventos de progreso (JSON-lines) y resultado estructurado (JSON)
+        fd, job['events_path'] = tempfile.mkstemp(prefix="heatstakes_", suffix=".jsonl")
+        os.close(fd)
+        fd, job['result_path'] = tempfile.mkstemp(prefix="heatstakes_", suffix=".json")
+        os.close(fd)
+        job['offset'], job['buffer'] = 0, ""
+
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_process.py")
+        cmd = [sys.executable, script_path, job['path']]
         if self.view_3d.get(): cmd.append("--view")
         if self.show_rejected.get(): cmd.append("--show-rejected")
         if self.custom_rules.get(): cmd.append("--custom-rules")
+        if self.progressive.get(): cmd.append("--progressive")
+        if self.deadline.get() > 0: cmd += ["--deadline", str(self.deadline.get())]
+        cmd += ["--events", job['events_path'], "--result-json", job['result_path']]
 
         # CONFIGURACIÓN DE CONSOLA:
         # En Windows: CREATE_NEW_CONSOLE (0x10) abre una ventana negra nueva con los logs.
         # En Linux: Se mostrará en la terminal donde lanzaste el app_gui.py.
+        # Cada trabajo en su propio grupo de procesos: cancelar mata también a sus hijos (workers).
         creation_flags = 0
         if sys.platform == "win32":
-            creation_flags = 0x00000010 # CREATE_NEW_CONSOLE
+            creation_flags = 0x00000010 | 0x00000200 # CREATE_NEW_CONSOLE | CREATE_NEW_PROCESS_GROUP
 
+        job['t0'] = time.time()
         try:
-            # IMPORTANTE: Hemos quitado stdout=PIPE y stderr=PIPE.
-            # Ahora los logs van directo a la consola del usuario.
-            process = subprocess.Popen(
-                cmd, 
-                text=True, 
-                creationflags=creation_flags
-            )
-            
-            # Esperamos a que el proceso termine
-            process.wait()
-            
-            # Volver al hilo principal
-            self.root.after(0, lambda: self._on_finish(process.returncode, None))
+            job['process'] = subprocess.Popen(cmd, text=True, creationflags=creation_flags,
+                                              start_new_session=sys.platform != "win32")
         except Exception as e:
-            self.root.after(0, lambda: self._on_finish(1, str(e)))
-
-    def _on_finish(self, code, error_msg):
-        self.progress.stop()
-        self.progress.pack_forget()
-        self.btn_run.config(state="normal")
-        
-        if code == 0:
-            self.status_var.set("✅ Finalizado.")
+            job['detail'] = str(e)
+            self._finish_job(job_id, FAILED)
+            return
+        job['status'] = RUNNING
+        job['detail'] = "Iniciando..."
+        self._refresh_row(job_id)
+
+    def _poll_jobs(self):
+        for job_id, job in list(self.jobs.items()):
+            if job['status'] != RUNNING:
+                continue
+            self._read_events(job_id)
+            code = job['process'].poll()
+            if code is not None:
+                self._read_events(job_id)
+                self._finish_job(job_id, DONE if code == 0 else FAILED)
+            else:
+                self._refresh_row(job_id)
+
+        self._start_pending()
+        if any(job['status'] == RUNNING for job in self.jobs.values()):
+            self.root.after(200, self._poll_jobs)
         else:
-            self.status_var.set("❌ Error.")
-            if error_msg:
-                messagebox.showerror("Error", f"Fallo en el proceso:\n{error_msg}")
+            self._polling = False
+            self.progress.pack_forget()
+
+    def _read_events(self, job_id):
+        job = self.jobs[job_id]
+        try:
+            with open(job['events_path'], encoding='utf-8') as f:
+                f.seek(job['offset'])
+                chunk = f.read()
+                job['offset'] = f.tell()
+        except OSError:
+            chunk = ""
+
+        job['buffer'] += chunk
+        *lines, job['buffer'] = job['buffer'].split("\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    self._handle_event(job, json.loads(line))
+                except ValueError:
+                    pass
+
+    def _handle_event(self, job, event):
+        kind = event.get('event')
+        stage = event.get('stage')
+        label = STAGE_LABELS.get(stage, stage)
+
+        if kind == 'stage_started':
+            job['stage_t0'] = event['t']
+            job['detail'] = f"⏳ {label}..."
+        elif kind == 'progress':
+            done, total = event['done'], event['total']
+            pct = 100.0 * done / total if total else 100.0
+            eta = ""
+            if done > 0 and stage == 'extract' and job['stage_t0']:
+                remaining = (event['t'] - job['stage_t0']) * (total - done) / done
+                eta = f" | ETA {remaining:.0f}s"
+            job['detail'] = f"⏳ {label}: {pct:.0f}%{eta}"
+        elif kind == 'stakes_found':
+            if event.get('source') == 'final':
+                job['stakes'] = event.get('count', 0)
             else:
-                messagebox.showwarning("Aviso", "El proceso se cerró con errores (Revisa la consola).")
+                job['stakes'] = (job['stakes'] or 0) + event.get('count', 0)
+        elif kind == 'preview_ready':
+            job['stakes'] = event.get('count', 0)
+            job['detail'] = "👀 Vista previa, refinando..."
+        elif kind == 'refined':
+            job['stakes'] = event.get('count', 0)
+            job['detail'] = (f"🔁 Refinado (+{event.get('added', 0)} / -{event.get('removed', 0)} / "
+                             f"↔{event.get('moved', 0)})")
+
+    def _finish_job(self, job_id, status):
+        job = self.jobs[job_id]
+        job['status'] = status
+        job['elapsed'] = time.time() - job['t0'] if job['t0'] else None
+
+        # Resultado estructurado que escribe el worker (run_process --result-json)
+        result = {}
+        if job['result_path'] and status != CANCELLED:
+            try:
+                with open(job['result_path'], encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = {}
+        if 'stakes' in result:
+            job['stakes'] = result['stakes']
+        if 'seconds' in result:
+            job['elapsed'] = result['seconds']
+        if status == DONE:
+            job['detail'] = "⚠️ Parcial (límite de tiempo)" if result.get('partial') else ""
+        elif status == FAILED:
+            job['detail'] = result.get('error') or job['detail'] or "Revisa la consola"
+        else:
+            job['detail'] = ""
+
+        for key in ('events_path', 'result_path'):
+            if job[key] and os.path.exists(job[key]):
+                try:
+                    os.remove(job[key])
+                except OSError:
+                    pass
+            job[key] = None
+        job['process'] = None
+        self._refresh_row(job_id)
+        self._update_summary()
+
+    def _refresh_row(self, job_id):
+        job = self.jobs[job_id]
+        elapsed = job['elapsed'] if job['elapsed'] is not None else (
+            time.time() - job['t0'] if job['status'] == RUNNING and job['t0'] else None)
+        status = job['status'] if not job['detail'] else (
+            job['detail'] if job['status'] == RUNNING else f"{job['status']}: {job['detail']}")
+        self.table.item(job_id, values=(
+            os.path.basename(job['path']), status,
+            f"{elapsed:.1f}s" if elapsed is not None else "",
+            job['stakes'] if job['stakes'] is not None else ""
+        ))
+
+    def _update_summary(self):
+        counts = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in self.jobs.values():
+            counts[job['status']] += 1
+        finished = counts[DONE] + counts[FAILED] + counts[CANCELLED]
+        total = len(self.jobs)
+        self.progress.config(maximum=max(total, 1), value=finished)
+        stakes = sum(job['stakes'] or 0 for job in self.jobs.values() if job['status'] == DONE)
+        if not total:
+            self.status_var.set("Listo.")
+        elif counts[RUNNING] or counts[QUEUED]:
+            self.status_var.set(f"⏳ {counts[RUNNING]} en proceso | {counts[QUEUED]} en cola | "
+                                f"{finished}/{total} terminados | Heat stakes: {stakes}")
+        else:
+            self.status_var.set(f"✅ Finalizado: {counts[DONE]} OK, {counts[FAILED]} con error, "
+                                f"{counts[CANCELLED]} cancelados | Heat stakes: {stakes}")
+
+    def _on_close(self):
+        running = [job_id for job_id, job in self.jobs.items() if job['status'] == RUNNING]
+        if running and not messagebox.askyesno("Salir", f"Hay {len(running)} trabajos en proceso. ¿Cancelarlos y salir?"):
+            return
+        for job_id in running:
+            kill_job(self.jobs[job_id]['process'])
+            self._finish_job(job_id, CANCELLED)
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = HeatStakeLauncher(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
@@ -0,0 +1,112 @@
+# bench_memory.py
+"""
+Benchmark de memoria: modo normal contra modo lean (cilindros sin TopoDS_Face,
+stakes con índices en lugar de listas copiadas).
+Cada modo corre en un proceso nuevo que detecta todos los archivos en serie
+y conserva los resultados (como un lote que arma el reporte al final).
+El modo lean sigue siendo experimental hasta tener estas cifras sobre un
+ensamble grande real.
+Ejecuta:
+    python bench_memory.py ensamble_grande.step
+    python bench_memory.py Piezas/*.step --repeat 3 --csv memoria.csv
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+
+def rss_mb():
+    """RSS actual del proceso en MB (Linux: /proc; otros: pico de getrusage)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return peak_mb()
+
+
+def peak_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def worker(files, lean):
+    import gc
+    from src.api import detect
+    results, rows = [], []
+    for path in files:
+        t0 = time.perf_counter()
+        results.append(detect(path, config={'lean': lean}))
+        gc.collect()
+        rows.append({'file': os.path.basename(path), 'stakes': len(results[-1]),
+                     'seconds': time.perf_counter() - t0, 'rss_mb': rss_mb()})
+    print(json.dumps({'rows': rows, 'peak_mb': peak_mb()}))
+
+
+def run_mode(files, lean):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker"] + (["--lean"] if lean else []) + files
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "fallo del worker")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS antes/después del modo lean")
+    parser.add_argument("files", nargs="+", help="Archivos STEP del lote")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetir el lote N veces (simula lotes largos)")
+    parser.add_argument("--csv", default=None, help="Guardar las cifras (una fila por archivo y modo) como CSV")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--lean", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    files = [os.path.abspath(f) for f in args.files] * args.repeat
+    if args.worker:
+        worker(files, args.lean)
+        return 0
+
+    print(f"🧪 Benchmark de memoria: {len(files)} detecciones por modo")
+    report = {}
+    for lean in (False, True):
+        name = "lean" if lean else "normal"
+        print(f"   ⏳ Modo {name}...")
+        try:
+            report[name] = run_mode(files, lean)
+        except Exception as e:
+            print(f"❌ Error en modo {name}: {e}")
+            return 1
+
+    print("\n" + "="*60)
+    print("📊 RSS TRAS CADA ARCHIVO (MB)")
+    print("="*60)
+    print(f"   {'Archivo':<30} {'Stakes':>6} {'Normal':>10} {'Lean':>10}")
+    for normal, lean in zip(report['normal']['rows'], report['lean']['rows']):
+        flag = "" if normal['stakes'] == lean['stakes'] else "  ⚠️ stakes distintos"
+        print(f"   {normal['file'][:30]:<30} {normal['stakes']:>6} {normal['rss_mb']:>10.1f} {lean['rss_mb']:>10.1f}{flag}")
+
+    peak_normal, peak_lean = report['normal']['peak_mb'], report['lean']['peak_mb']
+    final_normal = report['normal']['rows'][-1]['rss_mb']
+    final_lean = report['lean']['rows'][-1]['rss_mb']
+    print("-"*60)
+    print(f"   Pico RSS:  normal {peak_normal:.1f} MB | lean {peak_lean:.1f} MB "
+          f"({100.0 * (1 - peak_lean / peak_normal):.1f}% menos)")
+    print(f"   RSS final: normal {final_normal:.1f} MB | lean {final_lean:.1f} MB "
+          f"({100.0 * (1 - final_lean / final_normal):.1f}% menos)")
+    print("="*60)
+
+    if args.csv:
+        import pandas as pd
+        rows = [dict(row, mode=name, peak_mb=report[name]['peak_mb']) for name in report for row in report[name]['rows']]
+        pd.DataFrame(rows).to_csv(args.csv, index=False)
+        print(f"💾 Cifras guardadas en: {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# bench_metrics.py
+"""
+Benchmark del pre-paso sobre la malla: métricas exactas (GProp/brepbndlib
+por cara) contra --mesh (malla + buffers de los cilindros + CoG exacto solo
+de los stakes finales).
+Cada modo corre en un proceso nuevo: la triangulación queda guardada en la
+forma y falsearía el modo exacto si se midiera después.
+Ejecuta:
+    python bench_metrics.py pieza.step
+    python bench_metrics.py Piezas/*.step --deflection 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+def worker(files, metrics, deflection):
+    from src.api import detect
+    from src.events import EventBus, CallbackSink
+    rows = []
+    for path in files:
+        stages = {}
+        bus = EventBus(quiet=True)
+        bus.subscribe(CallbackSink(lambda e: stages.__setitem__(e['stage'], e['elapsed']), kinds=['stage_finished']))
+        t0 = time.perf_counter()
+        result = detect(path, config={'metrics': metrics, 'mesh_deflection': deflection}, events=bus)
+        total = time.perf_counter() - t0
+        rows.append({'file': os.path.basename(path), 'stakes': len(result.stakes),
+                     'load': stages.get('load') or 0.0, 'mesh': stages.get('mesh') or 0.0,
+                     'total': total})
+    print(json.dumps(rows))
+
+
+def run_mode(files, metrics, deflection):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", metrics,
+           "--deflection", str(deflection)] + files
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "fallo del worker")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de detección: métricas exactas contra pre-paso de malla")
+    parser.add_argument("files", nargs="+", help="Archivos STEP")
+    parser.add_argument("--deflection", type=float, default=0.2, help="Flecha lineal del mallado (mm)")
+    parser.add_argument("--worker", default=None, choices=["exact", "mesh"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    files = [os.path.abspath(f) for f in args.files]
+    if args.worker:
+        worker(files, args.worker, args.deflection)
+        return 0
+
+    print(f"🧪 Benchmark de métricas: {len(files)} archivos (flecha {args.deflection} mm)")
+    report = {}
+    for metrics in ("exact", "mesh"):
+        print(f"   ⏳ Modo {metrics}...")
+        try:
+            report[metrics] = run_mode(files, metrics, args.deflection)
+        except Exception as e:
+            print(f"❌ Error en modo {metrics}: {e}")
+            return 1
+
+    print("\n" + "="*72)
+    print("📊 SEGUNDOS POR ARCHIVO (sin la carga del STEP)")
+    print("="*72)
+    print(f"   {'Archivo':<30} {'Stakes':>6} {'Exacto':>9} {'Malla':>9} {'(mallado)':>10} {'Ganancia':>9}")
+    sum_exact = sum_mesh = 0.0
+    for exact, mesh in zip(report['exact'], report['mesh']):
+        t_exact = exact['total'] - exact['load']
+        t_mesh = mesh['total'] - mesh['load']
+        sum_exact += t_exact
+        sum_mesh += t_mesh
+        flag = "" if exact['stakes'] == mesh['stakes'] else "  ⚠️ stakes distintos"
+        print(f"   {exact['file'][:30]:<30} {exact['stakes']:>6} {t_exact:>9.2f} {t_mesh:>9.2f} "
+              f"{mesh['mesh']:>10.2f} {t_exact / max(t_mesh, 1e-9):>8.1f}x{flag}")
+    print("-"*72)
+    print(f"   Total: exacto {sum_exact:.2f}s | malla {sum_mesh:.2f}s ({sum_exact / max(sum_mesh, 1e-9):.1f}x)")
+    print("="*72)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# compare_baseline.py
+"""
+Comparación de resultados contra una línea base (regresiones tras actualizar
+el entorno o cambiar umbrales).
+Ejecuta:
+    python compare_baseline.py heat_stakes_coordinates.csv Reportes/<pieza>/Reporte_<pieza>.xlsx
+    python compare_baseline.py Reportes_base/ Reportes/            (todas las piezas)
+    python compare_baseline.py Reportes/_store_base Reportes/_store (almacenes de resultados)
+
+Devuelve código 1 si hay stakes faltantes, sobrantes o desplazados (o piezas faltantes)
+y 2 si no se pudo leer la entrada o no se comparó ninguna pieza.
+"""
+import sys
+import argparse
+import numpy as np
+from src.baseline import load_source, compare_stakes, displacement_stats, is_regression
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparación contra línea base")
+    parser.add_argument("baseline", help="Archivo, carpeta de reportes o almacén de la línea base")
+    parser.add_argument("current", help="Archivo, carpeta de reportes o almacén actual")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="Distancia máx. para emparejar (mm)")
+    parser.add_argument("--shift", type=float, default=0.01, help="Desplazamiento que cuenta como cambio (mm)")
+    parser.add_argument("--output", default=None, help="CSV con el resumen por pieza")
+    parser.add_argument("--verbose", action="store_true", help="Listar cada stake con diferencias")
+    args = parser.parse_args()
+
+    try:
+        baseline = load_source(args.baseline)
+        current = load_source(args.current)
+    except Exception as e:
+        print(f"❌ No se pudo leer la entrada: {e}")
+        return 2
+
+    if not baseline:
+        print(f"❌ La línea base no tiene piezas: {args.baseline}")
+        return 2
+
+    # Un archivo suelto contra otro: se comparan aunque los nombres no coincidan
+    if len(baseline) == 1 and len(current) == 1 and set(baseline) != set(current):
+        current = {next(iter(baseline)): next(iter(current.values()))}
+
+    missing_parts = sorted(set(baseline) - set(current))
+    new_parts = sorted(set(current) - set(baseline))
+    rows, all_distances = [], []
+    regressions = 0
+
+    for part in sorted(set(baseline) & set(current)):
+        base, cur = baseline[part], current[part]
+        result = compare_stakes(base, cur, tolerance=args.tolerance, shift_tolerance=args.shift)
+        stats = displacement_stats(result['distances'])
+        all_distances.append(result['distances'])
+        regression = is_regression(result)
+        regressions += regression
+
+        rows.append({
+            "Pieza": part, "Base": len(base['stake_centroids']), "Actual": len(cur['stake_centroids']),
+            "Emparejados": result['matched'], "Faltantes": len(result['missing']),
+            "Sobrantes": len(result['extra']), "Desplazados": len(result['shifted']),
+            "Desp_Medio": round(stats['mean'], 4), "Desp_P95": round(stats['p95'], 4),
+            "Desp_Max": round(stats['max'], 4), "Regresion": regression
+        })
+
+        if args.verbose and regression:
+            print(f"\n⚠️ {part}")
+            for i in result['missing']:
+                c = base['stake_centroids'][i]
+                print(f"   ➖ Falta {base['stake_ids'][i]} en ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f})")
+            for i in result['extra']:
+                c = cur['stake_centroids'][i]
+                print(f"   ➕ Sobra {cur['stake_ids'][i]} en ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f})")
+            for (i_base, i_cur), d in zip(result['shifted'], result['shift_distance']):
+                print(f"   ↔ {base['stake_ids'][i_base]} → {cur['stake_ids'][i_cur]} | Δ={d:.3f}mm")
+
+    stats = displacement_stats(np.concatenate(all_distances) if all_distances else [])
+    print("\n" + "="*60)
+    print("📏 COMPARACIÓN CONTRA LÍNEA BASE")
+    print("="*60)
+    print(f"   Piezas comparadas: {len(rows)} | con regresión: {regressions}")
+    print(f"   Stakes emparejados: {sum(r['Emparejados'] for r in rows)}")
+    print(f"   ➖ Faltantes: {sum(r['Faltantes'] for r in rows)}")
+    print(f"   ➕ Sobrantes: {sum(r['Sobrantes'] for r in rows)}")
+    print(f"   ↔ Desplazados (> {args.shift}mm): {sum(r['Desplazados'] for r in rows)}")
+    print(f"   Desplazamiento: medio {stats['mean']:.4f} | mediana {stats['median']:.4f} | "
+          f"p95 {stats['p95']:.4f} | máx {stats['max']:.4f} mm")
+    if missing_parts:
+        print(f"   ❌ Piezas sin resultado actual: {len(missing_parts)}")
+        for part in missing_parts:
+            print(f"      • {part}")
+    if new_parts:
+        print(f"   ℹ️ Piezas nuevas (sin línea base): {len(new_parts)}")
+    print("="*60)
+
+    if args.output:
+        import pandas as pd
+        pd.DataFrame(rows).to_csv(args.output, index=False)
+        print(f"💾 Resumen guardado en: {args.output}")
+
+    if not rows:
+        # Sin nada comparado no hay aprobación posible (p. ej. rutas o nombres de pieza que no coinciden)
+        print("❌ No se comparó ninguna pieza")
+        return 2
+    return 1 if regressions or missing_parts else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,26 @@
 # diagnostic.py
+"""
+Diagnóstico por cilindro.
+Ejecuta:
+    python diagnostic.py pieza.step                 (traza + diagnostico_geometria.csv)
+    python diagnostic.py pieza.step --parquet       (traza en .parquet en lugar de .npz)
+    python diagnostic.py --query "reason == 'dbscan_noise' and radius < 3" Reportes/
+                                                    (consulta trazas guardadas, sin OCC)
+"""
+import os
 import sys
+import argparse
 import pandas as pd
-from src.geometry import GeometryProcessor
+from src.trace import DecisionTrace, REASONS, trace_path, load_traces
 
-def run_diagnostic(step_file):
+def run_diagnostic(step_file, parquet=False):
+    from src.geometry import GeometryProcessor
+    from src.analyzer import HeatStakeAnalyzer
     print(f"🕵️  DIAGNÓSTICO PROFUNDO: {step_file}")
     print("="*60)
-    
+
     geo = GeometryProcessor(step_file)
+    geo.EARLY_REJECT = False  # Queremos ver también los cilindros descartados
     try:
         geo.load_step()
         # Usamos la extracción topológica que ya tienes
@@ -16,8 +29,21 @@ def run_diagnostic(step_file):
         print(f"❌ Error fatal: {e}")
         return
 
+    # Pipeline real con traza: los descartados por la cascada quedan registrados
+    # pero no entran al análisis (igual que en una corrida normal)
+    trace = DecisionTrace(part=os.path.splitext(os.path.basename(step_file))[0])
+    trace.begin(cylinders)
+    analyzer = HeatStakeAnalyzer()
+    analyzer.trace = trace
+    kept = [c for c in cylinders if 'rejected_by' not in c]
+    topo, remaining = analyzer.analyze_topology(kept)
+    cluster, _ = analyzer.analyze_clusters_legacy(remaining)
+    trace.finish(topo + cluster)
+    trace.save(trace_path(step_file, ".parquet" if parquet else ".npz"))
+
     print(f"\n📊 Generando reporte de {len(cylinders)} geometrías encontradas...")
-    
+    columns = trace.columns()
+
     data = []
     for i, c in enumerate(cylinders):
         data.append({
@@ -28,25 +54,64 @@ def run_diagnostic(step_file):
             'Radio (mm)': round(c['radius'], 4),
             'Altura (mm)': round(c['height'], 4),
             'Aletas_Detectadas': c['connected_planes'], # ¡El dato clave!
-            'Es_HeatStake_Potencial': c['connected_planes'] >= 3
+            'Es_HeatStake_Potencial': c['connected_planes'] >= 3,
+            'Motivo': columns['reason'][i],
+            'Familia': columns['family'][i],
+            'Stake': columns['stake_id'][i]
         })
-    
+
     # Crear DataFrame y exportar
     df = pd.DataFrame(data)
-    
+    df['Motivo'] = pd.Categorical.from_codes(df['Motivo'], categories=[n or 'accepted' for n in REASONS])
+
     # Ordenar por distancia al origen (para encontrar el lejano fácil)
     df['Distancia_Origen'] = (df['X']**2 + df['Y']**2 + df['Z']**2)**0.5
     df = df.sort_values('Distancia_Origen', ascending=False)
-    
+
     output_file = "diagnostico_geometria.csv"
     df.to_csv(output_file, index=False)
-    
+
     print(f"\n💾 Reporte guardado en: {output_file}")
+    print("\n📉 Motivos de descarte:")
+    for reason, count in trace.summary().items():
+        print(f"   • {reason}: {count}")
     print("\n🔍 TOP 5 - POSIBLES HEAT STAKES FLOTANTES (Más lejanos):")
-    print(df.head(5)[['ID', 'Radio (mm)', 'Aletas_Detectadas', 'Distancia_Origen', 'X', 'Y', 'Z']].to_string())
+    print(df.head(5)[['ID', 'Radio (mm)', 'Aletas_Detectadas', 'Motivo', 'Distancia_Origen', 'X', 'Y', 'Z']].to_string())
+
+def run_query(expression, paths, output=None):
+    frame = load_traces(paths)
+    if frame.empty:
+        print("⚠️ No se encontraron trazas (Traza_*.npz / Traza_*.parquet)")
+        return
+    result = frame.query(expression) if expression else frame
+    print(f"🔎 {len(result)} de {len(frame)} cilindros en {frame['part'].nunique()} piezas")
+    if expression:
+        print(result.groupby('part', observed=True).size().sort_values(ascending=False).to_string())
+    else:
+        print(pd.crosstab(frame['part'], frame['reason']).to_string())
+    if output:
+        result.to_csv(output, index=False)
+        print(f"💾 Resultado guardado en: {output}")
+    else:
+        print(result.head(20).to_string())
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnóstico por cilindro")
+    parser.add_argument("paths", nargs="+", help="Archivo .step (o trazas/carpetas con --query)")
+    parser.add_argument("--parquet", action="store_true", help="Guardar la traza en .parquet")
+    parser.add_argument("--query", nargs="?", const="", default=None, metavar="EXPR",
+                        help="Filtrar trazas guardadas (sintaxis DataFrame.query; vacío = resumen)")
+    parser.add_argument("--output", default=None, help="CSV con el resultado de --query")
+    args = parser.parse_args()
+
+    if args.query is not None:
+        run_query(args.query, args.paths, args.output)
+    else:
+        for path in args.paths:
+            run_diagnostic(path, parquet=args.parquet)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Uso: python diagnostic.py <archivo.step>")
     else:
-        run_diagnostic(sys.argv[1])
\ No newline at end of file
+        main()
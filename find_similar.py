@@ -0,0 +1,57 @@
+# find_similar.py
+"""
+Búsqueda de stakes geométricamente iguales o parecidos en esta pieza y en
+toda la biblioteca de piezas analizadas (firmas en Reportes/*/Firmas_*.npz).
+Ejecuta:
+    python find_similar.py PIEZA STAKE_ID
+    python find_similar.py PIEZA STAKE_ID --k 50 --max-distance 1.0 --csv parecidos.csv
+    python find_similar.py PIEZA STAKE_ID --same-part
+
+Las firmas se generan con: python run_process.py pieza.step --signatures
+"""
+import sys
+import argparse
+import pandas as pd
+from src.signatures import SignatureIndex
+
+def main():
+    parser = argparse.ArgumentParser(description="Stakes con la misma geometría")
+    parser.add_argument("part", help="Pieza del stake de referencia (nombre del archivo sin extensión)")
+    parser.add_argument("stake_id", help="ID del stake (columna ID del reporte)")
+    parser.add_argument("--root", nargs="+", default=["Reportes"], help="Carpetas o archivos de firmas")
+    parser.add_argument("--k", type=int, default=20, help="Vecinos cercanos (no idénticos) a listar")
+    parser.add_argument("--max-distance", type=float, default=None, help="Distancia máx. de firma (mm)")
+    parser.add_argument("--same-part", action="store_true", help="Solo en la misma pieza")
+    parser.add_argument("--csv", default=None, help="Guardar el resultado como CSV")
+    args = parser.parse_args()
+
+    index = SignatureIndex.load(args.root)
+    row = index.find(args.part, args.stake_id)
+    if row is None:
+        print(f"❌ No hay firma para {args.stake_id} en {args.part} ({len(index)} firmas cargadas)")
+        return 2
+
+    exact, near, dist = index.similar(row, k=args.k, max_distance=args.max_distance)
+    if args.same_part:
+        exact = exact[index.columns['part'][exact] == args.part]
+        keep = index.columns['part'][near] == args.part
+        near, dist = near[keep], dist[keep]
+
+    print(f"🔑 Firma de {args.part} / {args.stake_id}: {index.columns['key'][row]}")
+    identical = index.table(exact)
+    print(f"\n🟰 Idénticos: {len(identical)} en {identical['Pieza'].nunique()} piezas")
+    if len(identical):
+        print(identical.groupby("Pieza").size().sort_values(ascending=False).to_string())
+    similar = index.table(near, dist)
+    print(f"\n≈ Parecidos: {len(similar)}")
+    if len(similar):
+        print(similar.drop(columns="Firma").to_string(index=False))
+
+    if args.csv:
+        out = pd.concat([identical.assign(Coincidencia="exacta"), similar.assign(Coincidencia="cercana")])
+        out.to_csv(args.csv, index=False)
+        print(f"💾 Resultado guardado en: {args.csv}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
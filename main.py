@@ -5,6 +5,7 @@ from src.geometry import GeometryProcessor
 from src.analyzer import HeatStakeAnalyzer
 from src.visualizer import ResultVisualizer
 from src.family_merger import FamilyMerger
+from src.events import default_bus
 
 def main():
     parser = argparse.ArgumentParser(
@@ -16,7 +17,11 @@ def main():
     parser.add_argument("--show-rejected", action="store_true", help="Mostrar candidatos rechazados")
     parser.add_argument("--custom-rules", action="store_true", help="Usar reglas de fusión personalizadas")
     parser.add_argument("--output", default="heat_stakes_coordinates.txt", help="Archivo de salida")
+    parser.add_argument("--tiled", action="store_true", help="Clustering de respaldo por teselas en paralelo")
+    parser.add_argument("--coaxial", action="store_true", help="Agrupar componentes de un stake por eje compartido")
+    parser.add_argument("--quiet", action="store_true", help="Sin salida en los bucles calientes")
     args = parser.parse_args()
+    default_bus.quiet = args.quiet
 
     print("="*70)
     print("🔥 DETECTOR DE HEAT STAKES CON FUSIÓN DE FAMILIAS v2.0")
@@ -40,12 +45,13 @@ def main():
     # ============================================================================
     print("\n🔬 Iniciando análisis por familias...")
     analyzer = HeatStakeAnalyzer()
+    analyzer.LEGACY_TILED = args.tiled
+    if args.coaxial:
+        analyzer.GROUPING = 'coaxial'
     
     # FASE A: Topología por Consenso (con fusión automática de familias)
-    topo_stakes, remaining = analyzer.analyze_topology(cylinders)
-    
-    # FASE B: Clustering de Respaldo (solo lo que sobra)
-    cluster_stakes, rejected = analyzer.analyze_clusters_legacy(remaining, eps=args.eps)
+    # FASE B: Clustering de Respaldo (solo lo que sobra), en paralelo con la fase A
+    topo_stakes, cluster_stakes, rejected = analyzer.analyze_all(cylinders, eps=args.eps)
     
     all_valid_stakes = topo_stakes + cluster_stakes
 
@@ -54,7 +60,7 @@ def main():
     # ============================================================================
     if args.custom_rules:
         print("\n🔧 Aplicando reglas de fusión personalizadas...")
-        merger = FamilyMerger()
+        merger = FamilyMerger(mode='coaxial' if args.coaxial else 'rules')
         
         # Agregar reglas personalizadas adicionales
         merger.add_fusion_rule('GRP3', 'GRP4', max_distance=22.0)
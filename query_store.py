@@ -0,0 +1,78 @@
+# query_store.py
+"""
+Consultas espaciales sobre el almacén de resultados de todas las piezas.
+Ejecuta:
+    python query_store.py radius X Y Z R [--family GRP1]
+    python query_store.py box X0 Y0 Z0 X1 Y1 Z1
+    python query_store.py parts
+    python query_store.py import Reportes/*/revision_*.npz
+    python query_store.py compact
+
+El almacén se llena con: python run_process.py pieza.step --store
+"""
+import sys
+import os
+import argparse
+import numpy as np
+from src.results_store import ResultsStore, DEFAULT_STORE, print_matches, export_matches
+from src.revision import load_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el almacén de stakes")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Carpeta del almacén")
+    parser.add_argument("--csv", default=None, help="Guardar el resultado como CSV")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_radius = sub.add_parser("radius", help="Stakes a distancia <= R de un punto")
+    p_radius.add_argument("coords", type=float, nargs=4, metavar=("X", "Y", "Z", "R"))
+    p_radius.add_argument("--family", default=None)
+
+    p_box = sub.add_parser("box", help="Stakes dentro de una caja")
+    p_box.add_argument("coords", type=float, nargs=6, metavar=("X0", "Y0", "Z0", "X1", "Y1", "Z1"))
+    p_box.add_argument("--family", default=None)
+
+    sub.add_parser("parts", help="Piezas guardadas")
+    p_import = sub.add_parser("import", help="Importar snapshots de revisión (.npz)")
+    p_import.add_argument("snapshots", nargs="+")
+    sub.add_parser("compact", help="Juntar segmentos y borrar los obsoletos")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+
+    if args.command == "parts":
+        for part in store.parts():
+            print(f"   • {part}")
+        print(f"📦 {len(store.parts())} piezas")
+        return 0
+
+    if args.command == "import":
+        for path in args.snapshots:
+            try:
+                snapshot = load_snapshot(path)
+            except Exception as e:
+                print(f"❌ No se pudo leer {path}: {e}")
+                continue
+            part = str(snapshot['step_file']) or path
+            store.append_arrays(os.path.splitext(os.path.basename(part))[0], snapshot)
+        return 0
+
+    if args.command == "compact":
+        store.compact()
+        return 0
+
+    if args.command == "radius":
+        x, y, z, r = args.coords
+        point = np.array([x, y, z])
+        result = store.query_radius(point, r, family=args.family)
+    else:
+        c = args.coords
+        point = None
+        result = store.query_box(c[:3], c[3:], family=args.family)
+
+    print_matches(result, point)
+    if args.csv:
+        export_matches(args.csv, result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
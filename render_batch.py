@@ -0,0 +1,64 @@
+# render_batch.py
+"""
+Capturas PNG (sin ventana) de muchas piezas en paralelo, para revisar lotes.
+Ejecuta: python render_batch.py carpeta_o_archivos.step ... [--workers 8]
+
+Los stakes se toman del almacén de resultados (run_process.py --store);
+las piezas que no están en el almacén se detectan dentro de cada worker con
+las mismas opciones de detección que se pasen aquí (--coaxial, --custom-rules...).
+Cada pieza queda con Reportes/<pieza>/Vistas/*.png y la hoja 'Vistas' en su
+reporte (si ya existía, solo se reemplaza esa hoja).
+"""
+import sys
+import os
+import glob
+import argparse
+from src.results_store import ResultsStore, DEFAULT_STORE
+from src.visualizer import render_parts, SNAPSHOT_VIEWS
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ("*.step", "*.stp", "*.STEP", "*.STP"):
+                files.extend(glob.glob(os.path.join(path, ext)))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+def main():
+    parser = argparse.ArgumentParser(description="Capturas offscreen en lote")
+    parser.add_argument("paths", nargs="+", help="Archivos STEP o carpetas")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Almacén de resultados")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto, núcleos)")
+    parser.add_argument("--views", nargs="+", choices=list(SNAPSHOT_VIEWS), default=None)
+    parser.add_argument("--size", type=int, nargs=2, default=(1024, 768), metavar=("ANCHO", "ALTO"))
+    # Opciones de detección (como en run_process.py) para las piezas que no están en el almacén
+    parser.add_argument("--coaxial", action="store_true")
+    parser.add_argument("--custom-rules", action="store_true")
+    parser.add_argument("--tiled", action="store_true")
+    parser.add_argument("--mesh", action="store_true")
+    parser.add_argument("--symmetry", action="store_true")
+    args = parser.parse_args()
+    config = {'grouping': 'coaxial' if args.coaxial else 'distance', 'custom_rules': args.custom_rules,
+              'legacy_tiled': args.tiled, 'metrics': 'mesh' if args.mesh else 'exact', 'symmetry': args.symmetry}
+
+    files = collect_files(args.paths)
+    if not files:
+        print("❌ No se encontraron archivos STEP")
+        return 1
+
+    store = ResultsStore(args.store) if ResultsStore.exists(args.store) else None
+    jobs = []
+    for step_file in files:
+        part = os.path.splitext(os.path.basename(step_file))[0]
+        jobs.append((step_file, store.part_stakes(part) if store else None))
+    pending = sum(1 for _, stakes in jobs if stakes is None)
+    print(f"⚙️ Renderizando {len(jobs)} piezas ({pending} sin resultados previos: se detectan en el worker)")
+
+    results = render_parts(jobs, workers=args.workers, views=args.views, size=tuple(args.size), config=config)
+    print(f"✅ Piezas renderizadas: {len(results)}/{len(jobs)}")
+    return 0 if len(results) == len(jobs) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
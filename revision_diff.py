@@ -0,0 +1,67 @@
+# revision_diff.py
+"""
+Re-análisis incremental entre revisiones de una misma pieza.
+Ejecuta: python revision_diff.py nueva_revision.step --previous Reportes/<pieza>/revision_<pieza>.npz
+
+El snapshot previo se genera con: python run_process.py pieza.step --save-revision
+"""
+import sys
+import os
+import argparse
+from src.geometry import GeometryProcessor
+from src.analyzer import HeatStakeAnalyzer
+from src.family_merger import FamilyMerger
+from src.revision import (snapshot_path, build_snapshot, save_snapshot, load_snapshot,
+                          stake_arrays, diff_stakes, print_stake_diff, export_stake_diff)
+
+def main():
+    parser = argparse.ArgumentParser(description="Diferencias de heat stakes entre revisiones STEP")
+    parser.add_argument("file", help="Archivo STEP de la nueva revisión")
+    parser.add_argument("--previous", required=True, help="Snapshot .npz de la revisión anterior")
+    parser.add_argument("--custom-rules", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="Distancia máx. para emparejar stakes (mm)")
+    parser.add_argument("--save", action="store_true", help="Guardar snapshot de la nueva revisión")
+    args = parser.parse_args()
+
+    try:
+        previous = load_snapshot(args.previous)
+    except Exception as e:
+        print(f"❌ No se pudo leer el snapshot: {e}")
+        return 1
+
+    try:
+        geo = GeometryProcessor(args.file)
+        geo.load_step()
+        cylinders = geo.extract_features_incremental(previous)
+        fingerprints = geo.face_fingerprints() if args.save else None
+
+        analyzer = HeatStakeAnalyzer()
+        topo, remaining = analyzer.analyze_topology(cylinders)
+        cluster, _ = analyzer.analyze_clusters_legacy(remaining)
+        all_valid = topo + cluster
+
+        if args.custom_rules:
+            merger = FamilyMerger()
+            by_fam = {}
+            for s in all_valid:
+                fam = s.get('family_id', 'DEFAULT')
+                if fam not in by_fam: by_fam[fam] = []
+                by_fam[fam].append(s)
+            all_valid = merger.merge_all_families(by_fam)
+    except Exception as e:
+        print(f"❌ Error crítico en el proceso: {e}")
+        return 1
+
+    current = stake_arrays(all_valid)
+    delta = diff_stakes(previous, current, match_tolerance=args.tolerance)
+    print_stake_diff(previous, current, delta)
+
+    base_name = os.path.splitext(os.path.basename(args.file))[0]
+    export_stake_diff(os.path.join("Reportes", base_name, f"Delta_{base_name}.csv"), previous, current, delta)
+
+    if args.save:
+        save_snapshot(snapshot_path(args.file), build_snapshot(geo, cylinders, all_valid, fingerprints))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
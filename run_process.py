@@ -1,54 +1,234 @@
 # run_process.py
 import sys
+import os
 import argparse
+import json
+import time
+from collections import Counter
 from src.geometry import GeometryProcessor
 from src.analyzer import HeatStakeAnalyzer
-from src.visualizer import ResultVisualizer
+from src.visualizer import ResultVisualizer, snapshot_paths
 from src.family_merger import FamilyMerger
+from src.revision import snapshot_path, build_snapshot, save_snapshot
+from src.watchdog import FaceWatchdog
+from src.events import default_bus, JsonLinesSink
+from src.results_store import ResultsStore, DEFAULT_STORE
+from src.profiling import FaceCostRecorder
+from src.pointcloud import PointCloudProcessor, POINTCLOUD_EXTENSIONS
+from src.progressive import ProgressiveRun
+from src.trace import DecisionTrace, trace_path
+from src.scheduler import TaskGraph
+from src.signatures import save_signatures
+from src.step_scanner import print_scan
+from src.retune import Retuner
+from src.toolpath import save_toolpath
+
+def write_result(path, result):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("file", help="Ruta al archivo STEP")
+    parser.add_argument("file", help="Ruta al archivo STEP (o escaneo STL/PLY/XYZ)")
     parser.add_argument("--view", action="store_true")
     parser.add_argument("--show-rejected", action="store_true")
     parser.add_argument("--custom-rules", action="store_true")
+    parser.add_argument("--tiled", action="store_true")
+    parser.add_argument("--save-revision", action="store_true")
+    parser.add_argument("--coaxial", action="store_true")
+    parser.add_argument("--budget", type=float, default=None, help="Segundos máx. por operación OCC costosa")
+    parser.add_argument("--deadline", type=float, default=None, help="Segundos máx. por archivo (resultado parcial)")
+    parser.add_argument("--sandbox", action="store_true",
+                        help="Aislar operaciones costosas en un subproceso (implícito con --budget/--deadline)")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Con --budget: solo informar caras lentas, sin subproceso (no las interrumpe)")
+    parser.add_argument("--quiet", action="store_true", help="Sin salida en los bucles calientes")
+    parser.add_argument("--events", default=None, help="Archivo JSON-lines para eventos de progreso")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE, default=None,
+                        help="Añadir los stakes al almacén de resultados (carpeta opcional)")
+    parser.add_argument("--snapshots", action="store_true", help="Capturas PNG offscreen referenciadas en el reporte")
+    parser.add_argument("--profile-faces", type=int, nargs="?", const=20, default=None, metavar="N",
+                        help="Registrar el costo por cara y mostrar las N más costosas")
+    parser.add_argument("--mesh", action="store_true", help="Pre-paso aproximado sobre la malla (CoG exacto solo al final)")
+    parser.add_argument("--progressive", action="store_true",
+                        help="Vista previa solo topológica y luego resultado refinado (con delta)")
+    parser.add_argument("--lean", action="store_true",
+                        help="Experimental: cilindros sin caras OCC (solo índice) y stakes con índices en lugar de listas "
+                             "(ahorro de memoria aún sin medir; ver bench_memory.py)")
+    parser.add_argument("--trace", nargs="?", const="npz", default=None, choices=["npz", "parquet"],
+                        help="Guardar la traza de decisiones por cilindro (incluidos los descartados por la cascada) en Reportes/<pieza>/")
+    parser.add_argument("--signatures", action="store_true",
+                        help="Guardar firmas geométricas de los stakes (find_similar.py)")
+    parser.add_argument("--prescan", nargs="?", const="verdict", default=None, choices=["verdict", "roi"],
+                        help="Triaje por texto antes de transferir: omite piezas sin stakes probables (roi = además acota la cascada)")
+    parser.add_argument("--retune", action="store_true",
+                        help="Con --view: menú para ajustar distancias de fusión y eps re-analizando en vivo")
+    parser.add_argument("--toolpath", action="store_true",
+                        help="Orden de visita para el robot (grupos por eje de aproximación) en Ruta_<pieza>.csv")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="Detectar plano espejo y extraer solo una mitad (los cilindros se reflejan)")
+    parser.add_argument("--result-json", default=None,
+                        help="Archivo JSON con el resultado estructurado (lo lee la cola de la GUI)")
     args = parser.parse_args()
+    t0 = time.perf_counter()
+
+    default_bus.quiet = args.quiet
+    if args.events:
+        default_bus.subscribe(JsonLinesSink(args.events))
 
     print(f"⚙️ Procesando: {args.file}")
     
-    try:
-        # 1. Geometría
-        geo = GeometryProcessor(args.file)
-        geo.load_step()
-        cylinders = geo.extract_features_topology()
+    watchdog = None
+    if args.budget or args.deadline or args.sandbox:
+        # Solo el subproceso puede cortar una cara que no termina; 'flag' es solo informe
+        watchdog = FaceWatchdog(budget=args.budget or 2.0, deadline=args.deadline,
+                                mode='flag' if args.report_only and not args.sandbox else 'sandbox')
+    
+    is_scan = os.path.splitext(args.file)[1].lower() in POINTCLOUD_EXTENSIONS
+    if args.progressive and is_scan:
+        print("⚠️ --progressive requiere un STEP; se procesa el escaneo en una sola fase")
+        args.progressive = False
+    rejected = []
+    trace = None
 
+    def analyze(cylinders, refine=True):
+        nonlocal rejected, trace
         # 2. Análisis
         analyzer = HeatStakeAnalyzer()
-        topo, remaining = analyzer.analyze_topology(cylinders)
-        cluster, rejected = analyzer.analyze_clusters_legacy(remaining)
+        analyzer.LEAN = args.lean
+        if args.trace:
+            trace = DecisionTrace(part=os.path.splitext(os.path.basename(args.file))[0])
+            # Población completa: la extracción no descarta en la cascada (EARLY_REJECT=False)
+            trace.begin(cylinders)
+            analyzer.trace = trace
+        cylinders = [c for c in cylinders if 'rejected_by' not in c]
+        analyzer.LEGACY_TILED = args.tiled
+        if args.coaxial:
+            analyzer.GROUPING = 'coaxial'
+        topo, cluster, rejected = analyzer.analyze_all(cylinders)
         all_valid = topo + cluster
+        if refine and args.mesh and not is_scan:
+            geo.refine_centers(topo)
 
         # 3. Fusión
         if args.custom_rules:
-            merger = FamilyMerger()
+            merger = FamilyMerger(mode='coaxial' if args.coaxial else 'rules')
             by_fam = {}
             for s in all_valid:
                 fam = s.get('family_id', 'DEFAULT')
                 if fam not in by_fam: by_fam[fam] = []
                 by_fam[fam].append(s)
             all_valid = merger.merge_all_families(by_fam)
+        return all_valid
+
+    try:
+        # 1. Geometría (B-Rep STEP o nube de puntos escaneada)
+        if is_scan:
+            geo = PointCloudProcessor(args.file)
+            cylinders = geo.extract_features()
+        else:
+            geo = GeometryProcessor(args.file)
+            geo.watchdog = watchdog
+            if args.profile_faces:
+                geo.profiler = FaceCostRecorder()
+            if args.mesh:
+                geo.METRICS = 'mesh'
+            geo.LEAN = args.lean
+            if args.trace:
+                geo.EARLY_REJECT = False  # Los descartados por la cascada también van a la traza
+            geo.SYMMETRY = args.symmetry
+            if args.prescan:
+                print_scan(geo.prescan(apply_roi=args.prescan == 'roi'))
+                if not geo.scan['likely']:
+                    # Sin familias de cilindros de tamaño stake: no vale la pena el TransferRoots
+                    print("✅ Detección finalizada. Encontrados: 0 (omitido por el pre-escaneo)")
+                    if args.result_json:
+                        write_result(args.result_json, {
+                            'file': args.file, 'stakes': 0, 'partial': False, 'families': {},
+                            'skipped': 'prescan', 'seconds': round(time.perf_counter() - t0, 3)
+                        })
+                    default_bus.stakes_found(0, 'final')
+                    return
+            geo.load_step()
+            if watchdog:
+                watchdog.attach(geo.shape)
+
+        if args.progressive:
+            # Fase 1: vista previa inmediata; fase 2: espacial + CoG exacto
+            run = ProgressiveRun(geo, lambda cyls: analyze(cyls, refine=False), default_bus)
+            preview = run.run_preview()
+            print(f"👀 Vista previa: {len(preview)} stakes (refinando...)")
+            all_valid = run.run_refine()
+            cylinders = run.cylinders
+            delta = run.delta
+            print(f"🔁 Refinado: +{len(delta['added'])} / -{len(delta['removed'])} / "
+                  f"↔{len(delta['moved'])} respecto de la vista previa")
+        else:
+            if not is_scan:
+                cylinders = geo.extract_features_topology()
+            all_valid = analyze(cylinders)
 
         print(f"✅ Detección finalizada. Encontrados: {len(all_valid)}")
+        cylinders = [c for c in cylinders if 'rejected_by' not in c]
+        if trace is not None:
+            trace.finish(all_valid).save(trace_path(args.file, f".{args.trace}"))
+        if args.result_json:
+            write_result(args.result_json, {
+                'file': args.file, 'stakes': len(all_valid), 'partial': bool(getattr(geo, 'partial', False)),
+                'families': dict(Counter(s.get('family_id', 'DEFAULT') for s in all_valid)),
+                'seconds': round(time.perf_counter() - t0, 3)
+            })
+        default_bus.stakes_found(len(all_valid), 'final')
+        if not is_scan and geo.profiler is not None:
+            geo.profiler.print_top(args.profile_faces)
+            geo.profiler.export(args.file)
+        if watchdog:
+            watchdog.print_summary()
+            watchdog.export_quarantine(args.file)
+
+        # Snapshot para análisis incremental de la siguiente revisión
+        if args.save_revision and is_scan:
+            print("⚠️ --save-revision requiere un STEP (las huellas son por cara B-Rep)")
+        elif args.save_revision:
+            save_snapshot(snapshot_path(args.file), build_snapshot(geo, cylinders, all_valid))
+
+        # Almacén consultable con todas las piezas (query_store.py)
+        if args.store:
+            ResultsStore(args.store).append(os.path.splitext(os.path.basename(args.file))[0], all_valid)
+
+        # Firmas para buscar stakes iguales en la biblioteca (find_similar.py)
+        if args.signatures:
+            save_signatures(args.file, all_valid)
+
+        # Orden de visita para la celda de heat staking
+        if args.toolpath:
+            save_toolpath(args.file, all_valid)
 
         # 4. Visualización y Reporte
-        if args.view:
+        if args.view or args.snapshots:
             viz = ResultVisualizer(geo.shape, all_valid, rejected)
-            viz.export_reports(args.file) # Generar Excel
-            viz.show_3d(show_rejected=args.show_rejected)
+            # Excel (enlaces a las capturas ya planificadas) en paralelo con el mallado para el visor
+            graph = TaskGraph()
+            graph.add('meshing', viz.prepare_display, args.show_rejected)
+            graph.add('excel', viz.export_reports, args.file, snapshot_paths(args.file) if args.snapshots else None)
+            graph.run()
+            if args.snapshots:
+                viz.render_snapshots(args.file, show_rejected=args.show_rejected)
+            if args.view:
+                if args.retune:
+                    viz.retuner = Retuner(cylinders, grouping='coaxial' if args.coaxial else 'distance',
+                                          tiled=args.tiled, lean=args.lean, custom_rules=args.custom_rules)
+                viz.show_3d(show_rejected=args.show_rejected)
 
     except Exception as e:
         print(f"❌ Error crítico en el proceso: {e}")
+        if args.result_json:
+            write_result(args.result_json, {'file': args.file, 'error': str(e),
+                                            'seconds': round(time.perf_counter() - t0, 3)})
         sys.exit(1)
+    finally:
+        if watchdog:
+            watchdog.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+# scan_step.py
+"""
+Triaje rápido de STEP grandes sin cargarlos en OCC: lee el texto Part 21 y
+cuenta las superficies cilíndricas de tamaño stake, sus familias de radio y
+la región (ROI) donde están.
+Ejecuta:
+    python scan_step.py pieza.step
+    python scan_step.py carpeta/*.step --csv triaje.csv
+
+Para usarlo dentro del pipeline: python run_process.py pieza.step --prescan [roi]
+"""
+import sys
+import argparse
+import pandas as pd
+from src.step_scanner import StepScanner, print_scan
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-escaneo de archivos STEP")
+    parser.add_argument("files", nargs="+", help="Archivos .step / .stp")
+    parser.add_argument("--max-radius", type=float, default=10.0, help="Radio máx. de un cilindro de stake (mm)")
+    parser.add_argument("--margin", type=float, default=25.0, help="Margen de la ROI (mm)")
+    parser.add_argument("--csv", default=None, help="Guardar una fila por archivo como CSV")
+    args = parser.parse_args()
+
+    rows = []
+    for path in args.files:
+        try:
+            result = StepScanner(path, max_radius=args.max_radius, roi_margin=args.margin).scan()
+        except OSError as e:
+            print(f"❌ {path}: {e}")
+            continue
+        print_scan(result)
+        rows.append({
+            "Archivo": path, "MB": round(result['bytes'] / (1 << 20), 1),
+            "Segundos": round(result['seconds'], 2), "Ensamble": result['assembly'],
+            "Cilindros": result['total_cylinders'], "Tamaño stake": len(result['radii']),
+            "Familias": len(result['families']), "Probable": result['likely'],
+            "ROI": result['roi'],
+        })
+
+    if args.csv and rows:
+        pd.DataFrame(rows).to_csv(args.csv, index=False)
+        print(f"💾 Triaje guardado en: {args.csv}")
+    return 0 if rows else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
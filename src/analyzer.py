@@ -3,19 +3,62 @@ import numpy as np
 from sklearn.cluster import DBSCAN
 from collections import Counter, defaultdict
 from src.family_merger import FamilyMerger
+from src.clustering import cluster_labels, tiled_dbscan
+from src.coaxial import coaxial_labels, axis_points
+from src.members import pool_members
+from src.scheduler import TaskGraph
+from src.events import default_bus
 
 class HeatStakeAnalyzer:
-    def __init__(self, strict_mode=False):
+    def __init__(self, strict_mode=False, events=None):
+        self.events = events or default_bus
         self.STRICT_MODE = strict_mode
         self.MIN_CONNECTED_PLANES = 3 
         self.MIN_HEIGHT = 2.0
         self.MERGE_DISTANCE = 15.0 
         self.FAMILY_MERGE_DISTANCE = 15.0  # Distancia para fusionar familias
+        self.MERGE_RULES = None            # {'GRP1+GRP2': mm, ...} que reemplazan las de FamilyMerger
         self.radius_tolerance = 0.2 
+        self.CLUSTER_BACKEND = 'grid'  # 'grid' (rejilla + union-find) o 'sklearn' (DBSCAN)
+        self.LEGACY_TILED = False       # Clustering legacy por teselas en paralelo
+        self.LEGACY_TILE_SIZE = None    # mm; None = automático según cantidad de puntos
+        self.LEGACY_WORKERS = None      # Procesos del pool; None = núcleos disponibles
+        self.GROUPING = 'distance'      # 'distance' (centroides) o 'coaxial' (eje compartido)
+        self.COAXIAL_TOLERANCE = 0.5    # mm entre ejes para considerarlos el mismo
+        self.COAXIAL_ANGLE = 0.02       # Tolerancia de dirección (cuerda entre vectores unitarios)
+        self.LEAN = False               # Stakes con índices sobre la lista de cilindros (sin listas propias)
+        self.trace = None               # DecisionTrace opcional (motivo de descarte por cilindro)
+        self.SCHEDULER = 'thread'       # Etapas independientes en paralelo ('serial' = en secuencia)
+        self._pool = None
+        self._pool_positions = None
+
+    def analyze_all(self, cylinders, eps=25.0, min_samples=5, tiled=None):
+        """
+        Topología por familias y respaldo legacy como tareas independientes
+        del grafo (corren a la vez). Devuelve (topo_stakes, cluster_stakes, rejected),
+        igual que llamar a analyze_topology y luego a analyze_clusters_legacy.
+        """
+        population, remaining = self.split_population(cylinders)
+        if self.SCHEDULER != 'serial':
+            # Los CoG perezosos del respaldo se calculan aquí: OCC queda en un solo hilo
+            self._prefetch_centers([c for c in remaining if c['radius'] < 10.0])
+        graph = TaskGraph(mode=self.SCHEDULER)
+        graph.add('topology', self.analyze_population, population)
+        graph.add('legacy', self.analyze_clusters_legacy, remaining, eps, min_samples, tiled)
+        results = graph.run()
+        cluster, rejected = results['legacy']
+        return results['topology'], cluster, rejected
 
     def analyze_topology(self, cylinders):
-        print(f"\n🔬 Ejecutando análisis por FAMILIAS GEOMÉTRICAS...")
-        
+        population, remaining_cylinders = self.split_population(cylinders)
+        return self.analyze_population(population), remaining_cylinders
+
+    def split_population(self, cylinders):
+        """Separa los candidatos con aletas suficientes (población) del resto (respaldo legacy)."""
+        if self.LEAN:
+            self._pool = cylinders
+            self._pool_positions = {id(c): i for i, c in enumerate(cylinders)}
+
         # 1. Recolección Inicial
         population = []
         remaining_cylinders = []
@@ -25,29 +68,57 @@ class HeatStakeAnalyzer:
                 population.append(cyl)
             else:
                 remaining_cylinders.append(cyl)
+        if self.trace is not None:
+            if not self.trace.cylinders:
+                self.trace.begin(cylinders)
+            self.trace.reject(remaining_cylinders, 'fins')
+        return population, remaining_cylinders
+
+    def analyze_population(self, population):
+        self.events.message(f"\n🔬 Ejecutando análisis por FAMILIAS GEOMÉTRICAS...")
+        self.events.stage_started('analyze')
 
         if not population:
-            print("⚠️ No se encontraron candidatos con aletas.")
-            return [], remaining_cylinders
+            self.events.message("⚠️ No se encontraron candidatos con aletas.")
+            self.events.stage_finished('analyze')
+            self.events.stakes_found(0, 'topology')
+            self._pool = self._pool_positions = None
+            return []
 
         # 2. SEGREGACIÓN POR FAMILIAS (Radios)
         grouped_candidates = self._group_by_families(population)
         
-        # 3. FUSIÓN DE DUPLICADOS (Por cada familia)
-        family_stakes = {}
+        # 3. FUSIÓN DE DUPLICADOS (Por cada familia, en paralelo: son independientes)
+        graph = TaskGraph(mode=self.SCHEDULER)
+        if self.SCHEDULER != 'serial':
+            self._prefetch_centers([c for candidates in grouped_candidates.values() for c in candidates])
         for family_id, candidates in grouped_candidates.items():
-            merged = self._merge_close_candidates(candidates, family_id)
-            family_stakes[family_id] = merged
+            graph.add(family_id, self._merge_close_candidates, candidates, family_id)
+        merged = graph.run()
+        family_stakes = {family_id: merged[family_id] for family_id in grouped_candidates}
         
         # 4. ⭐ SISTEMA COMPLETO DE FUSIÓN DE FAMILIAS ⭐
-        merger = FamilyMerger()
+        merger = FamilyMerger(mode='coaxial' if self.GROUPING == 'coaxial' else 'rules', events=self.events)
+        merger.COAXIAL_TOLERANCE = self.COAXIAL_TOLERANCE
+        merger.COAXIAL_ANGLE = self.COAXIAL_ANGLE
+        if self.MERGE_RULES:
+            merger.merge_rules.update(self.MERGE_RULES)
         final_stakes = merger.merge_all_families(family_stakes)
+        self._pool = self._pool_positions = None
         
         # Mostrar resumen
         merger.print_fusion_summary(final_stakes)
         
-        print(f"✓ Detectados totales: {len(final_stakes)}")
-        return final_stakes, remaining_cylinders
+        self.events.message(f"✓ Detectados totales: {len(final_stakes)}")
+        self.events.stage_finished('analyze')
+        self.events.stakes_found(len(final_stakes), 'topology')
+        return final_stakes
+
+    @staticmethod
+    def _prefetch_centers(cylinders):
+        # Fuerza el CoG perezoso (OCC) en el hilo actual antes de repartir trabajo entre hilos
+        for cyl in cylinders:
+            cyl['center']
 
     def _group_by_families(self, population):
         """Agrupa los candidatos según su radio."""
@@ -58,7 +129,7 @@ class HeatStakeAnalyzer:
             families[rad_key].append(cand)
             
         valid_families = {}
-        print(f"   📊 Análisis de Familias:")
+        self.events.message(f"   📊 Análisis de Familias:")
         
         family_counter = 1
         sorted_keys = sorted(families.keys(), key=lambda k: len(families[k]), reverse=True)
@@ -72,33 +143,48 @@ class HeatStakeAnalyzer:
                 label = f"GRP{family_counter}"
                 valid_families[label] = members
                 
-                print(f"      🔹 Familia {label}: {count} miembros | Radio ~{rad}mm | Aletas típicas: {avg_fins}")
+                self.events.message(f"      🔹 Familia {label}: {count} miembros | Radio ~{rad}mm | Aletas típicas: {avg_fins}")
                 
                 if rad > 3.5:
-                    print(f"         ⚠ Posible WAYDOOR/LOCATOR (Radio grande)")
+                    self.events.message(f"         ⚠ Posible WAYDOOR/LOCATOR (Radio grande)")
                 elif rad < 1.0:
-                    print(f"         ⚠ Posibles PINES/Restos (Radio muy pequeño)")
+                    self.events.message(f"         ⚠ Posibles PINES/Restos (Radio muy pequeño)")
                 else:
-                    print(f"         ✅ Probable HEAT STAKE")
+                    self.events.message(f"         ✅ Probable HEAT STAKE")
                 
                 family_counter += 1
+                if self.trace is not None:
+                    self.trace.set_family(members, label)
             else:
-                print(f"      ❌ Descartada familia ruido (R={rad}, N={count})")
+                self.events.message(f"      ❌ Descartada familia ruido (R={rad}, N={count})")
+                if self.trace is not None:
+                    self.trace.reject(members, 'family_size')
                 
         return valid_families
 
-    def _merge_close_candidates(self, candidates, family_id):
-        """Fusiona candidatos cercanos dentro de una familia"""
+    def _merge_close_candidates(self, candidates, family_id, backend=None):
+        """
+        Fusiona candidatos cercanos dentro de una familia.
+        Con min_samples=1 DBSCAN equivale a componentes conexas del grafo eps,
+        que el motor 'grid' resuelve en tiempo casi lineal con las mismas etiquetas.
+        """
         if not candidates: return []
         
         points = np.array([c['center'] for c in candidates])
-        clustering = DBSCAN(eps=self.MERGE_DISTANCE, min_samples=1)
-        labels = clustering.fit_predict(points)
+        if self.GROUPING == 'coaxial':
+            # Componentes del mismo stake = mismo eje (sin umbral de distancia entre centroides)
+            directions = np.array([c['direction'] for c in candidates])
+            labels = coaxial_labels(points, directions, self.COAXIAL_TOLERANCE, self.COAXIAL_ANGLE,
+                                    max_axial_gap=self.MERGE_DISTANCE, on_axis=axis_points(candidates))
+        else:
+            labels = cluster_labels(points, self.MERGE_DISTANCE, backend or self.CLUSTER_BACKEND)
         
         merged_results = []
-        for label in set(labels):
-            indices = [i for i, x in enumerate(labels) if x == label]
+        for label in sorted(set(labels)):
+            indices = np.flatnonzero(labels == label)
             group_cylinders = [candidates[i] for i in indices]
+            if self.trace is not None:
+                self.trace.set_cluster(group_cylinders, label, f"{family_id}-{label+1}")
             
             # ⭐ Calcular centro de gravedad real
             positions = np.array([c['center'] for c in group_cylinders])
@@ -110,7 +196,7 @@ class HeatStakeAnalyzer:
             merged_results.append({
                 'cluster_id': f"{family_id}-{label+1}",
                 'family_id': family_id,
-                'cylinders': group_cylinders,  # Guardamos los cilindros originales
+                **self._members(group_cylinders),  # Cilindros originales (lista o índices lean)
                 'analysis': {
                     'centroid': tuple(centroid),
                     'num_cylinders': len(group_cylinders),
@@ -125,22 +211,49 @@ class HeatStakeAnalyzer:
             })
         return merged_results
 
-    def analyze_clusters_legacy(self, cylinders, eps=25.0, min_samples=5):
-        """Legacy Clustering para respaldo"""
-        if not cylinders or len(cylinders) < min_samples: return [], []
-        print(f"🔬 Ejecutando análisis Legacy (Respaldo)...")
+    def _members(self, group_cylinders):
+        if self._pool is None:
+            return {'cylinders': group_cylinders}
+        return pool_members(group_cylinders, self._pool, self._pool_positions)
+
+    def analyze_clusters_legacy(self, cylinders, eps=25.0, min_samples=5, tiled=None):
+        """
+        Legacy Clustering para respaldo.
+        Con tiled=True el volumen se divide en teselas con halo eps que se
+        procesan en paralelo; las etiquetas coinciden con el DBSCAN global.
+        """
+        if not cylinders or len(cylinders) < min_samples:
+            if self.trace is not None and cylinders:
+                self.trace.reject(cylinders, 'legacy_small')
+            return [], []
+        self.events.message(f"🔬 Ejecutando análisis Legacy (Respaldo)...")
+        self.events.stage_started('legacy')
         
         viable_cyls = [c for c in cylinders if c['radius'] < 10.0]
-        if not viable_cyls: return [], []
+        if self.trace is not None:
+            self.trace.reject([c for c in cylinders if c['radius'] >= 10.0], 'legacy_radius')
+        if not viable_cyls:
+            self.events.stage_finished('legacy')
+            return [], []
 
         centers = np.array([c['center'] for c in viable_cyls])
-        clustering = DBSCAN(eps=eps, min_samples=min_samples)
-        labels = clustering.fit_predict(centers)
+        if self.LEGACY_TILED if tiled is None else tiled:
+            labels = tiled_dbscan(centers, eps, min_samples,
+                                  tile_size=self.LEGACY_TILE_SIZE, workers=self.LEGACY_WORKERS)
+        else:
+            clustering = DBSCAN(eps=eps, min_samples=min_samples)
+            labels = clustering.fit_predict(centers)
+        if self.trace is not None:
+            labels = np.asarray(labels)
+            self.trace.set_legacy(viable_cyls, labels,
+                                  np.where(labels >= 0, np.char.add("LEGACY-", labels.astype(str)), ''))
+            self.trace.accept([c for c, l in zip(viable_cyls, labels) if l >= 0])
+            self.trace.reject([c for c, l in zip(viable_cyls, labels) if l < 0], 'dbscan_noise')
         
         candidates = []
-        for label in set(labels):
+        for label in sorted(set(labels)):
             if label == -1: continue
-            indices = [i for i, x in enumerate(labels) if x == label]
+            indices = np.flatnonzero(labels == label)
             cluster_cyls = [viable_cyls[i] for i in indices]
             
             # Datos del grupo
@@ -156,5 +269,7 @@ class HeatStakeAnalyzer:
                 },
                 'validation': {'confidence': 'MEDIUM', 'type': 'CLUSTER_GROUP'}
             })
-            
+        
+        self.events.stage_finished('legacy')
+        self.events.stakes_found(len(candidates), 'legacy')
         return candidates, []
\ No newline at end of file
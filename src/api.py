@@ -0,0 +1,211 @@
+# src/api.py
+"""
+API en proceso para integrar el detector en otras herramientas.
+
+    from src.api import detect
+    result = detect("pieza.step")            # o un TopoDS_Shape ya cargado
+    result.centroids, result.radii, result.families
+
+    run = detect_progressive("pieza.step", on_refined=actualizar)
+    run.preview.centroids                     # vista previa inmediata
+    run.wait().centroids, run.delta           # resultado refinado y cambios
+
+No imprime nada ni escribe archivos: todo vuelve como arreglos NumPy.
+Tampoco modifica un TopoDS_Shape recibido: con metrics='mesh' se malla una
+copia (las caras de result.cylinders y result.shape son las de esa copia).
+"""
+import os
+import numpy as np
+from src.events import EventBus
+from src.geometry import GeometryProcessor
+from src.analyzer import HeatStakeAnalyzer
+from src.family_merger import FamilyMerger
+from src.progressive import ProgressiveRun
+from src.members import stake_cylinders
+
+DEFAULT_CONFIG = {
+    'legacy_eps': 25.0,         # eps del clustering de respaldo
+    'legacy_min_samples': 5,
+    'legacy_tiled': False,      # clustering de respaldo por teselas
+    'merge_distance': 15.0,     # HeatStakeAnalyzer.MERGE_DISTANCE
+    'grouping': 'distance',     # 'distance' o 'coaxial'
+    'custom_rules': False,      # re-fusión final por familias (como --custom-rules)
+    'early_reject': True,       # cascada de descarte temprano de cilindros
+    'metrics': 'exact',         # 'mesh' = pre-paso aproximado sobre la malla
+    'mesh_deflection': 0.2,
+    'lean': False,              # experimental: no retener la B-Rep (sin caras en los cilindros ni 'shape' en el resultado)
+    'symmetry': False,          # plano espejo: extraer una mitad y reflejar sus cilindros
+}
+
+
+class StakeResult:
+    """
+    Resultado de una detección en arreglos NumPy.
+
+    Por stake (n):  centroids (n,3), radii (n,), families (n,), cluster_ids (n,)
+    Miembros:       member_indices[member_offsets[i]:member_offsets[i+1]] son los
+                    índices de los cilindros del stake i (formato CSR)
+    Por cilindro:   cyl_centers (k,3), cyl_radii, cyl_directions (k,3),
+                    cyl_planes, cyl_face_index (cyl_centers se arma al primer acceso
+                    para no forzar el CoG de cilindros que el análisis nunca usó)
+    """
+
+    def __init__(self, stakes, cylinders, shape=None):
+        self.stakes = stakes
+        self.cylinders = cylinders
+        self.shape = shape
+        self._cyl_centers = None
+
+        self.centroids = np.array([s['analysis']['centroid'] for s in stakes], dtype=float).reshape(-1, 3)
+        self.radii = np.array([s['analysis'].get('avg_radius', 0.0) for s in stakes], dtype=float)
+        self.families = np.array([s.get('family_id', 'DEFAULT') for s in stakes], dtype=str)
+        self.cluster_ids = np.array([s.get('cluster_id', 'UNK') for s in stakes], dtype=str)
+
+        position = {id(c): i for i, c in enumerate(cylinders)}
+        members = [s['cylinder_index'] if s.get('cylinder_pool') is cylinders else
+                   [position[id(c)] for c in stake_cylinders(s) if id(c) in position] for s in stakes]
+        self.member_offsets = np.zeros(len(stakes) + 1, dtype=np.intp)
+        self.member_offsets[1:] = np.cumsum([len(m) for m in members])
+        self.member_indices = np.array([i for m in members for i in m], dtype=np.intp)
+
+        self.cyl_radii = np.array([c['radius'] for c in cylinders], dtype=float)
+        self.cyl_directions = np.array([c['direction'] for c in cylinders], dtype=float).reshape(-1, 3)
+        self.cyl_planes = np.array([c['connected_planes'] for c in cylinders], dtype=np.int32)
+        self.cyl_face_index = np.array([c.get('face_index', -1) for c in cylinders], dtype=np.int64)
+
+    @property
+    def cyl_centers(self):
+        if self._cyl_centers is None:
+            self._cyl_centers = np.array([c['center'] for c in self.cylinders], dtype=float).reshape(-1, 3)
+        return self._cyl_centers
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def members(self, i):
+        """Índices de los cilindros que forman el stake i."""
+        return self.member_indices[self.member_offsets[i]:self.member_offsets[i + 1]]
+
+
+def detect(shape_or_path, config=None, events=None):
+    """
+    Ejecuta la detección completa en proceso y devuelve un StakeResult.
+
+    Args:
+        shape_or_path: ruta a un archivo STEP o un TopoDS_Shape ya cargado
+        config: dict con claves de DEFAULT_CONFIG (las ausentes toman el valor por defecto)
+        events: EventBus opcional para seguir el progreso (por defecto, silencioso)
+    """
+    cfg = _config(config)
+    events = events or EventBus(quiet=True)
+    geo = _geometry(shape_or_path, cfg, events)
+    cylinders = geo.extract_features_topology()
+    stakes = _analyze(geo, cylinders, cfg, events)
+    if cfg['lean']:
+        # Los centros se fijan antes de soltar la geometría (ya no se podrán calcular)
+        result = StakeResult(stakes, cylinders)
+        result.cyl_centers
+        return result
+    return StakeResult(stakes, cylinders, shape=geo.shape)
+
+
+def detect_progressive(shape_or_path, config=None, events=None, on_refined=None, background=True):
+    """
+    Detección en dos fases (ver src/progressive.py). Devuelve de inmediato un
+    ProgressiveResult con la vista previa en .preview; el resultado refinado
+    llega en segundo plano (.wait() o el callback on_refined(result), que se
+    llama desde el hilo de fondo).
+    """
+    cfg = _config(config)
+    events = events or EventBus(quiet=True)
+    geo = _geometry(shape_or_path, cfg, events)
+    run = ProgressiveRun(geo, lambda cylinders: _analyze(geo, cylinders, cfg, events, refine=False), events)
+    run.run_preview()
+    result = ProgressiveResult(run)
+    if background:
+        run.start_refine(on_refined=(lambda _: on_refined(result)) if on_refined else None)
+    else:
+        run.run_refine()
+        if on_refined:
+            on_refined(result)
+    return result
+
+
+class ProgressiveResult:
+    """Vista previa inmediata (.preview) y resultado refinado (.wait(), .final, .delta)."""
+
+    def __init__(self, run):
+        self.run = run
+        self.preview = StakeResult(run.preview, run.cylinders, shape=run.geo.shape)
+        # La fase 2 refina los mismos registros (centro CoG, aletas): los arreglos de la
+        # vista previa se fijan ahora, antes de lanzarla, para que no cambien después
+        self.preview.cyl_centers
+        self._final = None
+
+    def done(self):
+        return self.run.done() or self.run.final is not None
+
+    def wait(self, timeout=None):
+        self.run.wait(timeout)
+        return self.final
+
+    @property
+    def final(self):
+        if self._final is None and self.run.final is not None:
+            self._final = StakeResult(self.run.final, self.run.cylinders, shape=self.run.geo.shape)
+        return self._final
+
+    @property
+    def delta(self):
+        """Índices añadidos (en final), eliminados (en preview) y movidos (pares preview, final)."""
+        return self.run.delta
+
+
+def _config(config):
+    cfg = dict(DEFAULT_CONFIG)
+    unknown = set(config or {}) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Claves de configuración desconocidas: {sorted(unknown)}")
+    cfg.update(config or {})
+    return cfg
+
+
+def _geometry(shape_or_path, cfg, events):
+    if isinstance(shape_or_path, (str, os.PathLike)):
+        geo = GeometryProcessor(os.fspath(shape_or_path), events=events)
+        geo.load_step()
+    else:
+        geo = GeometryProcessor(None, events=events)
+        geo.shape = shape_or_path
+        if cfg['metrics'] == 'mesh':
+            # BRepMesh guarda la triangulación en las caras: se malla una copia, no la forma del llamador
+            from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Copy
+            geo.shape = BRepBuilderAPI_Copy(shape_or_path, False).Shape()
+    geo.EARLY_REJECT = cfg['early_reject']
+    geo.METRICS = cfg['metrics']
+    geo.MESH_DEFLECTION = cfg['mesh_deflection']
+    geo.LEAN = cfg['lean']
+    geo.SYMMETRY = cfg['symmetry']
+    return geo
+
+
+def _analyze(geo, cylinders, cfg, events, refine=True):
+    """Analizador + respaldo legacy (+ re-fusión por familias) sobre los cilindros extraídos."""
+    analyzer = HeatStakeAnalyzer(events=events)
+    analyzer.LEAN = cfg['lean']
+    analyzer.MERGE_DISTANCE = cfg['merge_distance']
+    analyzer.GROUPING = cfg['grouping']
+    analyzer.LEGACY_TILED = cfg['legacy_tiled']
+    topo, cluster, _ = analyzer.analyze_all(cylinders, eps=cfg['legacy_eps'],
+                                            min_samples=cfg['legacy_min_samples'])
+    stakes = topo + cluster
+    if refine and geo.mesh is not None:
+        geo.refine_centers(topo)
+
+    if cfg['custom_rules']:
+        merger = FamilyMerger(mode='coaxial' if cfg['grouping'] == 'coaxial' else 'rules', events=events)
+        by_fam = {}
+        for s in stakes:
+            by_fam.setdefault(s.get('family_id', 'DEFAULT'), []).append(s)
+        stakes = merger.merge_all_families(by_fam)
+    return stakes
@@ -0,0 +1,131 @@
+# src/baseline.py
+import os
+import glob
+import numpy as np
+from src.revision import match_points
+
+# Columnas aceptadas en tablas de stakes (CSV/XLSX de reportes anteriores y actuales)
+_COLUMN_ALIASES = {
+    'id': ('ID',),
+    'family': ('Familia', 'Family'),
+    'x': ('X', 'Center_X'),
+    'y': ('Y', 'Center_Y'),
+    'z': ('Z', 'Center_Z'),
+    'radius': ('Radio', 'Radius'),
+}
+
+
+def _empty_arrays():
+    return {
+        'stake_ids': np.empty(0, dtype=str),
+        'stake_families': np.empty(0, dtype=str),
+        'stake_centroids': np.empty((0, 3)),
+        'stake_radii': np.empty(0)
+    }
+
+
+def _pick(columns, key):
+    for name in _COLUMN_ALIASES[key]:
+        if name in columns:
+            return name
+    return None
+
+
+def load_stake_table(path):
+    """
+    Lee un juego de stakes y lo devuelve como arreglos 'stake_*' (como revision.stake_arrays).
+    Formatos: .npz (snapshot de revisión), .csv / .xlsx (heat_stakes_coordinates.csv,
+    Reporte_*.xlsx) y .xyz (X Y Z ID).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npz':
+        with np.load(path, allow_pickle=False) as data:
+            return {k: data[k] for k in _empty_arrays()}
+
+    import pandas as pd
+    if ext == '.xyz':
+        df = pd.read_csv(path, sep=r'\s+', comment='#', header=None)
+        df = df.rename(columns={0: 'X', 1: 'Y', 2: 'Z', 3: 'ID'})
+    elif ext in ('.xlsx', '.xls'):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path)
+
+    cols = {key: _pick(df.columns, key) for key in _COLUMN_ALIASES}
+    if not (cols['x'] and cols['y'] and cols['z']):
+        raise ValueError(f"Sin columnas de coordenadas en {path}")
+    n = len(df)
+    arrays = _empty_arrays()
+    arrays['stake_centroids'] = df[[cols['x'], cols['y'], cols['z']]].to_numpy(dtype=float).reshape(-1, 3)
+    arrays['stake_ids'] = df[cols['id']].astype(str).to_numpy() if cols['id'] else np.arange(n).astype(str)
+    arrays['stake_families'] = df[cols['family']].astype(str).to_numpy() if cols['family'] else np.full(n, 'UNK')
+    arrays['stake_radii'] = df[cols['radius']].to_numpy(dtype=float) if cols['radius'] else np.zeros(n)
+    return arrays
+
+
+def load_source(path):
+    """
+    Devuelve {pieza: arreglos 'stake_*'} desde:
+      - un almacén de resultados (carpeta con manifest.json o manifest.log)
+      - una carpeta de reportes (Reportes/<pieza>/...): por pieza se usa el
+        snapshot revision_*.npz y, si no hay, el Reporte_*.xlsx
+      - un archivo suelto (una sola pieza, con el nombre del archivo)
+    """
+    from src.results_store import ResultsStore
+    if ResultsStore.exists(path):
+        store = ResultsStore(path)
+        parts = {}
+        for part in store.parts():
+            stakes = store.part_stakes(part)
+            arrays = _empty_arrays()
+            if stakes:
+                arrays['stake_ids'] = np.array([s['cluster_id'] for s in stakes])
+                arrays['stake_families'] = np.array([s['family_id'] for s in stakes])
+                arrays['stake_centroids'] = np.array([s['analysis']['centroid'] for s in stakes], dtype=float)
+                arrays['stake_radii'] = np.array([s['analysis']['avg_radius'] for s in stakes], dtype=float)
+            parts[part] = arrays
+        return parts
+
+    if os.path.isdir(path):
+        parts = {}
+        for pattern in ("Reporte_*.xlsx", "revision_*.npz"):  # el snapshot tiene prioridad
+            for file in glob.glob(os.path.join(path, "**", pattern), recursive=True):
+                name = os.path.splitext(os.path.basename(file))[0].split('_', 1)[1]
+                parts[name] = file
+        return {part: load_stake_table(file) for part, file in sorted(parts.items())}
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return {name: load_stake_table(path)}
+
+
+def compare_stakes(baseline, current, tolerance=5.0, shift_tolerance=0.01):
+    """
+    Empareja (KD-tree, 1 a 1, tolerancia en mm) los stakes actuales con la línea base.
+    Devuelve faltantes, sobrantes, desplazados y estadísticas de desplazamiento.
+    """
+    i_base, i_cur, dist = match_points(baseline['stake_centroids'], current['stake_centroids'], tolerance)
+    shifted = dist > shift_tolerance
+    return {
+        'matched': len(dist),
+        'missing': np.setdiff1d(np.arange(len(baseline['stake_centroids'])), i_base),
+        'extra': np.setdiff1d(np.arange(len(current['stake_centroids'])), i_cur),
+        'shifted': np.column_stack([i_base[shifted], i_cur[shifted]]).astype(np.intp),
+        'shift_distance': dist[shifted],
+        'distances': dist
+    }
+
+
+def displacement_stats(distances):
+    distances = np.asarray(distances, dtype=float)
+    if len(distances) == 0:
+        return {'mean': 0.0, 'median': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'mean': float(distances.mean()),
+        'median': float(np.median(distances)),
+        'p95': float(np.percentile(distances, 95)),
+        'max': float(distances.max())
+    }
+
+
+def is_regression(result):
+    return len(result['missing']) > 0 or len(result['extra']) > 0 or len(result['shifted']) > 0
@@ -0,0 +1,269 @@
+# src/clustering.py
+import numpy as np
+
+# Medio vecindario de celdas: (0,0,0) + las 13 celdas "mayores" lexicográficamente.
+# Recorrer solo la mitad de las 26 vecinas evita generar cada par dos veces;
+# junto con la celda propia cubre exactamente las 27 celdas del vecindario.
+_HALF_SHELL = [(dx, dy, dz)
+               for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+               if (dx, dy, dz) > (0, 0, 0)]
+
+# Máximo de pares candidatos que se materializan a la vez (limita la memoria)
+_PAIR_CHUNK = 1 << 21
+
+
+def radius_pairs(points, eps):
+    """
+    Devuelve todos los pares (i, j), i < j, con distancia <= eps.
+
+    Los puntos se indexan en una rejilla uniforme de celda eps; cada celda
+    solo se compara con sus vecinas, por lo que el costo es casi lineal.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    n = len(points)
+    empty = np.empty(0, dtype=np.intp)
+    if n < 2 or eps <= 0:
+        return empty, empty
+
+    # Celda >= eps (se agranda si la clave entera pudiera desbordarse)
+    origin = points.min(axis=0)
+    extent = float(np.max(points.max(axis=0) - origin))
+    cell = max(float(eps), extent / float(1 << 20))
+
+    coords = np.floor((points - origin) / cell).astype(np.int64) + 1
+    dims = coords.max(axis=0) + 2
+    keys = (coords[:, 0] * dims[1] + coords[:, 1]) * dims[2] + coords[:, 2]
+
+    order = np.argsort(keys, kind='stable')
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    eps_sq = float(eps) ** 2
+
+    out_i, out_j = [], []
+    for dx, dy, dz in [(0, 0, 0)] + _HALF_SHELL:
+        shift = (dx * dims[1] + dy) * dims[2] + dz
+        if shift == 0:
+            cells_a = np.arange(len(cell_keys))
+            cells_b = cells_a
+        else:
+            target = cell_keys + shift
+            pos = np.searchsorted(cell_keys, target)
+            pos[pos == len(cell_keys)] = 0
+            hit = cell_keys[pos] == target
+            cells_a = np.flatnonzero(hit)
+            cells_b = pos[hit]
+        if len(cells_a) == 0:
+            continue
+
+        for i, j in _expand_cell_pairs(cells_a, cells_b, starts, counts, order, same=(shift == 0)):
+            diff = points[i] - points[j]
+            close = np.einsum('ij,ij->i', diff, diff) <= eps_sq
+            if np.any(close):
+                i, j = i[close], j[close]
+                out_i.append(np.minimum(i, j))
+                out_j.append(np.maximum(i, j))
+
+    if not out_i:
+        return empty, empty
+    return np.concatenate(out_i), np.concatenate(out_j)
+
+
+def _expand_cell_pairs(cells_a, cells_b, starts, counts, order, same):
+    """Genera, por bloques, los pares de puntos entre celdas vecinas."""
+    na = counts[cells_a]
+    nb = counts[cells_b]
+    sizes = na * nb
+    bounds = np.cumsum(sizes)
+
+    lo = 0
+    while lo < len(cells_a):
+        base = bounds[lo - 1] if lo else 0
+        hi = max(int(np.searchsorted(bounds, base + _PAIR_CHUNK, side='right')), lo + 1)
+
+        block = np.arange(lo, hi)
+        reps = sizes[block]
+        pair = np.repeat(block, reps)
+        local = np.arange(int(reps.sum())) - np.repeat(np.cumsum(reps) - reps, reps)
+        ia = local // nb[pair]
+        ib = local % nb[pair]
+        if same:
+            keep = ia < ib
+            pair, ia, ib = pair[keep], ia[keep], ib[keep]
+
+        yield order[starts[cells_a[pair]] + ia], order[starts[cells_b[pair]] + ib]
+        lo = hi
+
+
+def connected_components(n, i, j):
+    """
+    Union-find vectorizado (enganche por mínimo + salto de punteros).
+    Devuelve para cada nodo el índice mínimo de su componente.
+    """
+    roots = np.arange(n)
+    if len(i) == 0:
+        return roots
+
+    while True:
+        ri, rj = roots[i], roots[j]
+        pending = ri != rj
+        if not np.any(pending):
+            return roots
+        ri, rj = ri[pending], rj[pending]
+        low = np.minimum(ri, rj)
+        np.minimum.at(roots, ri, low)
+        np.minimum.at(roots, rj, low)
+
+        # Compresión total: cada nodo apunta directo a su raíz
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots = jumped
+
+
+def grid_cluster_labels(points, eps):
+    """
+    Equivalente a DBSCAN(eps, min_samples=1).fit_predict(points):
+    componentes conexas del grafo de vecindad eps, etiquetadas en el orden
+    en que aparece su primer punto.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    i, j = radius_pairs(points, eps)
+    roots = connected_components(len(points), i, j)
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels.reshape(-1)
+
+
+def cluster_labels(points, eps, backend='grid'):
+    """Clustering de componentes conexas con el motor seleccionado ('grid' o 'sklearn')."""
+    if backend == 'grid':
+        return grid_cluster_labels(points, eps)
+    if backend == 'sklearn':
+        from sklearn.cluster import DBSCAN
+        return DBSCAN(eps=eps, min_samples=1).fit_predict(np.asarray(points, dtype=float))
+    raise ValueError(f"Motor de clustering desconocido: {backend}")
+
+
+def dbscan_labels(points, eps, min_samples):
+    """
+    DBSCAN exacto a partir de los pares de vecindad (mismas etiquetas que sklearn):
+    núcleos = puntos con >= min_samples vecinos (incluyéndose), clusters numerados
+    por su núcleo de menor índice y cada borde asignado al cluster de menor etiqueta.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    i, j = radius_pairs(points, eps)
+    counts = np.bincount(i, minlength=len(points)) + np.bincount(j, minlength=len(points))
+    return _labels_from_pairs(len(points), counts, i, j, min_samples)
+
+
+def tiled_dbscan(points, eps, min_samples, tile_size=None, workers=None, target_per_tile=20000):
+    """
+    DBSCAN por teselas con halo de ancho eps, ejecutado en un pool de procesos.
+
+    Cada tesela recibe solo sus puntos propios + el halo, de modo que la memoria
+    por worker depende del tamaño de la tesela y no del modelo completo. Los
+    clusters que cruzan fronteras se cosen con union-find global, por lo que
+    el resultado coincide exactamente con la corrida global.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    n = len(points)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    origin = points.min(axis=0)
+    extent = points.max(axis=0) - origin
+    if tile_size is None:
+        n_tiles = max(1.0, n / float(target_per_tile))
+        tile_size = float(np.max(extent)) / max(1.0, np.cbrt(n_tiles))
+    tile_size = max(float(tile_size), float(eps), 1e-9)
+
+    tile_coords = np.floor((points - origin) / tile_size).astype(np.int64)
+    tile_keys, tile_of = np.unique(tile_coords, axis=0, return_inverse=True)
+    by_tile = np.argsort(tile_of.reshape(-1), kind='stable')
+    bounds = np.cumsum(np.bincount(tile_of.reshape(-1), minlength=len(tile_keys)))[:-1]
+    tiles = {tuple(int(v) for v in key): members
+             for key, members in zip(tile_keys, np.split(by_tile, bounds))}
+
+    if len(tiles) == 1:
+        return dbscan_labels(points, eps, min_samples)
+
+    jobs = []
+    for key, owned in tiles.items():
+        lo = origin + np.array(key) * tile_size - eps
+        hi = lo + tile_size + 2 * eps
+
+        # El halo solo puede venir de las 26 teselas vecinas (tile_size >= eps)
+        halo = []
+        for dx, dy, dz in [(a, b, c) for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1)]:
+            if (dx, dy, dz) == (0, 0, 0):
+                continue
+            other = tiles.get((key[0] + dx, key[1] + dy, key[2] + dz))
+            if other is not None:
+                p = points[other]
+                inside = np.all((p >= lo) & (p <= hi), axis=1)
+                halo.append(other[inside])
+        halo = np.concatenate(halo) if halo else np.empty(0, dtype=np.intp)
+
+        members = np.concatenate([owned, halo])
+        jobs.append((points[members], members, len(owned), eps))
+
+    counts = np.zeros(n, dtype=np.int64)
+    pair_i, pair_j = [], []
+    if workers == 1:
+        results = map(_tile_neighbours, jobs)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_tile_neighbours, jobs)
+    try:
+        for owned_idx, owned_counts, gi, gj in results:
+            counts[owned_idx] = owned_counts
+            pair_i.append(gi)
+            pair_j.append(gj)
+    finally:
+        if workers != 1:
+            pool.shutdown()
+
+    i = np.concatenate(pair_i)
+    j = np.concatenate(pair_j)
+    return _labels_from_pairs(n, counts, i, j, min_samples)
+
+
+def _tile_neighbours(job):
+    """
+    Worker de tesela: cuenta vecinos de los puntos propios y devuelve los pares
+    con índices globales. Un par se reporta solo en la tesela dueña de su
+    extremo de menor índice global, así no se duplica entre teselas.
+    """
+    tile_points, members, n_owned, eps = job
+    li, lj = radius_pairs(tile_points, eps)
+
+    counts = np.bincount(li, minlength=len(members)) + np.bincount(lj, minlength=len(members))
+    gi, gj = members[li], members[lj]
+    low_local = np.where(gi < gj, li, lj)
+    keep = low_local < n_owned
+    gi, gj = gi[keep], gj[keep]
+
+    return members[:n_owned], counts[:n_owned], np.minimum(gi, gj), np.maximum(gi, gj)
+
+
+def _labels_from_pairs(n, neighbour_counts, i, j, min_samples):
+    core = neighbour_counts + 1 >= min_samples
+    labels = np.full(n, -1, dtype=np.intp)
+    core_idx = np.flatnonzero(core)
+    if len(core_idx) == 0:
+        return labels
+
+    both = core[i] & core[j]
+    roots = connected_components(n, i[both], j[both])
+    _, labels[core_idx] = np.unique(roots[core_idx], return_inverse=True)
+
+    # Bordes: el cluster de menor etiqueta entre sus núcleos vecinos
+    mixed = core[i] != core[j]
+    border = np.where(core[i[mixed]], j[mixed], i[mixed])
+    owner = np.where(core[i[mixed]], i[mixed], j[mixed])
+    if len(border):
+        best = np.full(n, np.iinfo(np.intp).max, dtype=np.intp)
+        np.minimum.at(best, border, labels[owner])
+        reached = best != np.iinfo(np.intp).max
+        labels[reached] = best[reached]
+    return labels
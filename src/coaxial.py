@@ -0,0 +1,121 @@
+# src/coaxial.py
+import numpy as np
+from src.clustering import radius_pairs, connected_components, grid_cluster_labels
+from src.members import stake_cylinders
+
+
+def canonical_axes(points, directions):
+    """
+    Canonización vectorizada de rectas (eje de cada cilindro):
+    - dirección unitaria con signo normalizado (componente dominante positiva)
+    - pie del eje: proyección del punto sobre el plano perpendicular por el origen
+    - coordenada axial t (posición del punto a lo largo del eje)
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    d = np.asarray(directions, dtype=float).reshape(-1, 3)
+    d = d / np.linalg.norm(d, axis=1, keepdims=True)
+
+    dominant = np.abs(d).argmax(axis=1)
+    sign = np.sign(d[np.arange(len(d)), dominant])
+    sign[sign == 0] = 1.0
+    d = d * sign[:, None]
+
+    t = np.einsum('ij,ij->i', points, d)
+    foot = points - t[:, None] * d
+    return d, foot, t
+
+
+def axis_points(cylinders):
+    """
+    Punto exacto sobre el eje de cada cilindro: 'axis_location' del
+    gp_Cylinder. El CoG ('center') de una cara partida en mitades queda a
+    2r/π del eje, así que solo se usa si el registro no trae la ubicación.
+    """
+    return np.array([c['axis_location'] if 'axis_location' in c else c['center'] for c in cylinders],
+                    dtype=float).reshape(-1, 3)
+
+
+def coaxial_labels(points, directions, radial_tolerance=0.5, angle_tolerance=0.02, max_axial_gap=None,
+                   on_axis=None):
+    """
+    Agrupa cilindros que comparten eje. Las direcciones se cubetean en una
+    rejilla (hash con tolerancia: se une cada celda con sus vecinas, y d con -d),
+    y dentro de cada grupo de dirección los pies del eje se cubetean igual.
+    Si max_axial_gap se indica, un eje compartido se parte donde hay huecos
+    mayores a lo largo del eje (stakes alineados pero distintos).
+    on_axis: puntos exactos sobre cada eje (axis_points) para el pie; 'points'
+    (centros) sigue dando la posición axial. Sin on_axis se usa 'points'.
+    Etiquetas numeradas por orden de primera aparición, como DBSCAN.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    on_axis = points if on_axis is None else np.asarray(on_axis, dtype=float).reshape(-1, 3)
+    n = len(points)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    d, _, _ = canonical_axes(points, directions)
+
+    # 1. Grupos de dirección (d y -d son la misma recta)
+    both = np.vstack([d, -d])
+    i, j = radius_pairs(both, angle_tolerance)
+    dir_roots = connected_components(n, i % n, j % n)
+
+    labels = np.empty(n, dtype=np.intp)
+    next_label = 0
+    for root in np.unique(dir_roots):
+        members = np.flatnonzero(dir_roots == root)
+
+        # Dirección común del grupo (alineada con el primer miembro)
+        dm = d[members]
+        dm = dm * np.sign(dm @ dm[0])[:, None]
+        axis = dm.mean(axis=0)
+        axis /= np.linalg.norm(axis)
+
+        t = points[members] @ axis
+        q = on_axis[members]
+        foot = q - (q @ axis)[:, None] * axis
+
+        # 2. Rectas coincidentes: pies del eje dentro de la tolerancia radial
+        sub = grid_cluster_labels(foot, radial_tolerance)
+        if max_axial_gap is not None:
+            sub = _split_axial_gaps(sub, t, max_axial_gap)
+
+        labels[members] = sub + next_label
+        next_label += int(sub.max()) + 1
+
+    _, first = np.unique(labels, return_index=True)
+    rank = np.empty(next_label, dtype=np.intp)
+    rank[labels[np.sort(first)]] = np.arange(len(first))
+    return rank[labels]
+
+
+def _split_axial_gaps(labels, t, max_gap):
+    """Parte cada grupo coaxial donde dos cilindros consecutivos distan más de max_gap."""
+    order = np.lexsort((t, labels))
+    lab, ts = labels[order], t[order]
+    new_segment = np.ones(len(order), dtype=bool)
+    new_segment[1:] = (lab[1:] != lab[:-1]) | (np.diff(ts) > max_gap)
+    segments = np.cumsum(new_segment) - 1
+
+    out = np.empty(len(labels), dtype=np.intp)
+    out[order] = segments
+    return out
+
+
+def stake_axis(stake):
+    """
+    Eje (dirección unitaria, punto) de un stake a partir de sus cilindros.
+    El punto está sobre el eje (pie medio de las ubicaciones exactas) a la
+    altura axial del centroide reportado.
+    """
+    cylinders = stake_cylinders(stake)
+    if not cylinders:
+        return None
+    dirs = np.array([c['direction'] for c in cylinders], dtype=float)
+    dirs = dirs * np.sign(dirs @ dirs[0])[:, None]
+    axis = dirs.mean(axis=0)
+    axis /= np.linalg.norm(axis)
+    q = axis_points(cylinders)
+    foot = (q - (q @ axis)[:, None] * axis).mean(axis=0)
+    centroid = np.asarray(stake['analysis']['centroid'], dtype=float)
+    return axis, foot + (centroid @ axis) * axis
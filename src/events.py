@@ -0,0 +1,130 @@
+# src/events.py
+import sys
+import json
+import time
+
+
+class EventBus:
+    """
+    Bus de eventos de progreso. Los módulos emiten eventos y los sinks suscritos
+    deciden qué hacer con ellos (consola, archivo JSON-lines, callback de la GUI).
+
+    Eventos: 'message', 'stage_started', 'stage_finished', 'progress', 'stakes_found'
+    (y 'preview_ready' / 'refined' de la detección progresiva).
+    Con quiet=True no se emite nada desde los bucles calientes (mensajes 'hot'
+    y progreso por cara); solo quedan los eventos de etapa.
+    """
+
+    def __init__(self, quiet=False, progress_interval=0.2):
+        self.quiet = quiet
+        self.progress_interval = progress_interval
+        self.sinks = []
+        self._last_progress = {}
+        self._stage_start = {}
+
+    def subscribe(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    def emit(self, kind, **data):
+        if not self.sinks:
+            return
+        event = {'event': kind, 't': time.time()}
+        event.update(data)
+        for sink in self.sinks:
+            sink(event)
+
+    def message(self, text="", hot=False):
+        """Reemplazo de print(); los mensajes hot se suprimen en modo silencioso."""
+        if hot and self.quiet:
+            return
+        self.emit('message', text=text, hot=hot)
+
+    def stage_started(self, stage, **data):
+        self._stage_start[stage] = time.time()
+        self.emit('stage_started', stage=stage, **data)
+
+    def stage_finished(self, stage, **data):
+        start = self._stage_start.pop(stage, None)
+        elapsed = time.time() - start if start is not None else None
+        self.emit('stage_finished', stage=stage, elapsed=elapsed, **data)
+
+    def progress(self, stage, done, total):
+        """Progreso de un bucle caliente, limitado a un evento cada progress_interval."""
+        if self.quiet or not self.sinks:
+            return
+        now = time.time()
+        if done < total and now - self._last_progress.get(stage, 0.0) < self.progress_interval:
+            return
+        self._last_progress[stage] = now
+        self.emit('progress', stage=stage, done=done, total=total)
+
+    def stakes_found(self, count, source, **data):
+        self.emit('stakes_found', count=count, source=source, **data)
+
+
+class ConsoleSink:
+    """Imprime mensajes y, como máximo cada min_interval segundos, el progreso."""
+
+    def __init__(self, stream=None, min_interval=1.0):
+        self.stream = stream
+        self.min_interval = min_interval
+        self._last = 0.0
+
+    def __call__(self, event):
+        stream = self.stream or sys.stdout
+        kind = event['event']
+        if kind == 'message':
+            print(event['text'], file=stream)
+        elif kind == 'progress':
+            done, total = event['done'], event['total']
+            if done < total and event['t'] - self._last < self.min_interval:
+                return
+            self._last = event['t']
+            pct = 100.0 * done / total if total else 100.0
+            print(f"   ⏳ {event['stage']}: {done}/{total} ({pct:.0f}%)", file=stream)
+            stream.flush()
+
+
+class JsonLinesSink:
+    """Escribe cada evento (salvo los mensajes de texto) como una línea JSON."""
+
+    def __init__(self, path_or_stream, include_messages=False):
+        if isinstance(path_or_stream, str):
+            self.stream = open(path_or_stream, 'a', encoding='utf-8')
+            self._owns = True
+        else:
+            self.stream = path_or_stream
+            self._owns = False
+        self.include_messages = include_messages
+
+    def __call__(self, event):
+        if event['event'] == 'message' and not self.include_messages:
+            return
+        self.stream.write(json.dumps(event, default=str) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self._owns:
+            self.stream.close()
+
+
+class CallbackSink:
+    """Reenvía a una función los eventos de los tipos indicados (o todos)."""
+
+    def __init__(self, callback, kinds=None):
+        self.callback = callback
+        self.kinds = set(kinds) if kinds else None
+
+    def __call__(self, event):
+        if self.kinds is None or event['event'] in self.kinds:
+            self.callback(event)
+
+
+# Bus compartido por defecto: consola, como los print() de siempre
+default_bus = EventBus()
+default_bus.subscribe(ConsoleSink())
@@ -1,13 +1,25 @@
 # src/family_merger.py
 import numpy as np
 from itertools import combinations
+from src.coaxial import coaxial_labels, stake_axis
+from src.members import stake_cylinders, merged_members
+from src.events import default_bus
 class FamilyMerger:
     """
     Sistema completo para fusionar diferentes familias de heat stakes
     según reglas configurables y calcular centros de gravedad.
     """
     
-    def __init__(self):
+    def __init__(self, mode='rules', events=None):
+        self.events = events or default_bus
+        # 'rules': fusión por distancia según merge_rules
+        # 'coaxial': fusión de stakes que comparten eje (sin umbrales por par de familias)
+        self.mode = mode
+        self.COAXIAL_TOLERANCE = 0.5
+        self.COAXIAL_ANGLE = 0.02
+        self.MAX_AXIAL_GAP = 30.0  # Hueco máximo a lo largo del eje dentro de un mismo stake
+        self._merged_count = 0     # Numeración de stakes fusionados (IDs reproducibles)
+
         # Distancias de fusión por tipo de combinación
         self.merge_rules = {
             'GRP1+GRP2': 20.0,      # Verde + Azul
@@ -35,7 +47,13 @@ class FamilyMerger:
         Returns:
             Lista de stakes fusionados con centros de gravedad calculados
         """
-        print(f"\n🔗 Sistema de fusión de familias iniciado...")
+        self.events.message(f"\n🔗 Sistema de fusión de familias iniciado...")
+        self.events.stage_started('merge')
+        
+        if self.mode == 'coaxial':
+            all_stakes = self._merge_coaxial(family_stakes)
+            self.events.stage_finished('merge', stakes=len(all_stakes))
+            return all_stakes
         
         all_stakes = []
         used_stakes = set()  # Rastrear stakes ya fusionados
@@ -64,7 +82,8 @@ class FamilyMerger:
             if stake_id not in used_stakes:
                 all_stakes.append(stake)
         
-        print(f"✅ Total de heat stakes finales: {len(all_stakes)}")
+        self.events.message(f"✅ Total de heat stakes finales: {len(all_stakes)}")
+        self.events.stage_finished('merge', stakes=len(all_stakes))
         return all_stakes
     
     def _process_fusion_rule(self, families_to_merge, family_stakes, stake_id_map, used_stakes):
@@ -100,7 +119,7 @@ class FamilyMerger:
         """
         merged_stakes = []
         
-        print(f"\n   🔍 Buscando fusiones: {family1} + {family2} (distancia máx: {max_distance}mm)")
+        self.events.message(f"\n   🔍 Buscando fusiones: {family1} + {family2} (distancia máx: {max_distance}mm)")
         
         # Encontrar IDs de stakes
         stakes1_ids = self._find_stake_ids(stakes1, stake_id_map, used_stakes)
@@ -139,8 +158,9 @@ class FamilyMerger:
                 used_stakes.add(id1)
                 used_stakes.add(closest_id2)
                 
-                print(f"      ✅ Fusionados: {stake1['cluster_id']} + {stake2['cluster_id']}")
-                print(f"         Distancia: {min_distance:.2f}mm | Cilindros: {merged['analysis']['num_cylinders']}")
+                if not self.events.quiet:
+                    self.events.message(f"      ✅ Fusionados: {stake1['cluster_id']} + {stake2['cluster_id']}", hot=True)
+                    self.events.message(f"         Distancia: {min_distance:.2f}mm | Cilindros: {merged['analysis']['num_cylinders']}", hot=True)
         
         return merged_stakes
     
@@ -150,7 +170,7 @@ class FamilyMerger:
         """
         merged_stakes = []
         
-        print(f"\n   🔍 Buscando múltiples {family_id} cercanos (distancia máx: {max_distance}mm)")
+        self.events.message(f"\n   🔍 Buscando múltiples {family_id} cercanos (distancia máx: {max_distance}mm)")
         
         stake_ids = self._find_stake_ids(stakes, stake_id_map, used_stakes)
         
@@ -197,20 +217,65 @@ class FamilyMerger:
                 for gid in group_ids:
                     used_stakes.add(gid)
                 
-                stake_names = ' + '.join([s['cluster_id'] for s in group])
-                print(f"      ✅ Fusionados {len(group)} stakes: {stake_names}")
-                print(f"         Cilindros totales: {merged['analysis']['num_cylinders']}")
+                if not self.events.quiet:
+                    stake_names = ' + '.join([s['cluster_id'] for s in group])
+                    self.events.message(f"      ✅ Fusionados {len(group)} stakes: {stake_names}", hot=True)
+                    self.events.message(f"         Cilindros totales: {merged['analysis']['num_cylinders']}", hot=True)
         
         return merged_stakes
     
+    def _merge_coaxial(self, family_stakes):
+        """
+        Fusiona stakes (de cualquier familia) cuyos cilindros comparten eje.
+        Los stakes sin cilindros (legacy) se conservan tal cual.
+        """
+        self.events.message(f"\n   🔍 Buscando stakes coaxiales (tolerancia: {self.COAXIAL_TOLERANCE}mm)")
+        
+        stakes, families, axes = [], [], []
+        passthrough = []
+        for family_id, members in family_stakes.items():
+            for stake in members:
+                axis = stake_axis(stake)
+                if axis is None:
+                    passthrough.append(stake)
+                    continue
+                stakes.append(stake)
+                families.append(family_id)
+                axes.append(axis)
+        
+        if not stakes:
+            return passthrough
+        
+        directions = np.array([a[0] for a in axes])
+        points = np.array([a[1] for a in axes])
+        labels = coaxial_labels(points, directions, self.COAXIAL_TOLERANCE, self.COAXIAL_ANGLE,
+                                max_axial_gap=self.MAX_AXIAL_GAP)
+        
+        all_stakes = []
+        for label in range(int(labels.max()) + 1):
+            idx = np.flatnonzero(labels == label)
+            if len(idx) == 1:
+                all_stakes.append(stakes[idx[0]])
+                continue
+            group = [stakes[i] for i in idx]
+            merged = self._create_merged_stake(group, [families[i] for i in idx], distance=0)
+            all_stakes.append(merged)
+            
+            if not self.events.quiet:
+                stake_names = ' + '.join([s['cluster_id'] for s in group])
+                self.events.message(f"      ✅ Fusionados {len(group)} stakes coaxiales: {stake_names}", hot=True)
+        
+        all_stakes.extend(passthrough)
+        self.events.message(f"✅ Total de heat stakes finales: {len(all_stakes)}")
+        return all_stakes
+    
     def _create_merged_stake(self, stakes_to_merge, original_families, distance):
         """
         ⭐⭐⭐ Crea un stake fusionado con centro de gravedad calculado ⭐⭐⭐
         """
-        # Combinar todos los cilindros
-        all_cylinders = []
-        for stake in stakes_to_merge:
-            all_cylinders.extend(stake.get('cylinders', []))
+        # Combinar todos los cilindros (en modo lean solo se concatenan índices)
+        members = merged_members(stakes_to_merge)
+        all_cylinders = stake_cylinders(members)
         
         # ⭐ CALCULAR CENTRO DE GRAVEDAD ⭐
         positions = np.array([c['center'] for c in all_cylinders])
@@ -227,16 +292,17 @@ class FamilyMerger:
         all_planes = [stake['analysis'].get('connected_planes', 0) for stake in stakes_to_merge]
         max_planes = max(all_planes) if all_planes else 0
         
-        # Generar ID único
-        unique_families = list(set(original_families))
+        # Generar ID único (orden de aparición y contador: igual en cada corrida)
+        unique_families = list(dict.fromkeys(original_families))
         family_str = '+'.join(unique_families)
-        merged_id = f"MERGED-{family_str}-{id(stakes_to_merge)%1000}"
+        self._merged_count += 1
+        merged_id = f"MERGED-{family_str}-{self._merged_count}"
         
         return {
             'cluster_id': merged_id,
             'family_id': 'MERGED',
             'original_families': unique_families,
-            'cylinders': all_cylinders,
+            **members,
             'analysis': {
                 'centroid': tuple(centroid),  # ⭐ Centro de gravedad
                 'num_cylinders': len(all_cylinders),
@@ -283,15 +349,15 @@ class FamilyMerger:
         if rule not in self.fusion_priority:
             self.fusion_priority.append(rule)
         
-        print(f"✅ Nueva regla agregada: {rule_key} con distancia {max_distance}mm")
+        self.events.message(f"✅ Nueva regla agregada: {rule_key} con distancia {max_distance}mm")
     
     def print_fusion_summary(self, merged_stakes):
         """
         Imprime un resumen de las fusiones realizadas.
         """
-        print("\n" + "="*60)
-        print("📊 RESUMEN DE FUSIONES")
-        print("="*60)
+        self.events.message("\n" + "="*60)
+        self.events.message("📊 RESUMEN DE FUSIONES")
+        self.events.message("="*60)
         
         by_type = {}
         for stake in merged_stakes:
@@ -302,16 +368,18 @@ class FamilyMerger:
                 by_type[families].append(stake)
         
         for fusion_type, stakes in by_type.items():
-            print(f"\n🔹 Tipo: {fusion_type}")
-            print(f"   Cantidad: {len(stakes)}")
+            self.events.message(f"\n🔹 Tipo: {fusion_type}")
+            self.events.message(f"   Cantidad: {len(stakes)}")
             
             total_cylinders = sum(s['analysis']['num_cylinders'] for s in stakes)
             avg_cylinders = total_cylinders / len(stakes)
-            print(f"   Cilindros promedio: {avg_cylinders:.1f}")
+            self.events.message(f"   Cilindros promedio: {avg_cylinders:.1f}")
             
+            if self.events.quiet:
+                continue
             for stake in stakes:
                 c = stake['analysis']['centroid']
                 num_cyl = stake['analysis']['num_cylinders']
-                print(f"      • {stake['cluster_id']}: {num_cyl} cilindros en ({c[0]:.1f}, {c[1]:.1f}, {c[2]:.1f})")
+                self.events.message(f"      • {stake['cluster_id']}: {num_cyl} cilindros en ({c[0]:.1f}, {c[1]:.1f}, {c[2]:.1f})", hot=True)
         
-        print("\n" + "="*60)
\ No newline at end of file
+        self.events.message("\n" + "="*60)
\ No newline at end of file
@@ -1,109 +1,674 @@
 # src/geometry.py
 from OCC.Core.STEPControl import STEPControl_Reader
 from OCC.Core.TopExp import TopExp_Explorer, topexp
-from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_EDGE
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_EDGE, TopAbs_WIRE
 from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
-from OCC.Core.GeomAbs import GeomAbs_Cylinder, GeomAbs_Plane
+from OCC.Core.GeomAbs import GeomAbs_Cylinder, GeomAbs_Plane, GeomAbs_Cone, GeomAbs_Sphere, GeomAbs_Torus
 from OCC.Core.BRepTools import breptools
-from OCC.Core.TopTools import TopTools_IndexedDataMapOfShapeListOfShape, TopTools_ListIteratorOfListOfShape
+from OCC.Core.TopTools import (TopTools_IndexedDataMapOfShapeListOfShape, TopTools_ListIteratorOfListOfShape,
+                               TopTools_IndexedMapOfShape)
+from OCC.Core.TopoDS import topods
 from OCC.Core.BRepExtrema import BRepExtrema_DistShapeShape
 from OCC.Core.Bnd import Bnd_Box
 from OCC.Core.BRepBndLib import brepbndlib_Add
 # NUEVO: Para calcular Centro de Gravedad exacto
 from OCC.Core.GProp import GProp_GProps
 from OCC.Core.BRepGProp import brepgprop_SurfaceProperties
+import time
+import weakref
+import numpy as np
+from collections import Counter
+from src.events import default_bus
+from src.members import stake_cylinders
+from src.step_scanner import StepScanner
+from src.symmetry import (find_mirror_plane, split_halves, release_near_breakers, reflect_points,
+                          reflect_directions, AXIS_NAMES)
+
+
+def exact_center(face):
+    # --- CÁLCULO DE CENTRO DE GRAVEDAD (CoG) ---
+    # En lugar de usar la ubicación del eje (que puede estar desplazada),
+    # calculamos el centro geométrico real de la superficie.
+    props = GProp_GProps()
+    brepgprop_SurfaceProperties(face, props)
+    cog = props.CentreOfMass() # Punto exacto del centro
+    return (cog.X(), cog.Y(), cog.Z())
+
+
+def axis_center(face):
+    """Centro barato: punto del eje a media altura (sin integración GProp)."""
+    cylinder_geom = BRepAdaptor_Surface(face).Cylinder()
+    _, _, v_min, v_max = breptools.UVBounds(face)
+    v_mid = 0.5 * (v_min + v_max)
+    loc = cylinder_geom.Location()
+    d = cylinder_geom.Axis().Direction()
+    return (loc.X() + d.X() * v_mid, loc.Y() + d.Y() * v_mid, loc.Z() + d.Z() * v_mid)
+
+
+class CylinderRecord(dict):
+    """
+    Registro de cilindro (se usa como dict) con propiedades costosas perezosas:
+    'center' (CoG por integración GProp) y 'height' (límites UV) se calculan
+    la primera vez que alguien las lee. Radio y dirección salen gratis del gp_Cylinder.
+    Si 'guard' (watchdog) está asignado y el CoG se omite o vence el tiempo,
+    se usa el centro barato sobre el eje.
+    En modo lean el registro no guarda 'face': solo 'face_index' y 'source'
+    (weakref al GeometryProcessor), y la cara se re-resuelve en face_map al
+    leer 'face' mientras el procesador siga vivo.
+    Con 'profiler' (FaceCostRecorder) asignado, el CoG se atribuye a la cara
+    del registro aunque se calcule fuera de la extracción.
+    """
+    LAZY_KEYS = ('center', 'height')
+    guard = None
+    source = None
+    profiler = None
+
+    def _face(self):
+        face = dict.get(self, 'face')
+        if face is None and self.source is not None:
+            geo = self.source()
+            if geo is not None and geo.face_map is not None:
+                face = geo.get_face(dict.__getitem__(self, 'face_index'))
+        return face
+
+    def drop_face(self, geo):
+        """Suelta el TopoDS_Face; queda 'face_index' para re-resolverlo vía geo.face_map."""
+        if dict.pop(self, 'face', None) is not None:
+            self.source = weakref.ref(geo)
+
+    def _timed_cog(self, compute):
+        """CoG (directo o vía watchdog, también en el subproceso) contado en la fila de la cara."""
+        if self.profiler is None:
+            return compute()
+        return self.profiler.timed(dict.get(self, 'face_index', 0), 'cog_time', compute)
+
+    def __missing__(self, key):
+        face = self._face()
+        if key == 'face' and face is not None:
+            return face  # Sin cachear: el registro no retiene la cara
+        if key == 'center' and face is not None:
+            if self.guard is None:
+                self['center'] = self._timed_cog(lambda: exact_center(face))
+            else:
+                ok, center = self._timed_cog(lambda: self.guard('cog', self, lambda: exact_center(face)))
+                self['center'] = center if ok else axis_center(face)
+        elif key == 'height' and face is not None:
+            # Altura aproximada por UV
+            _, _, v_min, v_max = breptools.UVBounds(face)
+            self['height'] = abs(v_max - v_min)
+        else:
+            raise KeyError(key)
+        return dict.__getitem__(self, key)
+
+    def refine_center(self):
+        """Reemplaza un centro aproximado ('center_approx') por el CoG exacto. True si cambió."""
+        if not self.pop('center_approx', False):
+            return False
+        face = self._face()
+        if self.guard is None:
+            self['center'] = self._timed_cog(lambda: exact_center(face))
+        else:
+            ok, center = self._timed_cog(lambda: self.guard('cog', self, lambda: exact_center(face)))
+            if ok:
+                self['center'] = center
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or ((key == 'face' or key in self.LAZY_KEYS) and self._face() is not None)
+
 
 class GeometryProcessor:
-    def __init__(self, step_file):
+    def __init__(self, step_file, events=None):
         self.step_file = step_file
+        self.events = events or default_bus
         self.shape = None
         self.cached_planes = [] 
+        self.face_map = None           # TopTools_IndexedMapOfShape (índices 1..N)
+        self.FINGERPRINT_DECIMALS = 3  # Redondeo de parámetros/UV/bbox en la huella
+
+        # Cascada de descarte temprano, ordenada de más barato a más caro
+        self.CASCADE = ['radius', 'bbox', 'topology', 'spatial']
+        self.EARLY_REJECT = True       # False = devolver también los descartados (diagnóstico)
+        self.MIN_FINS = 3
+        self.MAX_STAKE_RADIUS = 10.0   # Radio máx. para aletas espaciales y respaldo legacy
+        self.MAX_RADIUS = None         # Corte duro por radio (None = desactivado)
+        self.MAX_BBOX_SIZE = None      # Corte duro por diagonal del bbox en mm (None = desactivado)
+        self.ROI = None                # (xmin, ymin, zmin, xmax, ymax, zmax) del pre-escaneo (None = sin ROI)
+        self.scan = None               # Resultado de StepScanner (prescan)
+        self.rejection_counts = Counter()
+        self.rejected_faces = set()    # Caras que la cascada descartó por sí mismas (no por la ROI)
+        self.watchdog = None           # FaceWatchdog opcional (presupuestos y deadline)
+        self.partial = False           # True si el deadline cortó la extracción
+
+        # Métricas por cara: 'exact' (OCC por cara) o 'mesh' (pre-paso sobre la triangulación)
+        self.METRICS = 'exact'
+        self.MESH_DEFLECTION = 0.2     # Flecha lineal del mallado en mm
+        self.mesh = None               # MeshFaceMetrics (solo en modo 'mesh')
+        self.profiler = None           # FaceCostRecorder opcional (costo por cara)
+        self.LEAN = False              # True = los cilindros no retienen el TopoDS_Face (solo face_index)
+        self.SYMMETRY = False          # True = buscar plano espejo y extraer solo una mitad
+        self.mirror_plane = None       # Plano detectado ({'axis', 'offset', 'score', 'tolerance'})
+
+    def prescan(self, apply_roi=False):
+        """
+        Triaje del STEP por texto, sin TransferRoots: radios y ejes de las
+        superficies cilíndricas. Con apply_roi=True los cilindros de tamaño
+        stake fuera de la ROI se descartan en la cascada ('bbox').
+        """
+        self.events.stage_started('prescan')
+        self.scan = StepScanner(self.step_file, max_radius=self.MAX_STAKE_RADIUS).scan()
+        if apply_roi:
+            self.ROI = self.scan['roi']
+        self.events.stage_finished('prescan', likely=self.scan['likely'], roi=self.ROI is not None)
+        return self.scan
 
     def load_step(self):
-        print(f"\n📂 Cargando archivo: {self.step_file}")
+        self.events.message(f"\n📂 Cargando archivo: {self.step_file}")
+        self.events.stage_started('load')
         reader = STEPControl_Reader()
         status = reader.ReadFile(self.step_file)
         if status != 1:
             raise Exception("❌ Error al leer el archivo STEP")
         reader.TransferRoots()
         self.shape = reader.OneShape()
-        print("✓ Archivo cargado correctamente")
+        self.events.message("✓ Archivo cargado correctamente")
+        self.events.stage_finished('load')
         return self.shape
 
     def extract_features_topology(self):
-        print("\n🔍 Analizando topología con CENTROS DE GRAVEDAD PRECISOS...")
+        self.events.message("\n🔍 Analizando topología con CENTROS DE GRAVEDAD PRECISOS...")
         
         if not self.shape:
             self.load_step()
 
         self._cache_all_planes()
-        map_edges_faces = TopTools_IndexedDataMapOfShapeListOfShape()
-        topexp.MapShapesAndAncestors(self.shape, TopAbs_EDGE, TopAbs_FACE, map_edges_faces)
+        map_edges_faces = self._map_edges_faces()
+
+        analyze, mirror_of = None, {}
+        if self.SYMMETRY:
+            analyze, mirror_of = self.detect_symmetry()
 
         candidates = []
-        explorer = TopExp_Explorer(self.shape, TopAbs_FACE)
         total_cyl = 0
+        self.rejection_counts = Counter()
+        self.rejected_faces = set()
+        self.partial = False
+        n_faces = self.face_map.Extent()
+        if self.profiler is not None:
+            self.profiler.resize(n_faces)
+        self.events.stage_started('extract', total=n_faces)
         
-        while explorer.More():
-            face = explorer.Current()
+        for face_index in range(1, n_faces + 1):
+            self.events.progress('extract', face_index - 1, n_faces)
+            if self.watchdog is not None and self.watchdog.expired():
+                self.partial = True
+                self.events.message(f"⚠️ Límite de tiempo alcanzado en la cara {face_index}/{n_faces}: "
+                      f"se devuelven resultados parciales")
+                break
+            if analyze is not None and not analyze[face_index - 1]:
+                continue  # Espejo de una cara ya extraída en la otra mitad
+            face = self.get_face(face_index)
             surf = BRepAdaptor_Surface(face)
             
             if surf.GetType() == GeomAbs_Cylinder:
-                connected_planes = self._count_connected_planes_topo(face, map_edges_faces)
-                
-                # Procesar cilindro con cálculo de CoG
-                cyl_data = self._process_cylinder(face, surf)
-                
-                if connected_planes < 3 and cyl_data['radius'] < 10.0:
-                    connected_planes = self._count_connected_planes_spatial(face)
-
-                cyl_data['connected_planes'] = connected_planes
-                candidates.append(cyl_data)
+                if self.profiler is not None:
+                    self.profiler.begin(face_index, surf.GetType())
+                cyl_data = self._analyze_cylinder(face, surf, map_edges_faces, face_index)
+                if self.profiler is not None:
+                    self.profiler.end()
+                if cyl_data is not None:
+                    candidates.append(cyl_data)
                 total_cyl += 1
-            
-            explorer.Next()
         
-        print(f"✓ Analizados {total_cyl} cilindros.")
+        self.events.progress('extract', n_faces, n_faces)
+        self.events.message(f"✓ Analizados {total_cyl} cilindros.")
+        if mirror_of and not self.partial:
+            reflected = self._reflect_cylinders(candidates, mirror_of)
+            self.events.message(f"🪞 Cilindros reflejados desde la otra mitad: {len(reflected)}")
+            candidates.extend(reflected)
+        self._print_rejections(total_cyl)
+        self.events.stage_finished('extract', cylinders=len(candidates), partial=self.partial)
+        if self.LEAN:
+            self._release_faces(candidates)
         return candidates
 
-    def _process_cylinder(self, face, surf):
-        cylinder_geom = surf.Cylinder()
+    def extract_features_incremental(self, previous):
+        """
+        Extracción por revisión: solo se reanalizan los cilindros cuya huella
+        no existía en la corrida anterior o que tocan una zona modificada
+        (bbox de caras añadidas, modificadas o eliminadas). El resto se copia
+        del snapshot previo.
+        """
+        self.events.message("\n🔁 Analizando revisión (solo caras modificadas)...")
+        
+        if not self.shape:
+            self.load_step()
+
+        keys, types, bboxes = self.face_fingerprints()
+        old_keys = set(previous['face_keys'].tolist())
+        new_keys = set(keys)
+
+        dirty = [bboxes[i] for i, k in enumerate(keys) if k not in old_keys]
+        removed = ~np.isin(previous['face_keys'], list(new_keys))
+        dirty.extend(previous['face_bboxes'][removed])
+        dirty = np.array(dirty, dtype=float).reshape(-1, 6)
+
+        stored = {k: i for i, k in enumerate(previous['cyl_keys'].tolist())}
+        cyl_pos = [i for i, t in enumerate(types) if t == int(GeomAbs_Cylinder)]
+        touched = self._bbox_overlaps(bboxes[cyl_pos], dirty, margin=0.15)
+
+        map_edges_faces = None
+        candidates = []
+        reused = 0
+        self.rejection_counts = Counter()
+        self.rejected_faces = set()
+        # Solo se saltan las caras que la cascada evaluó y descartó; las que no llegaron
+        # a evaluarse (deadline, ROI, mitad reflejada) se reanalizan. Snapshots viejos: ninguna
+        rejected_keys = set(previous['rejected_keys'].tolist()) if 'rejected_keys' in previous else set()
+        for pos, is_touched in zip(cyl_pos, touched):
+            face_index = pos + 1
+            row = stored.get(keys[pos])
+            if row is None and keys[pos] in rejected_keys and not is_touched:
+                # Cara sin cambios que la cascada ya había descartado
+                self.rejected_faces.add(face_index)
+                continue
+            face = self.get_face(face_index)
+            if row is not None and not is_touched:
+                loc = BRepAdaptor_Surface(face).Cylinder().Location()
+                candidates.append(CylinderRecord(
+                    face=face,
+                    axis_location=(loc.X(), loc.Y(), loc.Z()),
+                    center=tuple(previous['cyl_center'][row]),
+                    radius=float(previous['cyl_radius'][row]),
+                    height=float(previous['cyl_height'][row]),
+                    direction=tuple(previous['cyl_direction'][row]),
+                    connected_planes=int(previous['cyl_planes'][row]),
+                    face_index=face_index
+                ))
+                reused += 1
+                continue
+
+            if map_edges_faces is None:
+                map_edges_faces = self._map_edges_faces()
+            if self.profiler is not None:
+                self.profiler.resize(len(keys))
+                self.profiler.begin(face_index, GeomAbs_Cylinder)
+            cyl_data = self._analyze_cylinder(face, BRepAdaptor_Surface(face), map_edges_faces, face_index)
+            if self.profiler is not None:
+                self.profiler.end()
+            if cyl_data is not None:
+                candidates.append(cyl_data)
+
+        changed = sum(1 for k in keys if k not in old_keys)
+        self.events.message(f"✓ Caras nuevas/modificadas: {changed} | eliminadas: {int(np.sum(removed))}")
+        self.events.message(f"✓ Cilindros reutilizados: {reused} | reanalizados: {len(candidates) - reused}")
+        if self.LEAN:
+            self._release_faces(candidates)
+        return candidates
+
+    def detect_symmetry(self):
+        """
+        Plano espejo alineado con los ejes (src/symmetry.py) a partir del bbox,
+        tipo y parámetro de cada cara. Devuelve (analyze, mirror_of) para la
+        extracción, o (None, {}) si la pieza no es simétrica.
+        """
+        self.events.stage_started('symmetry')
+        types, bboxes, params = self._face_descriptors()
+        self.mirror_plane, scores = find_mirror_plane(types, bboxes, params)
+        detail = " | ".join(f"{axis}: {score:.1%}" for axis, score in scores.items())
+        if self.mirror_plane is None:
+            self.events.message(f"   🪞 Sin plano de simetría ({detail})")
+            self.events.stage_finished('symmetry', plane=None)
+            return None, {}
+        analyze, mirror_of = split_halves(types, bboxes, params, self.mirror_plane)
+        # Tolerancia del conteo espacial de aletas (0.15 mm): lo que la cara pueda "ver"
+        released = release_near_breakers(bboxes, self.mirror_plane, analyze, mirror_of, margin=0.15)
+        axis = AXIS_NAMES[self.mirror_plane['axis']]
+        self.events.message(f"   🪞 Simetría {axis} = {self.mirror_plane['offset']:.3f} ({detail}) | "
+                            f"caras a extraer: {int(analyze.sum())} de {len(analyze)} "
+                            f"({released} junto a caras sin espejo)")
+        self.events.stage_finished('symmetry', plane=axis, faces=int(analyze.sum()))
+        return analyze, mirror_of
+
+    def _face_descriptors(self):
+        """Tipo de superficie, bbox y radio (NaN si no aplica) de cada cara del mapa."""
+        n_faces = self.face_map.Extent()
+        types = np.empty(n_faces, dtype=np.int64)
+        bboxes = np.empty((n_faces, 6))
+        params = np.full(n_faces, np.nan)
+        for face_index in range(1, n_faces + 1):
+            face = self.get_face(face_index)
+            surf = BRepAdaptor_Surface(face)
+            surf_type = surf.GetType()
+            types[face_index - 1] = int(surf_type)
+            if self.mesh is not None and self.mesh.has_face(face_index):
+                bbox = self._mesh_bbox(face_index)
+            else:
+                bbox = Bnd_Box()
+                brepbndlib_Add(face, bbox)
+            bboxes[face_index - 1] = bbox.Get()
+            if surf_type == GeomAbs_Cylinder:
+                params[face_index - 1] = surf.Cylinder().Radius()
+            elif surf_type == GeomAbs_Sphere:
+                params[face_index - 1] = surf.Sphere().Radius()
+            elif surf_type == GeomAbs_Cone:
+                params[face_index - 1] = surf.Cone().RefRadius()
+        return types, bboxes, params
+
+    def _reflect_cylinders(self, candidates, mirror_of):
+        """
+        Copia especular de los cilindros de la mitad extraída sobre sus caras
+        espejo: centro, ubicación y dirección del eje reflejados; radio, aletas
+        y altura iguales. Las caras sin espejo y las que las tocan
+        (release_near_breakers) ya se extrajeron de verdad.
+        """
+        plane = self.mirror_plane
+        reflected = []
+        for cyl in candidates:
+            partner = mirror_of.get(cyl['face_index'] - 1)
+            if partner is None:
+                continue
+            face = self.get_face(partner + 1)
+            record = CylinderRecord(
+                face=face,
+                face_index=partner + 1,
+                radius=cyl['radius'],
+                axis_location=tuple(reflect_points(cyl['axis_location'], plane).tolist()),
+                direction=tuple(reflect_directions(cyl['direction'], plane).tolist()),
+                center=tuple(reflect_points(cyl['center'], plane).tolist()),
+                connected_planes=cyl['connected_planes'],
+            )
+            for key in ('height', 'center_approx', 'rejected_by'):
+                if dict.__contains__(cyl, key):
+                    record[key] = dict.__getitem__(cyl, key)
+            record.guard = cyl.guard
+            reflected.append(record)
+        return reflected
+
+    def _release_faces(self, cylinders):
+        """
+        Modo lean: los registros dejan de retener su TopoDS_Face (y con él la
+        B-Rep). Mientras este procesador viva, 'face' se re-resuelve por índice;
+        al liberarlo, cilindros y stakes ya no mantienen la forma en memoria.
+        """
+        for cyl in cylinders:
+            if isinstance(cyl, CylinderRecord):
+                cyl.drop_face(self)
+
+    def _analyze_cylinder(self, face, surf, map_edges_faces, face_index):
+        """
+        Pasa el cilindro por la cascada de predicados (CASCADE). El primero que
+        lo descarta se contabiliza en rejection_counts; con EARLY_REJECT se
+        devuelve None y no se paga ninguna etapa posterior.
+        """
+        cyl_data = self._process_cylinder(face, surf)
+        cyl_data['face_index'] = face_index
+        if self.mesh is not None and self.mesh.has_face(face_index):
+            # Centro aproximado de la malla; refine_centers() lo hace exacto al final
+            cyl_data['center'] = self.mesh.centroid(face_index)
+            cyl_data['center_approx'] = True
+        if self.watchdog is not None:
+            cyl_data.guard = self.watchdog.run
+        if self.profiler is not None:
+            cyl_data.profiler = self.profiler
         
-        # --- CÁLCULO DE CENTRO DE GRAVEDAD (CoG) ---
-        # En lugar de usar la ubicación del eje (que puede estar desplazada),
-        # calculamos el centro geométrico real de la superficie.
-        props = GProp_GProps()
-        brepgprop_SurfaceProperties(face, props)
-        cog = props.CentreOfMass() # Punto exacto del centro
+        for name in self.CASCADE:
+            keep = getattr(self, f"_predicate_{name}")(cyl_data, map_edges_faces)
+            if not keep:
+                self.rejection_counts[name] += 1
+                if not cyl_data.pop('_outside_roi', False):
+                    # Fuera de la ROI es un descarte de esta corrida, no de la cara: no se recuerda
+                    self.rejected_faces.add(face_index)
+                if self.EARLY_REJECT:
+                    return None
+                cyl_data.setdefault('rejected_by', name)
         
-        # Altura aproximada por UV
-        _, _, v_min, v_max = breptools.UVBounds(face)
-        height = abs(v_max - v_min)
+        if 'connected_planes' not in cyl_data:
+            cyl_data['connected_planes'] = self._count_connected_planes_topo(face, map_edges_faces)
+        cyl_data.pop('_bbox', None)
+        return cyl_data
+
+    # --- Predicados de la cascada (de más barato a más caro) ---
+    def _predicate_radius(self, cyl, map_edges_faces):
+        # Gratis: el radio ya viene del gp_Cylinder
+        return self.MAX_RADIUS is None or cyl['radius'] < self.MAX_RADIUS
+
+    def _predicate_bbox(self, cyl, map_edges_faces):
+        if self.ROI is not None and cyl['radius'] < self.MAX_STAKE_RADIUS:
+            # La ubicación del eje es la del AXIS2_PLACEMENT_3D que vio el pre-escaneo
+            x, y, z = cyl['axis_location']
+            xmin, ymin, zmin, xmax, ymax, zmax = self.ROI
+            if not (xmin <= x <= xmax and ymin <= y <= ymax and zmin <= z <= zmax):
+                cyl['_outside_roi'] = True
+                return False
+        if self.MAX_BBOX_SIZE is None:
+            return True
+        bbox = self._cylinder_bbox(cyl)
+        xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+        diag = ((xmax - xmin)**2 + (ymax - ymin)**2 + (zmax - zmin)**2) ** 0.5
+        return diag <= self.MAX_BBOX_SIZE
+
+    def _predicate_topology(self, cyl, map_edges_faces):
+        cyl['connected_planes'] = self._count_connected_planes_topo(cyl['face'], map_edges_faces)
+        # Sin aletas y demasiado grande para el respaldo espacial/legacy: nunca se usa
+        return cyl['connected_planes'] >= self.MIN_FINS or cyl['radius'] < self.MAX_STAKE_RADIUS
+
+    def _predicate_spatial(self, cyl, map_edges_faces):
+        if 'connected_planes' not in cyl:
+            cyl['connected_planes'] = self._count_connected_planes_topo(cyl['face'], map_edges_faces)
+        if cyl['connected_planes'] < self.MIN_FINS and cyl['radius'] < self.MAX_STAKE_RADIUS:
+            spatial = lambda: self._count_connected_planes_spatial(cyl['face'], self._cylinder_bbox(cyl))
+            if self.watchdog is None:
+                cyl['connected_planes'] = spatial()
+            else:
+                ok, hits = self.watchdog.run('spatial', cyl, spatial)
+                if ok:
+                    cyl['connected_planes'] = hits
+        return True
+
+    def _cylinder_bbox(self, cyl):
+        bbox = cyl.get('_bbox')
+        if bbox is None:
+            face_index = cyl.get('face_index')
+            if self.mesh is not None and face_index is not None and self.mesh.has_face(face_index):
+                bbox = self._mesh_bbox(face_index)
+            else:
+                bbox = Bnd_Box()
+                brepbndlib_Add(cyl['face'], bbox)
+            cyl['_bbox'] = bbox
+        return bbox
+
+    def _mesh_bbox(self, face_index):
+        bbox = Bnd_Box()
+        bbox.Update(*self.mesh.bbox(face_index))
+        return bbox
+
+    def compute_mesh_metrics(self):
+        """Malla la pieza una vez y calcula en lote centroides, bboxes y normales por cara."""
+        from src.mesh_metrics import MeshFaceMetrics
+        if not self.shape:
+            self.load_step()
+        if self.face_map is None:
+            self._build_face_map()
+        self.events.stage_started('mesh')
+        self.mesh = MeshFaceMetrics(self.shape, self.face_map, deflection=self.MESH_DEFLECTION).compute()
+        self.events.message(f"   🔺 Malla: {len(self.mesh.triangles)} triángulos en "
+                            f"{self.face_map.Extent()} caras (flecha {self.MESH_DEFLECTION} mm)")
+        self.events.stage_finished('mesh', triangles=len(self.mesh.triangles))
+        return self.mesh
+
+    def refine_centers(self, stakes):
+        """
+        Reemplaza los centros aproximados (malla) por el CoG exacto solo en los
+        cilindros de los stakes finales y recalcula su centroide y dispersión.
+        Los stakes sin lista de cilindros (respaldo legacy) conservan el centro aproximado.
+        """
+        refined = 0
+        for stake in stakes:
+            cylinders = stake_cylinders(stake)
+            changed = False
+            for cyl in cylinders:
+                if isinstance(cyl, CylinderRecord) and cyl.refine_center():
+                    refined += 1
+                    changed = True
+            if changed:
+                positions = np.array([c['center'] for c in cylinders])
+                centroid = positions.mean(axis=0)
+                analysis = stake['analysis']
+                analysis['centroid'] = tuple(centroid)
+                if 'max_spread' in analysis:
+                    analysis['max_spread'] = float(np.max(np.linalg.norm(positions - centroid, axis=1)))
+        self.events.message(f"   🎯 Centros exactos recalculados: {refined} cilindros")
+        return refined
+
+    def _print_rejections(self, total):
+        if not self.rejection_counts:
+            return
+        detail = " | ".join(f"{name}: {self.rejection_counts.get(name, 0)}" for name in self.CASCADE)
+        self.events.message(f"   📉 Cascada de descarte: {sum(self.rejection_counts.values())} de {total} ({detail})")
+
+    def get_face(self, face_index):
+        """Resuelve una cara por su índice (1..N) en el mapa indexado de caras."""
+        if self.face_map is None:
+            self._build_face_map()
+        return topods.Face(self.face_map.FindKey(face_index))
+
+    def _build_face_map(self):
+        self.face_map = TopTools_IndexedMapOfShape()
+        topexp.MapShapes(self.shape, TopAbs_FACE, self.face_map)
+        return self.face_map
+
+    def _map_edges_faces(self):
+        map_edges_faces = TopTools_IndexedDataMapOfShapeListOfShape()
+        topexp.MapShapesAndAncestors(self.shape, TopAbs_EDGE, TopAbs_FACE, map_edges_faces)
+        return map_edges_faces
+
+    # --- Huellas geométricas por cara (modo revisión) ---
+    def face_fingerprints(self):
+        """
+        Huella de cada cara del mapa: tipo de superficie, parámetros redondeados,
+        límites UV, cantidad de wires y bbox. Devuelve (claves, tipos,
+        bboxes[N,6]) y de paso llena cached_planes para el conteo espacial.
+        Sin GProp: en superficies analíticas los parámetros + límites UV fijan
+        el parche recortado, y un agujero nuevo en una cara cambia sus wires
+        (y agrega caras nuevas cuyo bbox marca la zona como modificada).
+        """
+        if not self.shape:
+            self.load_step()
+        self._build_face_map()
+        self.cached_planes = []
+        self.events.stage_started('fingerprints', faces=self.face_map.Extent())
+        t0 = time.perf_counter()
+
+        keys, types, bboxes = [], [], []
+        for face_index in range(1, self.face_map.Extent() + 1):
+            face = self.get_face(face_index)
+            surf = BRepAdaptor_Surface(face)
+            bbox = Bnd_Box()
+            brepbndlib_Add(face, bbox)
+            wires = TopExp_Explorer(face, TopAbs_WIRE)
+            n_wires = 0
+            while wires.More():
+                n_wires += 1
+                wires.Next()
+
+            surf_type = int(surf.GetType())
+            if surf_type == int(GeomAbs_Plane):
+                self.cached_planes.append((face, bbox))
+            box = bbox.Get()
+            values = self._surface_parameters(surf) + list(breptools.UVBounds(face)) + list(box) + [n_wires]
+            values = np.round(np.array(values, dtype=float), self.FINGERPRINT_DECIMALS) + 0.0
+
+            keys.append(f"{surf_type}|" + ",".join(f"{v:.{self.FINGERPRINT_DECIMALS}f}" for v in values))
+            types.append(surf_type)
+            bboxes.append(box)
+
+        self.events.message(f"   🧬 Huellas de {len(keys)} caras en {time.perf_counter() - t0:.2f}s")
+        self.events.stage_finished('fingerprints')
+        return keys, types, np.array(bboxes, dtype=float).reshape(-1, 6)
+
+    def _surface_parameters(self, surf):
+        surf_type = surf.GetType()
+        if surf_type == GeomAbs_Plane:
+            ax, extra = surf.Plane().Position(), []
+        elif surf_type == GeomAbs_Cylinder:
+            ax, extra = surf.Cylinder().Position(), [surf.Cylinder().Radius()]
+        elif surf_type == GeomAbs_Cone:
+            ax, extra = surf.Cone().Position(), [surf.Cone().RefRadius(), surf.Cone().SemiAngle()]
+        elif surf_type == GeomAbs_Sphere:
+            ax, extra = surf.Sphere().Position(), [surf.Sphere().Radius()]
+        elif surf_type == GeomAbs_Torus:
+            ax, extra = surf.Torus().Position(), [surf.Torus().MajorRadius(), surf.Torus().MinorRadius()]
+        else:
+            return []
+        loc, d = ax.Location(), ax.Direction()
+        return extra + [loc.X(), loc.Y(), loc.Z(), d.X(), d.Y(), d.Z()]
+
+    @staticmethod
+    def _bbox_overlaps(boxes, others, margin=0.0):
+        """Para cada bbox de 'boxes' indica si se cruza con alguna de 'others'."""
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 6)
+        hits = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) == 0 or len(others) == 0:
+            return hits
+        for start in range(0, len(others), 256):
+            chunk = others[start:start + 256]
+            lo_ok = boxes[:, None, :3] - margin <= chunk[None, :, 3:]
+            hi_ok = boxes[:, None, 3:] + margin >= chunk[None, :, :3]
+            hits |= np.any(np.all(lo_ok & hi_ok, axis=2), axis=1)
+        return hits
+
+    def _process_cylinder(self, face, surf):
+        start = time.perf_counter() if self.profiler is not None else None
+        cylinder_geom = surf.Cylinder()
         
-        return {
-            'face': face,
-            'center': (cog.X(), cog.Y(), cog.Z()), # Usamos el CoG real
-            'radius': cylinder_geom.Radius(),
-            'height': height,
-            'direction': (cylinder_geom.Axis().Direction().X(), 
-                          cylinder_geom.Axis().Direction().Y(), 
-                          cylinder_geom.Axis().Direction().Z())
-        }
+        # 'center' (CoG real) y 'height' se calculan al primer acceso (CylinderRecord)
+        loc = cylinder_geom.Location()
+        record = CylinderRecord(
+            face=face,
+            radius=cylinder_geom.Radius(),
+            axis_location=(loc.X(), loc.Y(), loc.Z()),
+            direction=(cylinder_geom.Axis().Direction().X(), 
+                       cylinder_geom.Axis().Direction().Y(), 
+                       cylinder_geom.Axis().Direction().Z())
+        )
+        if start is not None:
+            self.profiler.add('process_time', time.perf_counter() - start)
+            # Ubicación del reporte: sobre el eje a media altura (el origen del gp_Cylinder puede quedar lejos)
+            self.profiler.note_cylinder(record['radius'], axis_center(face))
+        return record
 
     # --- Funciones auxiliares (Sin cambios) ---
     def _cache_all_planes(self):
         self.cached_planes = []
-        exp = TopExp_Explorer(self.shape, TopAbs_FACE)
-        while exp.More():
-            face = exp.Current()
+        self._build_face_map()
+        if self.profiler is not None:
+            self.profiler.resize(self.face_map.Extent())
+        if self.METRICS == 'mesh' and self.mesh is None:
+            self.compute_mesh_metrics()
+        for face_index in range(1, self.face_map.Extent() + 1):
+            face = self.get_face(face_index)
             surf = BRepAdaptor_Surface(face)
             if surf.GetType() == GeomAbs_Plane:
-                bbox = Bnd_Box()
-                brepbndlib_Add(face, bbox)
+                if self.profiler is not None:
+                    self.profiler.begin(face_index, GeomAbs_Plane)
+                if self.mesh is not None and self.mesh.has_face(face_index):
+                    bbox = self._mesh_bbox(face_index)
+                else:
+                    bbox = Bnd_Box()
+                    brepbndlib_Add(face, bbox)
                 self.cached_planes.append((face, bbox))
-            exp.Next()
+                if self.profiler is not None:
+                    self.profiler.end()
 
     def _count_connected_planes_topo(self, cylinder_face, map_map):
+        start = time.perf_counter() if self.profiler is not None else None
         plane_count = 0
         edge_exp = TopExp_Explorer(cylinder_face, TopAbs_EDGE)
         while edge_exp.More():
@@ -118,19 +683,31 @@ class GeometryProcessor:
                         plane_count += 1
                 it.Next()
             edge_exp.Next()
+        if start is not None:
+            self.profiler.add('topo_time', time.perf_counter() - start)
         return plane_count
 
-    def _count_connected_planes_spatial(self, cylinder_face):
+    def _count_connected_planes_spatial(self, cylinder_face, face_bbox=None):
+        start = time.perf_counter() if self.profiler is not None else None
         spatial_hits = 0
         tolerance = 0.15 
         cyl_bbox = Bnd_Box()
-        brepbndlib_Add(cylinder_face, cyl_bbox)
+        if face_bbox is not None:
+            cyl_bbox.Add(face_bbox)
+        else:
+            brepbndlib_Add(cylinder_face, cyl_bbox)
         cyl_bbox.Enlarge(tolerance)
 
+        extrema_calls = 0
         for plane_face, plane_bbox in self.cached_planes:
             if not cyl_bbox.IsOut(plane_bbox):
+                extrema_calls += 1
                 dist_algo = BRepExtrema_DistShapeShape(cylinder_face, plane_face)
                 if dist_algo.IsDone():
                     if dist_algo.Value() < tolerance:
                         spatial_hits += 1
+        if start is not None:
+            self.profiler.count('bbox_tests', len(self.cached_planes))
+            self.profiler.count('extrema_calls', extrema_calls)
+            self.profiler.add('spatial_time', time.perf_counter() - start)
         return spatial_hits
\ No newline at end of file
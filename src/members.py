@@ -0,0 +1,38 @@
+# src/members.py
+import numpy as np
+
+# Un stake guarda sus cilindros de una de dos formas:
+#   - 'cylinders': lista de registros (modo normal)
+#   - 'cylinder_index' + 'cylinder_pool' (modo lean): arreglo int32 de
+#     posiciones en la lista única de cilindros extraídos, compartida por
+#     todos los stakes. Fusionar stakes concatena índices, no copia listas.
+
+
+def stake_cylinders(stake):
+    """Registros de cilindro de un stake, en cualquiera de las dos formas."""
+    index = stake.get('cylinder_index')
+    if index is None:
+        return stake.get('cylinders', [])
+    pool = stake['cylinder_pool']
+    return [pool[i] for i in index]
+
+
+def pool_members(cylinders, pool, positions):
+    """Campos de miembros para un stake lean (positions: {id(registro): posición en pool})."""
+    index = np.fromiter((positions[id(c)] for c in cylinders), dtype=np.int32, count=len(cylinders))
+    return {'cylinder_index': index, 'cylinder_pool': pool}
+
+
+def merged_members(stakes):
+    """
+    Campos de miembros del stake fusionado. Si todos comparten el mismo pool
+    se concatenan los índices; si no, se combina la lista de cilindros.
+    """
+    pools = {id(s.get('cylinder_pool')) for s in stakes}
+    if len(pools) == 1 and all(s.get('cylinder_index') is not None for s in stakes):
+        index = np.concatenate([s['cylinder_index'] for s in stakes])
+        return {'cylinder_index': index, 'cylinder_pool': stakes[0]['cylinder_pool']}
+    cylinders = []
+    for stake in stakes:
+        cylinders.extend(stake_cylinders(stake))
+    return {'cylinders': cylinders}
@@ -0,0 +1,149 @@
+# src/mesh_metrics.py
+import numpy as np
+from itertools import chain
+from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
+from OCC.Core.BRepBndLib import brepbndlib_Add
+from OCC.Core.Bnd import Bnd_Box
+from OCC.Core.GeomAbs import GeomAbs_Cylinder
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopAbs import TopAbs_REVERSED
+from OCC.Core.TopoDS import topods
+
+
+class MeshFaceMetrics:
+    """
+    Métricas aproximadas por cara a partir de la triangulación (Poly_Triangulation).
+
+    Se malla la pieza una sola vez con BRepMesh_IncrementalMesh. Solo las caras
+    cilíndricas (las que necesitan centroide) se vuelcan a buffers NumPy
+    contiguos para calcular en lote área, centroide ponderado por área y
+    normal media; el resto (planos y superficies libres, que concentran la
+    mayoría de los triángulos) solo necesita bbox, y ese lo calcula OCC en C++
+    sobre la triangulación sin pasar nodo a nodo por Python.
+    Sirve como pre-paso rápido; la evaluación exacta (GProp) queda para los
+    candidatos finales.
+    """
+
+    def __init__(self, shape, face_map, deflection=0.2, angular_deflection=0.5):
+        self.shape = shape
+        self.face_map = face_map
+        self.deflection = deflection    # Los stakes quedan acotados por angular_deflection
+        self.angular_deflection = angular_deflection
+
+        # Buffers de las caras cilíndricas (formato CSR por cara, índices 0..N-1 = cara 1..N)
+        self.nodes = None          # (P, 3) float64
+        self.node_offsets = None   # (N+1,)
+        self.triangles = None      # (T, 3) índices globales a nodes
+        self.tri_offsets = None    # (N+1,)
+        self.meshed = None         # (N,) bool: la cara tiene triangulación
+
+        # Métricas por cara (fuera de los cilindros: área 0, centroide y normal NaN)
+        self.areas = None          # (N,)
+        self.centroids = None      # (N, 3)
+        self.bboxes = None         # (N, 6) xmin, ymin, zmin, xmax, ymax, zmax
+        self.normals = None        # (N, 3)
+
+    def compute(self):
+        BRepMesh_IncrementalMesh(self.shape, self.deflection, False, self.angular_deflection, True)
+        self._collect_buffers()
+        self._compute_metrics()
+        return self
+
+    @staticmethod
+    def _face_arrays(tri, loc, base):
+        """Nodos (con la ubicación aplicada) y triángulos globales de una triangulación."""
+        n_nodes = tri.NbNodes()
+        n_tris = tri.NbTriangles()
+        # Una llamada por nodo/triángulo (Coord/Get devuelven la tupla entera)
+        pts = np.fromiter(chain.from_iterable(tri.Node(i).Coord() for i in range(1, n_nodes + 1)),
+                          dtype=float, count=3 * n_nodes).reshape(-1, 3)
+        if not loc.IsIdentity():
+            trsf = loc.Transformation()
+            m = np.array([[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)])
+            pts = pts @ m[:, :3].T + m[:, 3]
+        tris = np.fromiter(chain.from_iterable(tri.Triangle(i).Get() for i in range(1, n_tris + 1)),
+                           dtype=np.intp, count=3 * n_tris).reshape(-1, 3) - 1 + base
+        return pts, tris
+
+    def _collect_buffers(self):
+        n_faces = self.face_map.Extent()
+        node_chunks, tri_chunks = [], []
+        node_counts = np.zeros(n_faces, dtype=np.intp)
+        tri_counts = np.zeros(n_faces, dtype=np.intp)
+        reversed_faces = np.zeros(n_faces, dtype=bool)
+        self.meshed = np.zeros(n_faces, dtype=bool)
+        self.bboxes = np.full((n_faces, 6), np.nan)
+        base = 0
+
+        for k in range(n_faces):
+            face = topods.Face(self.face_map.FindKey(k + 1))
+            loc = TopLoc_Location()
+            tri = BRep_Tool.Triangulation(face, loc)
+            if tri is None:
+                continue
+            self.meshed[k] = True
+
+            if BRepAdaptor_Surface(face).GetType() != GeomAbs_Cylinder:
+                box = Bnd_Box()
+                brepbndlib_Add(face, box, True)  # Sobre los nodos de la malla, en C++
+                self.bboxes[k] = box.Get()
+                continue
+
+            pts, tris = self._face_arrays(tri, loc, base)
+            node_chunks.append(pts)
+            tri_chunks.append(tris)
+            node_counts[k] = len(pts)
+            tri_counts[k] = len(tris)
+            reversed_faces[k] = face.Orientation() == TopAbs_REVERSED
+            base += len(pts)
+
+        self.nodes = np.ascontiguousarray(np.concatenate(node_chunks)) if node_chunks else np.empty((0, 3))
+        self.triangles = np.ascontiguousarray(np.concatenate(tri_chunks)) if tri_chunks else np.empty((0, 3), dtype=np.intp)
+        self.node_offsets = np.concatenate([[0], np.cumsum(node_counts)])
+        self.tri_offsets = np.concatenate([[0], np.cumsum(tri_counts)])
+        self._reversed = reversed_faces
+
+    def _compute_metrics(self):
+        n_faces = len(self.node_offsets) - 1
+        tri_face = np.repeat(np.arange(n_faces), np.diff(self.tri_offsets))
+
+        a = self.nodes[self.triangles[:, 0]]
+        b = self.nodes[self.triangles[:, 1]]
+        c = self.nodes[self.triangles[:, 2]]
+        cross = np.cross(b - a, c - a)
+        tri_area = 0.5 * np.linalg.norm(cross, axis=1)
+        tri_centroid = (a + b + c) / 3.0
+
+        self.areas = np.bincount(tri_face, weights=tri_area, minlength=n_faces)
+        weighted = np.column_stack([np.bincount(tri_face, weights=tri_centroid[:, k] * tri_area, minlength=n_faces)
+                                    for k in range(3)])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.centroids = weighted / self.areas[:, None]
+
+        normals = np.column_stack([np.bincount(tri_face, weights=cross[:, k], minlength=n_faces)
+                                   for k in range(3)])
+        normals[self._reversed] *= -1.0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+
+        has_nodes = np.diff(self.node_offsets) > 0
+        if np.any(has_nodes):
+            starts = self.node_offsets[:-1][has_nodes]
+            self.bboxes[has_nodes, :3] = np.minimum.reduceat(self.nodes, starts, axis=0)
+            self.bboxes[has_nodes, 3:] = np.maximum.reduceat(self.nodes, starts, axis=0)
+
+    def has_face(self, face_index):
+        """True si la cara (índice 1..N) tiene triangulación."""
+        return bool(self.meshed[face_index - 1])
+
+    def centroid(self, face_index):
+        """Centroide de la malla (solo caras cilíndricas)."""
+        return tuple(self.centroids[face_index - 1])
+
+    def bbox(self, face_index, enlarge=0.0):
+        """Bbox de la cara agrandado por la flecha de mallado (la malla puede quedar dentro)."""
+        box = self.bboxes[face_index - 1]
+        margin = self.deflection + enlarge
+        return tuple(box[:3] - margin) + tuple(box[3:] + margin)
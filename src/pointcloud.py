@@ -0,0 +1,583 @@
+# src/pointcloud.py
+import os
+import re
+import numpy as np
+from sklearn.neighbors import KDTree
+from src.coaxial import coaxial_labels, canonical_axes
+from src.events import default_bus
+
+POINTCLOUD_EXTENSIONS = ('.stl', '.ply', '.xyz', '.txt', '.csv')
+
+# Tipos NumPy de las propiedades PLY
+_PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'
+}
+
+
+# --- Lectores (devuelven puntos (n,3) y normales (n,3) o None) ---
+def read_xyz(path):
+    """Texto con columnas X Y Z [NX NY NZ] separadas por espacios, comas o ';'."""
+    data = _read_text_columns(path)
+    points = data[:, :3]
+    normals = data[:, 3:6] if data.shape[1] >= 6 else None
+    return points, normals
+
+
+def _read_text_columns(path):
+    import pandas as pd
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        sample = f.readline()
+        while sample.startswith('#') or not sample.strip():
+            sample = f.readline()
+    sep = ',' if ',' in sample else ';' if ';' in sample else r'\s+'
+    data = pd.read_csv(path, sep=sep, header=None, comment='#', skip_blank_lines=True)
+    data = data.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all').dropna(axis=0)
+    return data.to_numpy(dtype=float)
+
+
+def read_stl(path):
+    """
+    STL binario o ASCII. Cada triángulo aporta su centroide y su normal
+    geométrica (más fiable que la guardada en el archivo).
+    """
+    with open(path, 'rb') as f:
+        header = f.read(84)
+    size = os.path.getsize(path)
+    n_tri = int(np.frombuffer(header[80:84], dtype='<u4')[0]) if len(header) == 84 else 0
+
+    if len(header) == 84 and 84 + 50 * n_tri == size:
+        dtype = np.dtype([('normal', '<f4', 3), ('v', '<f4', (3, 3)), ('attr', '<u2')])
+        tris = np.fromfile(path, dtype=dtype, count=n_tri, offset=84)['v'].astype(float)
+    else:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            values = re.findall(r'vertex\s+(\S+)\s+(\S+)\s+(\S+)', f.read())
+        tris = np.array(values, dtype=float).reshape(-1, 3, 3)
+
+    cross = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    norm = np.linalg.norm(cross, axis=1)
+    ok = norm > 0
+    return tris[ok].mean(axis=1), cross[ok] / norm[ok, None]
+
+
+def read_ply(path):
+    """PLY ASCII o binario (little/big endian); usa el elemento 'vertex' y sus normales si existen."""
+    with open(path, 'rb') as f:
+        fmt, elements, header_len = None, [], 0
+        while True:
+            line = f.readline()
+            header_len += len(line)
+            text = line.decode('ascii', errors='ignore').strip()
+            if text.startswith('format'):
+                fmt = text.split()[1]
+            elif text.startswith('element'):
+                _, name, count = text.split()
+                elements.append((name, int(count), []))
+            elif text.startswith('property') and elements:
+                parts = text.split()
+                if parts[1] == 'list':
+                    elements[-1][2].append((parts[4], None))
+                else:
+                    elements[-1][2].append((parts[2], _PLY_TYPES[parts[1]]))
+            elif text == 'end_header' or not line:
+                break
+
+    if not elements or elements[0][0] != 'vertex':
+        raise ValueError("PLY sin elemento 'vertex' al inicio")
+    _, n_vertex, props = elements[0]
+    names = [name for name, _ in props]
+
+    if fmt == 'ascii':
+        data = _ply_ascii(path, header_len, n_vertex)
+        columns = {name: data[:, k] for k, name in enumerate(names)}
+    else:
+        endian = '<' if fmt == 'binary_little_endian' else '>'
+        dtype = np.dtype([(name, endian + t) for name, t in props])
+        data = np.fromfile(path, dtype=dtype, count=n_vertex, offset=header_len)
+        columns = {name: data[name].astype(float) for name in names}
+
+    points = np.column_stack([columns['x'], columns['y'], columns['z']])
+    normals = None
+    if all(k in columns for k in ('nx', 'ny', 'nz')):
+        normals = np.column_stack([columns['nx'], columns['ny'], columns['nz']])
+    return points, normals
+
+
+def _ply_ascii(path, header_len, n_vertex):
+    with open(path, 'rb') as f:
+        f.seek(header_len)
+        lines = [f.readline() for _ in range(n_vertex)]
+    return np.array([line.split() for line in lines], dtype=float)
+
+
+def read_pointcloud(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.stl':
+        return read_stl(path)
+    if ext == '.ply':
+        return read_ply(path)
+    return read_xyz(path)
+
+
+# --- Preprocesado ---
+def voxel_downsample(points, normals, voxel):
+    """Un punto por vóxel (promedio); las normales se promedian y renormalizan."""
+    if voxel is None or voxel <= 0:
+        return points, normals
+    cells = np.floor((points - points.min(axis=0)) / voxel).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    n = len(counts)
+    out = np.column_stack([np.bincount(inverse, weights=points[:, k], minlength=n) for k in range(3)]) / counts[:, None]
+    if normals is None:
+        return out, None
+    # Orientación del primer punto de cada vóxel para no anular normales opuestas
+    ref = np.empty((n, 3))
+    ref[inverse[::-1]] = normals[::-1]
+    aligned = normals * np.sign(np.einsum('ij,ij->i', normals, ref[inverse]))[:, None]
+    summed = np.column_stack([np.bincount(inverse, weights=aligned[:, k], minlength=n) for k in range(3)])
+    norm = np.linalg.norm(summed, axis=1, keepdims=True)
+    norm[norm == 0] = 1.0
+    return out, summed / norm
+
+
+def estimate_normals(points, neighbours=16, tree=None, chunk=200000):
+    """Normal PCA por punto: autovector menor de la covarianza de sus k vecinos (lotes vectorizados)."""
+    tree = tree or KDTree(points)
+    k = min(neighbours, len(points))
+    normals = np.empty_like(points)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        _, idx = tree.query(block, k=k)
+        nb = points[idx]
+        nb = nb - nb.mean(axis=1, keepdims=True)
+        cov = np.einsum('nki,nkj->nij', nb, nb)
+        _, vecs = np.linalg.eigh(cov)
+        normals[start:start + chunk] = vecs[:, :, 0]
+    return normals
+
+
+# --- Ajuste de cilindros ---
+def cylinders_from_point_pairs(p1, n1, p2, n2):
+    """
+    Cilindro por dos puntos con normal (vectorizado): eje = n1 × n2; el centro
+    es la intersección de las rectas normales proyectadas sobre el plano
+    perpendicular al eje. Devuelve (eje, punto del eje, radio, válido).
+    """
+    axis = np.cross(n1, n2)
+    norm = np.linalg.norm(axis, axis=-1)
+    valid = norm > 0.05
+    axis = axis / np.where(valid, norm, 1.0)[..., None]
+
+    def flatten(v):
+        return v - np.sum(v * axis, axis=-1, keepdims=True) * axis
+
+    q1, q2 = flatten(p1), flatten(p2)
+    m1, m2 = flatten(n1), flatten(n2)
+    denom = np.sum(np.cross(m1, m2) * axis, axis=-1)
+    valid &= np.abs(denom) > 1e-6
+    s = np.sum(np.cross(q2 - q1, m2) * axis, axis=-1) / np.where(valid, denom, 1.0)
+    center = q1 + s[..., None] * m1
+    radius = np.linalg.norm(q1 - center, axis=-1)
+    # Punto del eje a la altura de p1
+    center = center + np.sum(p1 * axis, axis=-1, keepdims=True) * axis
+    return axis, center, radius, valid
+
+
+def _azimuth_bins(v_perp, axis, bins):
+    """Sector angular (0..bins-1) de cada vector perpendicular al eje."""
+    u = np.cross(axis, [1.0, 0.0, 0.0])
+    if np.linalg.norm(u) < 0.1:
+        u = np.cross(axis, [0.0, 1.0, 0.0])
+    u /= np.linalg.norm(u)
+    w = np.cross(axis, u)
+    angle = np.arctan2(v_perp @ w, v_perp @ u)
+    return ((angle + np.pi) / (2 * np.pi) * bins).astype(int) % bins
+
+
+def _refit_cylinder(points, normals, axis):
+    """
+    Reajuste por mínimos cuadrados: eje = autovector menor de la matriz de
+    normales (son perpendiculares al eje) y círculo algebraico (Kasa) sobre
+    los puntos proyectados. Devuelve (eje, punto del eje, radio) o None.
+    """
+    if len(points) < 6:
+        return None
+    vals, vecs = np.linalg.eigh(normals.T @ normals)
+    if vals[1] < 0.05 * vals[2]:
+        # Normales casi paralelas (parche plano): el eje no queda determinado
+        return None
+    new_axis = vecs[:, 0] if vecs[:, 0] @ axis >= 0 else -vecs[:, 0]
+    new_axis = canonical_axes(points[:1], new_axis[None])[0][0]
+
+    u = np.cross(new_axis, [1.0, 0.0, 0.0])
+    if np.linalg.norm(u) < 0.1:
+        u = np.cross(new_axis, [0.0, 1.0, 0.0])
+    u /= np.linalg.norm(u)
+    w = np.cross(new_axis, u)
+    x, y = points @ u, points @ w
+    A = np.column_stack([x, y, np.ones_like(x)])
+    (a, b, c), *_ = np.linalg.lstsq(A, x * x + y * y, rcond=None)
+    cx, cy = a / 2.0, b / 2.0
+    r_sq = c + cx * cx + cy * cy
+    if r_sq <= 0:
+        return None
+    return new_axis, cx * u + cy * w, float(np.sqrt(r_sq))
+
+
+def _axial_span(record, axis):
+    """Intervalo [t_min, t_max] de un registro a lo largo de 'axis'."""
+    t = np.dot(record['center'], axis)
+    half = 0.5 * record['height']
+    return t - half, t + half
+
+
+class PointCloudProcessor:
+    """
+    Entrada alternativa para escaneos (STL, PLY, XYZ): en lugar de caras B-Rep,
+    los cilindros se ajustan por RANSAC en lotes sobre la nube de puntos.
+    Devuelve los mismos registros de cilindro que GeometryProcessor
+    (center, radius, height, direction, connected_planes) para que
+    HeatStakeAnalyzer y FamilyMerger funcionen sin cambios.
+    """
+
+    def __init__(self, path, events=None):
+        self.path = path
+        self.events = events or default_bus
+        self.shape = None              # Sin B-Rep: el visualizador solo dibuja marcadores
+        self.step_file = path
+        self.points = None
+        self.normals = None
+
+        self.VOXEL_SIZE = 0.25         # mm; tamaño de vóxel del submuestreo
+        self.NORMAL_NEIGHBOURS = 16
+        self.MIN_RADIUS = 0.5
+        self.MAX_RADIUS = 10.0         # Igual que MAX_STAKE_RADIUS en GeometryProcessor
+        self.MAX_HEIGHT = 25.0         # Alcance axial al juntar inliers de un cilindro
+        self.SEED_NEIGHBOURS = 48      # Vecinos de cada semilla (pareja y puntaje de hipótesis)
+        self.HYPOTHESES = 8            # Hipótesis por semilla
+        self.SEEDS_PER_ROUND = 20000
+        self.ROUNDS = 3
+        self.INLIER_TOLERANCE = None   # mm; None = 0.5 × VOXEL_SIZE
+        self.NORMAL_TOLERANCE = 0.9    # |cos| mínimo entre la normal y la dirección radial
+        self.MIN_INLIER_RATIO = 0.7
+        self.MIN_INLIERS = 30
+        self.MIN_COVERAGE = 0.4        # Fracción mínima del contorno cubierta por inliers
+        self.REFINE_ITERATIONS = 2     # Reajustes de eje/radio con los inliers juntados
+        self.RADIUS_SNAP = 0.15        # Ancho máx. de un grupo de radios que se unifica (familias estables)
+        self.WALL_BAND = 1.0           # mm a cada lado de la superficie donde se buscan otras paredes coaxiales
+        self.FIN_REACH = 6.0           # mm alrededor del cilindro donde se buscan aletas
+        self.seed = 0
+
+    def load(self):
+        self.events.message(f"\n📂 Cargando nube de puntos: {self.path}")
+        self.events.stage_started('load')
+        points, normals = read_pointcloud(self.path)
+        self.events.message(f"✓ {len(points)} puntos leídos")
+        points, normals = voxel_downsample(points, normals, self.VOXEL_SIZE)
+        self.tree = KDTree(points)
+        if normals is None:
+            normals = estimate_normals(points, self.NORMAL_NEIGHBOURS, tree=self.tree)
+        self.points, self.normals = points, normals
+        self.events.message(f"✓ Submuestreo a {len(points)} puntos (vóxel {self.VOXEL_SIZE} mm)")
+        self.events.stage_finished('load', points=len(points))
+        return points
+
+    def extract_features(self):
+        self.events.message("\n🔍 Ajustando cilindros por RANSAC en la nube de puntos...")
+        if self.points is None:
+            self.load()
+        self.events.stage_started('extract', total=self.ROUNDS)
+
+        rng = np.random.default_rng(self.seed)
+        tol = self.INLIER_TOLERANCE or 0.5 * self.VOXEL_SIZE
+        assigned = np.zeros(len(self.points), dtype=bool)
+        records = []
+
+        for round_index in range(self.ROUNDS):
+            self.events.progress('extract', round_index, self.ROUNDS)
+            free = np.flatnonzero(~assigned)
+            if len(free) < self.MIN_INLIERS:
+                break
+            seeds = rng.choice(free, size=min(self.SEEDS_PER_ROUND, len(free)), replace=False)
+            hyp = self._best_hypotheses(seeds, tol, rng)
+            found = self._consolidate(hyp, tol, assigned)
+            records.extend(found)
+            if not found:
+                break
+
+        self.events.progress('extract', self.ROUNDS, self.ROUNDS)
+        records = self._deduplicate(records)
+        self._harmonize_radii(records)
+        for record in records:
+            record['connected_planes'] = self._count_fins(record)
+        self.events.message(f"✓ Cilindros ajustados: {len(records)}")
+        self.events.stage_finished('extract', cylinders=len(records))
+        return records
+
+    def _best_hypotheses(self, seeds, tol, rng, chunk=2048):
+        """Mejor hipótesis (por cantidad de inliers locales) de cada semilla, en lotes."""
+        k = min(self.SEED_NEIGHBOURS, len(self.points))
+        out = {'seed': [], 'axis': [], 'center': [], 'radius': []}
+        for start in range(0, len(seeds), chunk):
+            s = seeds[start:start + chunk]
+            _, nbr = self.tree.query(self.points[s], k=k)          # (S, K)
+            partner = nbr[np.arange(len(s))[:, None], rng.integers(1, k, size=(len(s), self.HYPOTHESES))]
+
+            axis, center, radius, valid = cylinders_from_point_pairs(
+                self.points[s][:, None], self.normals[s][:, None],
+                self.points[partner], self.normals[partner])        # (S, M)
+            valid &= (radius >= self.MIN_RADIUS) & (radius <= self.MAX_RADIUS)
+
+            # Puntaje: vecinos sobre la superficie con normal radial (S, M, K)
+            v = self.points[nbr][:, None] - center[:, :, None]
+            v = v - np.sum(v * axis[:, :, None], axis=-1, keepdims=True) * axis[:, :, None]
+            d = np.linalg.norm(v, axis=-1)
+            radial = np.abs(np.sum(v * self.normals[nbr][:, None], axis=-1)) / np.maximum(d, 1e-12)
+            inliers = (np.abs(d - radius[:, :, None]) < tol) & (radial > self.NORMAL_TOLERANCE)
+            score = np.where(valid, inliers.sum(axis=-1), -1)
+
+            best = score.argmax(axis=1)
+            rows = np.arange(len(s))
+            keep = score[rows, best] >= self.MIN_INLIER_RATIO * k
+            out['seed'].append(s[keep])
+            out['axis'].append(axis[rows, best][keep])
+            out['center'].append(center[rows, best][keep])
+            out['radius'].append(radius[rows, best][keep])
+        return {key: np.concatenate(v) for key, v in out.items()}
+
+    def _consolidate(self, hyp, tol, assigned):
+        """Une hipótesis coaxiales del mismo radio, junta sus inliers y arma los registros."""
+        if len(hyp['seed']) == 0:
+            return []
+        labels = coaxial_labels(hyp['center'], hyp['axis'], radial_tolerance=max(4 * tol, 0.3),
+                                angle_tolerance=0.05)
+        records = []
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            # Mismo eje pero distinto radio (p. ej. pared interior/exterior): por separado
+            r = hyp['radius'][members]
+            order = np.argsort(r)
+            splits = np.flatnonzero(np.diff(r[order]) > self.RADIUS_SNAP) + 1
+            for group in np.split(members[order], splits):
+                if np.all(assigned[hyp['seed'][group]]):
+                    continue
+                record = self._gather(hyp, group, tol, assigned)
+                if record is not None:
+                    records.append(record)
+        return records
+
+    def _gather(self, hyp, group, tol, assigned):
+        """
+        Junta todos los inliers libres de un grupo de hipótesis, reajusta el
+        cilindro con ellos (REFINE_ITERATIONS veces) y arma el registro.
+        """
+        axis = hyp['axis'][group]
+        axis = axis * np.sign(axis @ axis[0])[:, None]
+        axis = canonical_axes(axis[:1], axis.mean(axis=0)[None])[0][0]
+        seed_pts = self.points[hyp['seed'][group]]
+        anchor = hyp['center'][group].mean(axis=0)
+        radius = float(np.median(hyp['radius'][group]))
+
+        # Descarte barato en un entorno pequeño antes de juntar todo el tramo axial
+        center = seed_pts.mean(axis=0)[None]
+        local = self.tree.query_radius(center, r=2 * radius + 1.0)[0]
+        local = local[~assigned[local]]
+        idx, _, _ = self._surface_segment(local, axis, anchor, radius, tol, seed_pts)
+        if idx is None or self._coverage(idx, axis, anchor) < self.MIN_COVERAGE:
+            return None
+
+        reach = np.hypot(1.5 * radius + 1.0, self.MAX_HEIGHT)
+        candidates = self.tree.query_radius(center, r=reach)[0]
+        candidates = candidates[~assigned[candidates]]
+
+        for iteration in range(self.REFINE_ITERATIONS + 1):
+            idx, t, d = self._surface_segment(candidates, axis, anchor, radius, tol, seed_pts)
+            if idx is None:
+                return None
+            if iteration == self.REFINE_ITERATIONS:
+                break
+            fit = _refit_cylinder(self.points[idx], self.normals[idx], axis)
+            if fit is None or not (self.MIN_RADIUS <= fit[2] <= self.MAX_RADIUS):
+                break
+            axis, anchor, radius = fit
+
+        # Arcos cortos (bordes de aletas, chaflanes) no son paredes de boss
+        if self._coverage(idx, axis, anchor) < self.MIN_COVERAGE:
+            return None
+        # Eje corrido entre las dos paredes de un boss hueco: media pared de cada una
+        if self._straddles_walls(idx, axis, anchor, radius, tol, t):
+            return None
+
+        assigned[idx] = True
+        return {
+            'center': tuple(self.points[idx].mean(axis=0)),
+            'radius': float(np.median(d)),
+            'height': float(t.max() - t.min()),
+            'direction': tuple(axis),
+            'axis_location': tuple(anchor + t.min() * axis),
+            '_t_range': (float(t.min()), float(t.max())),
+            '_anchor': anchor,
+            'inliers': len(idx)
+        }
+
+    def _coverage(self, idx, axis, anchor, bins=36):
+        """Fracción de sectores angulares alrededor del eje con algún inlier."""
+        v = self.points[idx] - anchor
+        v = v - np.outer(v @ axis, axis)
+        return np.mean(np.bincount(_azimuth_bins(v, axis, bins), minlength=bins) > 0)
+
+    def _straddles_walls(self, idx, axis, anchor, radius, tol, t, bins=36, min_share=0.25):
+        """
+        True si los inliers salen de dos bandas radiales (pared exterior e
+        interior de un boss hueco) con un eje corrido entre ambas. En cada
+        sector con inliers se mira de qué lado quedan las otras paredes
+        coaxiales (puntos con normal radial a menos de WALL_BAND): en un
+        cilindro real están siempre del mismo lado (o de ambos); en el
+        fantasma quedan adentro en media vuelta y afuera en la otra.
+        """
+        mid = anchor + 0.5 * (t.min() + t.max()) * axis
+        reach = np.hypot(radius + self.WALL_BAND, 0.5 * (t.max() - t.min()) + tol)
+        near = self.tree.query_radius(mid[None], r=reach)[0]
+        v = self.points[near] - anchor
+        tn = v @ axis
+        v_perp = v - tn[:, None] * axis
+        d = np.linalg.norm(v_perp, axis=1)
+        radial = np.abs(np.einsum('ij,ij->i', v_perp, self.normals[near])) / np.maximum(d, 1e-12)
+        other = (tn >= t.min()) & (tn <= t.max()) & (radial > self.NORMAL_TOLERANCE) & \
+            (np.abs(d - radius) > 2 * tol) & (np.abs(d - radius) < self.WALL_BAND)
+        if not np.any(other):
+            return False
+
+        sectors = _azimuth_bins(v_perp[other], axis, bins)
+        inside = np.bincount(sectors[d[other] < radius], minlength=bins) >= 3
+        outside = np.bincount(sectors[d[other] > radius], minlength=bins) >= 3
+        w = self.points[idx] - anchor
+        covered = np.bincount(_azimuth_bins(w - np.outer(w @ axis, axis), axis, bins), minlength=bins) > 0
+        n_covered = max(int(covered.sum()), 1)
+        only_in = np.sum(covered & inside & ~outside) / n_covered
+        only_out = np.sum(covered & outside & ~inside) / n_covered
+        return only_in >= min_share and only_out >= min_share
+
+    def _surface_segment(self, candidates, axis, anchor, radius, tol, seed_pts):
+        """Puntos sobre la superficie del cilindro, en el tramo axial continuo que contiene a las semillas."""
+        v = self.points[candidates] - anchor
+        t = v @ axis
+        v_perp = v - t[:, None] * axis
+        d = np.linalg.norm(v_perp, axis=1)
+        radial = np.abs(np.einsum('ij,ij->i', v_perp, self.normals[candidates])) / np.maximum(d, 1e-12)
+        on_surface = (np.abs(d - radius) < tol) & (radial > self.NORMAL_TOLERANCE)
+        idx, t, d = candidates[on_surface], t[on_surface], d[on_surface]
+        if len(idx) < self.MIN_INLIERS:
+            return None, None, None
+
+        order = np.argsort(t)
+        gaps = np.flatnonzero(np.diff(t[order]) > 4 * self.VOXEL_SIZE) + 1
+        seed_t = np.median((seed_pts - anchor) @ axis)
+        for segment in np.split(order, gaps):
+            if t[segment[0]] - 2 * tol <= seed_t <= t[segment[-1]] + 2 * tol:
+                break
+        else:
+            return None, None, None
+        if len(segment) < self.MIN_INLIERS:
+            return None, None, None
+        return idx[segment], t[segment], d[segment]
+
+    def _deduplicate(self, records):
+        """
+        Fragmentos del mismo boss (mismo eje y radio, tramos solapados): queda
+        el de más inliers. Entre registros coaxiales de distinto radio se
+        descarta el que queda entre dos paredes solapadas a menos de WALL_BAND
+        (cilindro fantasma a media pared de un boss hueco).
+        """
+        if len(records) < 2:
+            return records
+        points = np.array([r['axis_location'] for r in records])
+        dirs = np.array([r['direction'] for r in records])
+        labels = coaxial_labels(points, dirs, radial_tolerance=max(self.VOXEL_SIZE, 0.3), angle_tolerance=0.1)
+        keep = []
+        for label in np.unique(labels):
+            members = sorted(np.flatnonzero(labels == label), key=lambda i: -records[i]['inliers'])
+            kept = []
+            for i in members:
+                r = records[i]
+                lo, hi = _axial_span(r, dirs[members[0]])
+                if any(abs(r['radius'] - k['radius']) <= self.RADIUS_SNAP and
+                       lo <= _axial_span(k, dirs[members[0]])[1] and hi >= _axial_span(k, dirs[members[0]])[0]
+                       for k in kept):
+                    continue
+                kept.append(r)
+            axis = dirs[members[0]]
+            keep.extend(r for r in kept if not self._between_walls(r, kept, axis))
+        return keep
+
+    def _between_walls(self, record, coaxial, axis):
+        """True si hay paredes coaxiales solapadas a ambos lados de 'record' dentro de WALL_BAND."""
+        lo, hi = _axial_span(record, axis)
+        sides = set()
+        for other in coaxial:
+            gap = other['radius'] - record['radius']
+            o_lo, o_hi = _axial_span(other, axis)
+            if self.RADIUS_SNAP < abs(gap) < self.WALL_BAND and lo <= o_hi and hi >= o_lo:
+                sides.add(gap > 0)
+        return len(sides) == 2
+
+    def _harmonize_radii(self, records):
+        """Unifica radios casi iguales (ruido del escaneo) para que las familias por radio no se partan."""
+        if not records:
+            return
+        radii = np.array([r['radius'] for r in records])
+        order = np.argsort(radii)
+        # Grupos de ancho acotado: sin encadenar radios a pasos < RADIUS_SNAP
+        start = 0
+        for k in range(1, len(order) + 1):
+            if k < len(order) and radii[order[k]] - radii[order[start]] <= self.RADIUS_SNAP:
+                continue
+            group = order[start:k]
+            snapped = float(np.median(radii[group]))
+            for i in group:
+                records[i]['radius'] = snapped
+            start = k
+
+    def _count_fins(self, record, bins=36):
+        """
+        Heurística de aletas: puntos de paredes planas (normal perpendicular al eje
+        y tangencial) en un anillo alrededor del cilindro, agrupados por sectores
+        angulares. Cada aleta aporta 2 caras planas y la tapa/base 1 más, como el
+        conteo topológico de GeometryProcessor.
+        """
+        axis = np.asarray(record['direction'])
+        anchor = record.pop('_anchor')
+        t_min, t_max = record.pop('_t_range')
+        radius = record['radius']
+
+        reach = np.hypot(radius + self.FIN_REACH, 0.5 * (t_max - t_min) + self.FIN_REACH)
+        mid = anchor + 0.5 * (t_min + t_max) * axis
+        idx = self.tree.query_radius(mid[None], r=reach)[0]
+        v = self.points[idx] - anchor
+        t = v @ axis
+        v_perp = v - t[:, None] * axis
+        d = np.linalg.norm(v_perp, axis=1)
+        n = self.normals[idx]
+        along = np.abs(n @ axis)
+        radial = np.abs(np.einsum('ij,ij->i', v_perp, n)) / np.maximum(d, 1e-12)
+
+        in_band = (t >= t_min - self.VOXEL_SIZE) & (t <= t_max + self.VOXEL_SIZE)
+        fin = in_band & (d > radius + 2 * self.VOXEL_SIZE) & (d < radius + self.FIN_REACH) \
+            & (along < 0.3) & (radial < 0.5)
+        cap = (d < radius + self.FIN_REACH) & (along > 0.9) & \
+            ((np.abs(t - t_min) < 2 * self.VOXEL_SIZE) | (np.abs(t - t_max) < 2 * self.VOXEL_SIZE))
+
+        fins = 0
+        if np.any(fin):
+            hist = np.bincount(_azimuth_bins(v_perp[fin], axis, bins), minlength=bins)
+            occupied = hist >= 3
+            # Tramos circulares de sectores ocupados
+            fins = int(np.sum(occupied & ~np.roll(occupied, 1)))
+            if fins == 0 and occupied.all():
+                fins = 1
+        return 2 * fins + int(np.any(cap))
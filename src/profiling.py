@@ -0,0 +1,141 @@
+# src/profiling.py
+import os
+import time
+import numpy as np
+
+# Nombres de GeomAbs_SurfaceType en el orden del enum de OCC
+SURFACE_NAMES = ['Plano', 'Cilindro', 'Cono', 'Esfera', 'Toro', 'Bezier', 'BSpline',
+                 'Revolucion', 'Extrusion', 'Offset', 'Otra']
+
+COST_DTYPE = np.dtype([
+    ('time', 'f8'),           # Tiempo total atribuido a la cara (s)
+    ('process_time', 'f8'),   # _process_cylinder
+    ('topo_time', 'f8'),      # _count_connected_planes_topo
+    ('spatial_time', 'f8'),   # _count_connected_planes_spatial
+    ('cog_time', 'f8'),       # CoG exacto (GProp), aunque se pida fuera de la extracción
+    ('bbox_tests', 'i4'),     # Bboxes de planos comparados en el conteo espacial
+    ('extrema_calls', 'i4'),  # Llamadas a BRepExtrema_DistShapeShape
+    ('surface_type', 'i2'),
+    ('radius', 'f8'),
+    ('location', 'f8', 3),
+])
+
+
+class FaceCostRecorder:
+    """
+    Registro opcional de costo por cara en un arreglo estructurado (una fila por
+    índice de cara 1..N). GeometryProcessor llama begin()/end() alrededor de
+    cada cara y add()/count() desde los métodos calientes; como la extracción
+    es secuencial, todo se atribuye a la cara en curso. Lo que se calcula
+    tarde (el CoG perezoso de CylinderRecord) pasa por timed() con su índice.
+    """
+
+    def __init__(self, n_faces=0):
+        self.data = np.zeros(n_faces + 1, dtype=COST_DTYPE)
+        self.data['surface_type'] = -1
+        self.data['radius'] = np.nan
+        self.data['location'] = np.nan
+        self.current = 0
+        self._start = None
+
+    def resize(self, n_faces):
+        if n_faces + 1 > len(self.data):
+            extra = np.zeros(n_faces + 1 - len(self.data), dtype=COST_DTYPE)
+            extra['surface_type'] = -1
+            extra['radius'] = np.nan
+            extra['location'] = np.nan
+            self.data = np.concatenate([self.data, extra])
+
+    def begin(self, face_index, surface_type=None):
+        self.current = face_index
+        if surface_type is not None:
+            self.data['surface_type'][face_index] = int(surface_type)
+        self._start = time.perf_counter()
+
+    def end(self):
+        if self._start is not None:
+            self.data['time'][self.current] += time.perf_counter() - self._start
+            self._start = None
+        self.current = 0
+
+    def timed(self, face_index, field, fn):
+        """
+        Ejecuta fn() y atribuye su tiempo a 'face_index' (campo y total). Si
+        hay otra cara en curso, su ventana se corre para no contarlo dos veces.
+        """
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.resize(face_index)
+            self.data[field][face_index] += elapsed
+            self.data['time'][face_index] += elapsed
+            if self._start is not None:
+                self._start += elapsed
+
+    def add(self, field, elapsed):
+        self.data[field][self.current] += elapsed
+
+    def count(self, field, n=1):
+        self.data[field][self.current] += n
+
+    def note_cylinder(self, radius, location):
+        self.data['radius'][self.current] = radius
+        self.data['location'][self.current] = location
+
+    def top(self, n=20):
+        """Índices de cara ordenados por tiempo total descendente (solo las que costaron algo)."""
+        times = self.data['time']
+        order = np.argsort(-times, kind='stable')
+        order = order[times[order] > 0]
+        return order[:n]
+
+    def print_top(self, n=20):
+        total = float(self.data['time'].sum())
+        rows = self.top(n)
+        print("\n" + "="*60)
+        print(f"🐢 CARAS MÁS COSTOSAS (top {len(rows)} de {int(np.sum(self.data['time'] > 0))})")
+        print("="*60)
+        print(f"   Tiempo total atribuido: {total:.2f}s")
+        for face_index in rows:
+            r = self.data[face_index]
+            share = 100.0 * r['time'] / total if total else 0.0
+            loc = r['location']
+            where = f"({loc[0]:.1f}, {loc[1]:.1f}, {loc[2]:.1f}) R={r['radius']:.2f}" if not np.isnan(r['radius']) else ""
+            print(f"   • Cara {face_index:>6} {self._surface_name(r['surface_type']):<10} "
+                  f"{r['time']:.3f}s ({share:.1f}%) | CoG {r['cog_time']:.3f}s | bbox {r['bbox_tests']} | "
+                  f"extrema {r['extrema_calls']} {where}")
+        print("="*60)
+
+    def export(self, original_filepath, n=None):
+        """Guarda el detalle en Reportes/<pieza>/Costos_<pieza>.csv (todas las caras con costo o las top n)."""
+        import pandas as pd
+        base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+        output_dir = os.path.join("Reportes", base_name)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"Costos_{base_name}.csv")
+
+        rows = self.top(n if n is not None else len(self.data))
+        d = self.data[rows]
+        pd.DataFrame({
+            "Cara": rows,
+            "Tipo": [self._surface_name(t) for t in d['surface_type']],
+            "Segundos": np.round(d['time'], 5),
+            "Proceso": np.round(d['process_time'], 5),
+            "Topologia": np.round(d['topo_time'], 5),
+            "Espacial": np.round(d['spatial_time'], 5),
+            "CoG": np.round(d['cog_time'], 5),
+            "Bbox_Tests": d['bbox_tests'],
+            "Extrema": d['extrema_calls'],
+            "Radio": np.round(d['radius'], 3),
+            "X": np.round(d['location'][:, 0], 3),
+            "Y": np.round(d['location'][:, 1], 3),
+            "Z": np.round(d['location'][:, 2], 3),
+        }).to_csv(path, index=False)
+        print(f"💾 Costos por cara guardados en: {path}")
+        return path
+
+    @staticmethod
+    def _surface_name(surface_type):
+        return SURFACE_NAMES[surface_type] if 0 <= surface_type < len(SURFACE_NAMES) else '?'
@@ -0,0 +1,103 @@
+# src/progressive.py
+import threading
+from src.geometry import CylinderRecord, axis_center
+from src.revision import stake_arrays, diff_stakes
+
+
+class ProgressiveRun:
+    """
+    Detección en dos fases sobre un GeometryProcessor ya cargado.
+
+    Fase 1 (vista previa): cascada sin el respaldo espacial (solo aletas
+    topológicas) y centros baratos sobre el eje; analizador y merger completos.
+    Fase 2 (refinado): conteo espacial BRepExtrema para los cilindros sin
+    aletas suficientes y CoG exacto; se repite el análisis y se publica el
+    delta (añadidos, eliminados, movidos) respecto de la vista previa.
+
+    'analyze' es una función cilindros -> lista de stakes (el mismo pipeline
+    en ambas fases). Los callbacks de la fase 2 corren en el hilo de fondo.
+    """
+
+    def __init__(self, geo, analyze, events, match_tolerance=5.0, move_tolerance=0.01):
+        self.geo = geo
+        self.analyze = analyze
+        self.events = events
+        self.match_tolerance = match_tolerance
+        self.move_tolerance = move_tolerance
+        self.cylinders = None
+        self.preview = None
+        self.final = None
+        self.delta = None
+        self.error = None
+        self._thread = None
+        self._done = threading.Event()
+
+    def run_preview(self):
+        geo = self.geo
+        cascade = geo.CASCADE
+        geo.CASCADE = [name for name in cascade if name != 'spatial']
+        self.events.stage_started('preview')
+        try:
+            cylinders = geo.extract_features_topology()
+        finally:
+            geo.CASCADE = cascade
+
+        for cyl in cylinders:
+            if isinstance(cyl, CylinderRecord) and not dict.__contains__(cyl, 'center'):
+                cyl['center'] = axis_center(cyl['face'])
+                cyl['center_approx'] = True
+
+        self.cylinders = cylinders
+        self.preview = self.analyze(cylinders)
+        self.events.stage_finished('preview', stakes=len(self.preview))
+        self.events.emit('preview_ready', count=len(self.preview))
+        return self.preview
+
+    def run_refine(self):
+        if self.preview is None:
+            self.run_preview()
+        geo = self.geo
+        self.events.stage_started('refine', total=len(self.cylinders))
+        for k, cyl in enumerate(self.cylinders):
+            self.events.progress('refine', k, len(self.cylinders))
+            geo._predicate_spatial(cyl, None)
+            cyl.pop('_bbox', None)
+            if isinstance(cyl, CylinderRecord):
+                cyl.refine_center()
+        self.events.progress('refine', len(self.cylinders), len(self.cylinders))
+
+        self.final = self.analyze(self.cylinders)
+        self.delta = diff_stakes(stake_arrays(self.preview), stake_arrays(self.final),
+                                 match_tolerance=self.match_tolerance, move_tolerance=self.move_tolerance)
+        self.events.stage_finished('refine', stakes=len(self.final))
+        self.events.emit('refined', count=len(self.final), added=len(self.delta['added']),
+                         removed=len(self.delta['removed']), moved=len(self.delta['moved']))
+        return self.final
+
+    def start_refine(self, on_refined=None):
+        """Lanza la fase 2 en un hilo; on_refined(run) se llama al terminar (también si falla)."""
+        def worker():
+            try:
+                self.run_refine()
+            except Exception as e:
+                self.error = e
+            finally:
+                self._done.set()
+                if on_refined is not None:
+                    on_refined(self)
+
+        self._thread = threading.Thread(target=worker, daemon=True)
+        self._thread.start()
+        return self
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Espera la fase 2 y devuelve los stakes finales (relanza su error, si lo hubo)."""
+        if self._thread is None:
+            return self.run_refine()
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.final
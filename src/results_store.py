@@ -0,0 +1,331 @@
+# src/results_store.py
+import os
+import json
+import time
+import itertools
+from contextlib import contextmanager
+import numpy as np
+from src.revision import stake_arrays
+
+DEFAULT_STORE = os.path.join("Reportes", "_store")
+
+# Columnas de cada segmento (un .npy por columna, abiertos con mmap)
+COLUMNS = ('part', 'stake_id', 'family', 'centroid', 'radius')
+
+# Empaquetado de la celda (cx, cy, cz) en un int64: 21 bits por eje
+_CELL_BITS = 21
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+_MAX_QUERY_CELLS = 4096  # Más celdas que esto: se recorre la columna completa
+AUTO_COMPACT = 32        # Segmentos a partir de los cuales append() compacta solo
+
+
+def _cell_keys(cells):
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3) + _CELL_OFFSET
+    return (cells[:, 0] << (2 * _CELL_BITS)) | (cells[:, 1] << _CELL_BITS) | cells[:, 2]
+
+
+@contextmanager
+def _locked(root):
+    """Candado exclusivo entre procesos sobre root/manifest.lock (lotes en paralelo, GUI + CLI)."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "manifest.lock"), 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK se rinde a los 10 s: se sigue esperando
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ResultsStore:
+    """
+    Almacén columnar de solo-anexado con los stakes de todas las piezas analizadas.
+
+    Estructura en disco (root):
+        manifest.json            segmentos, pieza -> segmento vigente, tamaño de celda
+        manifest.log             un JSON por línea con los segmentos añadidos después
+                                 del último manifest.json (se vuelca al compactar)
+        seg_00001/part.npy       columnas del segmento (ver COLUMNS)
+        seg_00001/cell_key.npy   índice espacial: claves de celda ordenadas
+        seg_00001/cell_row.npy   fila de cada clave
+
+    Volver a guardar una pieza añade un segmento nuevo y deja el anterior
+    obsoleto (no se reescribe nada); compact() junta los segmentos vigentes, y
+    append() lo llama solo al pasar de auto_compact segmentos para que ni la
+    consulta en frío (un mmap por columna y segmento) ni el manifiesto crezcan
+    sin límite.
+
+    Varios procesos pueden escribir en el mismo almacén: append() y compact()
+    toman manifest.lock y releen manifiesto y registro antes de nombrar un
+    segmento, así que ninguno pisa ni borra lo que otro acaba de añadir.
+    """
+
+    def __init__(self, root=DEFAULT_STORE, cell_size=10.0, auto_compact=AUTO_COMPACT):
+        self.root = root
+        self.auto_compact = auto_compact
+        self._columns = {}
+        self._cell_size = float(cell_size)
+        if os.path.isdir(root):
+            with _locked(root):
+                self._load()
+        else:
+            self._load()
+
+    def _load(self):
+        """(Re)lee manifest.json y el registro; llamar con el candado tomado si el almacén existe."""
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'version': 1, 'cell_size': self._cell_size, 'next_segment': 1,
+                             'segments': {}, 'parts': {}}
+        self._replay_log()
+        self.cell_size = self.manifest['cell_size']
+        # Segmentos que otro proceso compactó y borró
+        for seg in set(self._columns) - set(self.manifest['segments']):
+            del self._columns[seg]
+
+    @staticmethod
+    def exists(root):
+        """True si 'root' es un almacén: manifest.json o, antes de la primera compactación, solo manifest.log."""
+        return os.path.isdir(root) and (os.path.exists(os.path.join(root, "manifest.json")) or
+                                        os.path.exists(os.path.join(root, "manifest.log")))
+
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _log_path(self):
+        return os.path.join(self.root, "manifest.log")
+
+    def _replay_log(self):
+        """Aplica los segmentos anotados en manifest.log después del último manifest.json."""
+        if not os.path.exists(self._log_path()):
+            return
+        with open(self._log_path(), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Línea cortada por una escritura interrumpida
+                self._apply_entry(entry)
+
+    def _apply_entry(self, entry):
+        name = entry['segment']
+        self.manifest['segments'][name] = {'rows': entry['rows'], 'parts': entry['parts'], 'created': entry['created']}
+        for part in entry['parts']:
+            self.manifest['parts'][part] = name
+        self.manifest['next_segment'] = max(self.manifest['next_segment'], int(name.split('_')[1]) + 1)
+
+    def _log_entry(self, entry):
+        """Anexa una línea al registro en lugar de reescribir todo el manifiesto."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._log_path(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+        self._apply_entry(entry)
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self._manifest_path())
+        if os.path.exists(self._log_path()):
+            os.remove(self._log_path())  # Ya volcado en manifest.json
+
+    # --- Escritura ---
+    def append(self, part, stakes):
+        """Añade (o reemplaza) los stakes de una pieza; 'stakes' es la lista de dicts del pipeline."""
+        return self.append_arrays(part, stake_arrays(stakes))
+
+    def append_arrays(self, part, arrays):
+        """Igual que append() pero con arreglos 'stake_*' (p. ej. de un snapshot de revisión)."""
+        n = len(arrays['stake_ids'])
+        columns = {
+            'part': np.full(n, part),
+            'stake_id': arrays['stake_ids'].astype(str),
+            'family': arrays['stake_families'].astype(str),
+            'centroid': arrays['stake_centroids'],
+            'radius': arrays['stake_radii']
+        }
+        with _locked(self.root):
+            self._load()  # Lo que otros procesos hayan añadido o compactado mientras tanto
+            name = self._write_segment(columns)
+            self._log_entry({'segment': name, 'rows': n, 'parts': [part], 'created': time.time()})
+            print(f"🗄️ {n} stakes de '{part}' guardados en el almacén ({name})")
+            if self.auto_compact and len(self.manifest['segments']) > self.auto_compact:
+                name = self._compact() or name
+        return name
+
+    def _write_segment(self, columns):
+        name = f"seg_{self.manifest['next_segment']:05d}"
+        self.manifest['next_segment'] += 1
+        seg_dir = os.path.join(self.root, name)
+        os.makedirs(seg_dir, exist_ok=True)
+
+        for col in COLUMNS:
+            np.save(os.path.join(seg_dir, f"{col}.npy"), np.ascontiguousarray(columns[col]))
+
+        keys = _cell_keys(np.floor(columns['centroid'] / self.cell_size))
+        order = np.argsort(keys, kind='stable')
+        np.save(os.path.join(seg_dir, "cell_key.npy"), keys[order])
+        np.save(os.path.join(seg_dir, "cell_row.npy"), order.astype(np.int64))
+        return name
+
+    def compact(self):
+        """Reescribe los segmentos vigentes en uno solo y borra los obsoletos."""
+        with _locked(self.root):
+            self._load()
+            return self._compact()
+
+    def _compact(self):
+        # Con el candado tomado: solo se borran los segmentos del manifiesto recién leído
+        live = self._live_segments()
+        if len(live) <= 1 and len(live) == len(self.manifest['segments']):
+            return None
+        parts_by_seg = {}
+        for part, seg in self.manifest['parts'].items():
+            parts_by_seg.setdefault(seg, []).append(part)
+
+        merged = {col: [] for col in COLUMNS}
+        for seg in live:
+            cols = self._segment(seg)
+            rows = np.flatnonzero(np.isin(cols['part'], parts_by_seg[seg]))
+            for col in COLUMNS:
+                merged[col].append(np.asarray(cols[col][rows]))
+        merged = {col: np.concatenate(v) if v else np.empty(0) for col, v in merged.items()}
+        merged['centroid'] = merged['centroid'].reshape(-1, 3)
+
+        old = list(self.manifest['segments'])
+        name = self._write_segment(merged)
+        self.manifest['segments'] = {name: {'rows': len(merged['radius']),
+                                            'parts': sorted(self.manifest['parts']),
+                                            'created': time.time()}}
+        self.manifest['parts'] = {part: name for part in self.manifest['parts']}
+        self._save_manifest()
+
+        import shutil
+        self._columns.clear()
+        for seg in old:
+            shutil.rmtree(os.path.join(self.root, seg), ignore_errors=True)
+        print(f"🗜️ Almacén compactado: {len(old)} segmentos → 1 ({len(merged['radius'])} stakes)")
+        return name
+
+    # --- Lectura ---
+    def _live_segments(self):
+        return sorted(set(self.manifest['parts'].values()))
+
+    def _segment(self, name):
+        cols = self._columns.get(name)
+        if cols is None:
+            seg_dir = os.path.join(self.root, name)
+            cols = {col: np.load(os.path.join(seg_dir, f"{col}.npy"), mmap_mode='r')
+                    for col in COLUMNS + ('cell_key', 'cell_row')}
+            self._columns[name] = cols
+        return cols
+
+    def parts(self):
+        return sorted(self.manifest['parts'])
+
+    def part_stakes(self, part):
+        """Stakes vigentes de una pieza como dicts mínimos del pipeline (None si no está)."""
+        seg = self.manifest['parts'].get(part)
+        if seg is None:
+            return None
+        cols = self._segment(seg)
+        rows = np.flatnonzero(np.asarray(cols['part']) == part)
+        return [{
+            'cluster_id': str(cols['stake_id'][r]),
+            'family_id': str(cols['family'][r]),
+            'analysis': {'centroid': tuple(cols['centroid'][r]), 'avg_radius': float(cols['radius'][r])}
+        } for r in rows]
+
+    def query_box(self, lo, hi, family=None):
+        """Stakes con centroide dentro de la caja [lo, hi]."""
+        lo = np.asarray(lo, dtype=float)
+        hi = np.asarray(hi, dtype=float)
+        return self._query(lo, hi, lambda c: np.all((c >= lo) & (c <= hi), axis=1), family)
+
+    def query_radius(self, point, radius, family=None):
+        """Stakes con centroide a distancia <= radius del punto."""
+        point = np.asarray(point, dtype=float)
+        r_sq = float(radius) ** 2
+        return self._query(point - radius, point + radius,
+                           lambda c: np.einsum('ij,ij->i', c - point, c - point) <= r_sq, family)
+
+    def _query(self, lo, hi, inside, family):
+        cell_lo = np.floor(lo / self.cell_size).astype(np.int64)
+        cell_hi = np.floor(hi / self.cell_size).astype(np.int64)
+        n_cells = int(np.prod(cell_hi - cell_lo + 1))
+        keys = None
+        if n_cells <= _MAX_QUERY_CELLS:
+            ranges = [range(a, b + 1) for a, b in zip(cell_lo, cell_hi)]
+            keys = _cell_keys(list(itertools.product(*ranges)))
+
+        parts_by_seg = {}
+        for part, seg in self.manifest['parts'].items():
+            parts_by_seg.setdefault(seg, []).append(part)
+
+        out = {col: [] for col in COLUMNS}
+        for seg in self._live_segments():
+            cols = self._segment(seg)
+            if keys is not None:
+                left = np.searchsorted(cols['cell_key'], keys, side='left')
+                right = np.searchsorted(cols['cell_key'], keys, side='right')
+                spans = [np.arange(a, b) for a, b in zip(left, right) if b > a]
+                if not spans:
+                    continue
+                rows = np.sort(np.asarray(cols['cell_row'][np.concatenate(spans)]))
+            else:
+                rows = np.arange(len(cols['radius']))
+
+            centroids = np.asarray(cols['centroid'][rows])
+            mask = inside(centroids)
+            # Filas de piezas reemplazadas por un segmento posterior
+            mask &= np.isin(cols['part'][rows], parts_by_seg[seg])
+            if family is not None:
+                mask &= np.asarray(cols['family'][rows]) == family
+            rows = rows[mask]
+            for col in COLUMNS:
+                out[col].append(np.asarray(cols[col][rows]))
+
+        if not out['radius']:
+            return {col: (np.empty((0, 3)) if col == 'centroid' else np.empty(0)) for col in COLUMNS}
+        result = {col: np.concatenate(v) for col, v in out.items()}
+        result['centroid'] = result['centroid'].reshape(-1, 3)
+        return result
+
+
+def print_matches(result, point=None):
+    n = len(result['radius'])
+    print(f"🔎 {n} stakes encontrados en {len(np.unique(result['part']))} piezas")
+    for i in range(n):
+        c = result['centroid'][i]
+        extra = f" | d={np.linalg.norm(c - point):.2f}mm" if point is not None else ""
+        print(f"   • {result['part'][i]} | {result['stake_id'][i]} ({result['family'][i]}) "
+              f"en ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f}) | R={result['radius'][i]:.2f}{extra}")
+
+
+def export_matches(path, result):
+    import pandas as pd
+    c = result['centroid']
+    pd.DataFrame({
+        "Pieza": result['part'], "ID": result['stake_id'], "Familia": result['family'],
+        "X": np.round(c[:, 0], 3), "Y": np.round(c[:, 1], 3), "Z": np.round(c[:, 2], 3),
+        "Radio": np.round(result['radius'], 3)
+    }).to_csv(path, index=False)
+    print(f"💾 Resultado guardado en: {path}")
@@ -0,0 +1,106 @@
+# src/retune.py
+import time
+from src.analyzer import HeatStakeAnalyzer
+from src.family_merger import FamilyMerger
+from src.events import EventBus
+
+
+def marker_key(item, is_rejected=False):
+    """
+    Identidad visual de un marcador: familia (color/tamaño/etiqueta) + posición
+    redondeada. Sin cluster_id: se renumera en cada re-fusión y forzaría a
+    redibujar marcadores que no se movieron.
+    """
+    c = item['analysis']['centroid']
+    family = 'REJECTED' if is_rejected else item.get('family_id', 'DEFAULT')
+    return (family, round(float(c[0]), 3), round(float(c[1]), 3), round(float(c[2]), 3))
+
+
+def diff_markers(old_keys, items, is_rejected=False):
+    """(claves a quitar, [(clave, item)] a dibujar) entre el juego mostrado y el nuevo."""
+    new = {}
+    for item in items:
+        new.setdefault(marker_key(item, is_rejected), item)
+    removed = [k for k in old_keys if k not in new]
+    added = [(k, item) for k, item in new.items() if k not in old_keys]
+    return removed, added
+
+
+class Retuner:
+    """
+    Re-análisis en vivo sobre los cilindros ya extraídos (sin tocar OCC):
+    solo analizador y fusión de familias con nuevos parámetros.
+
+    Parámetros ajustables: 'merge_distance' (HeatStakeAnalyzer.MERGE_DISTANCE),
+    'eps' (DBSCAN del respaldo legacy) y una distancia por regla de fusión
+    ('GRP1+GRP2', ...). Los resultados de la topología y del respaldo se
+    memorizan por separado: cambiar eps no vuelve a fusionar familias y
+    viceversa.
+    """
+
+    STEPS = {'merge_distance': 1.0, 'eps': 2.5}
+    RULE_STEP = 2.5
+
+    def __init__(self, cylinders, eps=25.0, grouping='distance', tiled=False, lean=False, custom_rules=False):
+        self.cylinders = cylinders
+        self.grouping = grouping
+        self.tiled = tiled
+        self.lean = lean
+        self.custom_rules = custom_rules    # Segunda pasada de FamilyMerger, como run_process --custom-rules
+        self.events = EventBus(quiet=True)  # Sin sinks: el re-análisis no imprime
+        defaults = HeatStakeAnalyzer(events=self.events)
+        self.params = {
+            'merge_distance': defaults.MERGE_DISTANCE,
+            'eps': eps,
+            'rules': dict(FamilyMerger(events=self.events).merge_rules),
+        }
+        self._topology = {}
+        self._legacy = {}
+        self.last_seconds = 0.0
+
+    def _analyzer(self):
+        analyzer = HeatStakeAnalyzer(events=self.events)
+        analyzer.LEAN = self.lean
+        analyzer.GROUPING = self.grouping
+        analyzer.LEGACY_TILED = self.tiled
+        analyzer.MERGE_DISTANCE = self.params['merge_distance']
+        analyzer.MERGE_RULES = dict(self.params['rules'])
+        return analyzer
+
+    def adjust(self, name, direction):
+        """Sube (+1) o baja (-1) un parámetro un paso; devuelve el valor nuevo."""
+        if name in self.STEPS:
+            value = max(self.STEPS[name], self.params[name] + direction * self.STEPS[name])
+            self.params[name] = value
+        else:
+            value = max(self.RULE_STEP, self.params['rules'][name] + direction * self.RULE_STEP)
+            self.params['rules'][name] = value
+        return value
+
+    def run(self):
+        """(stakes, rechazados) con los parámetros actuales."""
+        t0 = time.perf_counter()
+        analyzer = self._analyzer()
+        population, remaining = analyzer.split_population(self.cylinders)
+
+        topo_key = (self.params['merge_distance'], tuple(sorted(self.params['rules'].items())))
+        if topo_key not in self._topology:
+            self._topology[topo_key] = analyzer.analyze_population(population)
+        if self.params['eps'] not in self._legacy:
+            self._legacy[self.params['eps']] = analyzer.analyze_clusters_legacy(remaining, self.params['eps'])
+        cluster, rejected = self._legacy[self.params['eps']]
+
+        stakes = self._topology[topo_key] + cluster
+        if self.custom_rules:
+            merger = FamilyMerger(mode='coaxial' if self.grouping == 'coaxial' else 'rules', events=self.events)
+            merger.merge_rules.update(self.params['rules'])
+            by_fam = {}
+            for s in stakes:
+                by_fam.setdefault(s.get('family_id', 'DEFAULT'), []).append(s)
+            stakes = merger.merge_all_families(by_fam)
+        self.last_seconds = time.perf_counter() - t0
+        return stakes, rejected
+
+    def describe(self):
+        rules = ", ".join(f"{k}={v:g}" for k, v in sorted(self.params['rules'].items()))
+        return f"MERGE_DISTANCE={self.params['merge_distance']:g} | eps={self.params['eps']:g} | {rules}"
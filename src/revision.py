@@ -0,0 +1,156 @@
+# src/revision.py
+import os
+import numpy as np
+from sklearn.neighbors import KDTree
+
+
+def snapshot_path(step_file):
+    """Ruta del snapshot de revisión junto a los reportes de la pieza."""
+    base_name = os.path.splitext(os.path.basename(step_file))[0]
+    return os.path.join("Reportes", base_name, f"revision_{base_name}.npz")
+
+
+def build_snapshot(geo, cylinders, stakes, fingerprints=None):
+    """
+    Reúne en arreglos todo lo necesario para un análisis incremental posterior:
+    huellas de todas las caras, métricas de cada cilindro y los stakes finales.
+    """
+    keys, _, bboxes = fingerprints if fingerprints is not None else geo.face_fingerprints()
+
+    cyl_keys = [keys[c['face_index'] - 1] for c in cylinders]
+    return {
+        'step_file': np.array(geo.step_file or ''),
+        'face_keys': np.array(keys),
+        'face_bboxes': bboxes,
+        'cyl_keys': np.array(cyl_keys),
+        # Caras que la cascada evaluó y descartó: la revisión siguiente las salta si no cambian
+        'rejected_keys': np.array([keys[i - 1] for i in sorted(getattr(geo, 'rejected_faces', ()))], dtype=str),
+        'cyl_center': np.array([c['center'] for c in cylinders], dtype=float).reshape(-1, 3),
+        'cyl_radius': np.array([c['radius'] for c in cylinders], dtype=float),
+        'cyl_height': np.array([c['height'] for c in cylinders], dtype=float),
+        'cyl_direction': np.array([c['direction'] for c in cylinders], dtype=float).reshape(-1, 3),
+        'cyl_planes': np.array([c['connected_planes'] for c in cylinders], dtype=np.int32),
+        **stake_arrays(stakes)
+    }
+
+
+def stake_arrays(stakes):
+    """Convierte una lista de stakes (dicts) en arreglos 'stake_*'."""
+    return {
+        'stake_ids': np.array([s.get('cluster_id', 'UNK') for s in stakes]),
+        'stake_families': np.array([s.get('family_id', 'UNK') for s in stakes]),
+        'stake_centroids': np.array([s['analysis']['centroid'] for s in stakes], dtype=float).reshape(-1, 3),
+        'stake_radii': np.array([s['analysis'].get('avg_radius', 0.0) for s in stakes], dtype=float)
+    }
+
+
+def save_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, **snapshot)
+    print(f"💾 Snapshot de revisión guardado en: {path}")
+
+
+def load_snapshot(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {k: data[k] for k in data.files}
+
+
+def match_points(old_points, new_points, tolerance):
+    """
+    Emparejamiento 1 a 1 por cercanía (KD-tree): se aceptan pares a distancia
+    <= tolerance, del más cercano al más lejano, sin reutilizar puntos.
+    Devuelve (idx_old, idx_new, distancias).
+    """
+    old_points = np.asarray(old_points, dtype=float).reshape(-1, 3)
+    new_points = np.asarray(new_points, dtype=float).reshape(-1, 3)
+    empty = np.empty(0, dtype=np.intp)
+    if len(old_points) == 0 or len(new_points) == 0:
+        return empty, empty, np.empty(0)
+
+    tree = KDTree(new_points)
+    hits, dists = tree.query_radius(old_points, r=tolerance, return_distance=True)
+    counts = np.array([len(h) for h in hits])
+    if counts.sum() == 0:
+        return empty, empty, np.empty(0)
+
+    cand_old = np.repeat(np.arange(len(old_points)), counts)
+    cand_new = np.concatenate(hits).astype(np.intp)
+    cand_dist = np.concatenate(dists)
+
+    order = np.lexsort((cand_new, cand_old, cand_dist))
+    used_old = np.zeros(len(old_points), dtype=bool)
+    used_new = np.zeros(len(new_points), dtype=bool)
+    keep = []
+    for k in order:
+        o, n = cand_old[k], cand_new[k]
+        if not used_old[o] and not used_new[n]:
+            used_old[o] = used_new[n] = True
+            keep.append(k)
+    keep = np.array(keep, dtype=np.intp)
+    return cand_old[keep], cand_new[keep], cand_dist[keep]
+
+
+def diff_stakes(old, new, match_tolerance=5.0, move_tolerance=0.01):
+    """
+    Compara dos juegos de stakes (arreglos 'stake_*') y clasifica en
+    añadidos, eliminados, movidos y sin cambio.
+    """
+    i_old, i_new, dist = match_points(old['stake_centroids'], new['stake_centroids'], match_tolerance)
+
+    moved = dist > move_tolerance
+    removed = np.setdiff1d(np.arange(len(old['stake_centroids'])), i_old)
+    added = np.setdiff1d(np.arange(len(new['stake_centroids'])), i_new)
+
+    return {
+        'added': added,
+        'removed': removed,
+        'moved': np.column_stack([i_old[moved], i_new[moved]]).astype(np.intp),
+        'moved_distance': dist[moved],
+        'unchanged': int(np.sum(~moved))
+    }
+
+
+def print_stake_diff(old, new, delta):
+    print("\n" + "="*60)
+    print("📐 CAMBIOS ENTRE REVISIONES")
+    print("="*60)
+    print(f"   Sin cambio: {delta['unchanged']}")
+    print(f"   ➕ Añadidos: {len(delta['added'])}")
+    for i in delta['added']:
+        c = new['stake_centroids'][i]
+        print(f"      • {new['stake_ids'][i]} en ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f})")
+    print(f"   ➖ Eliminados: {len(delta['removed'])}")
+    for i in delta['removed']:
+        c = old['stake_centroids'][i]
+        print(f"      • {old['stake_ids'][i]} en ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f})")
+    print(f"   ↔ Movidos: {len(delta['moved'])}")
+    for (i_old, i_new), d in zip(delta['moved'], delta['moved_distance']):
+        c = new['stake_centroids'][i_new]
+        print(f"      • {old['stake_ids'][i_old]} → ({c[0]:.2f}, {c[1]:.2f}, {c[2]:.2f}) | Δ={d:.3f}mm")
+    print("="*60)
+
+
+def export_stake_diff(path, old, new, delta):
+    """Exporta el delta como CSV: Cambio, ID, Familia, X, Y, Z, Desplazamiento."""
+    import pandas as pd
+    rows = []
+    for i in delta['added']:
+        rows.append(('AÑADIDO', new, i, 0.0))
+    for i in delta['removed']:
+        rows.append(('ELIMINADO', old, i, 0.0))
+    for (_, i_new), d in zip(delta['moved'], delta['moved_distance']):
+        rows.append(('MOVIDO', new, i_new, d))
+
+    data = []
+    for change, src, i, d in rows:
+        c = src['stake_centroids'][i]
+        data.append({
+            "Cambio": change,
+            "ID": str(src['stake_ids'][i]),
+            "Familia": str(src['stake_families'][i]),
+            "X": round(c[0], 3), "Y": round(c[1], 3), "Z": round(c[2], 3),
+            "Desplazamiento": round(float(d), 4)
+        })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.DataFrame(data, columns=["Cambio", "ID", "Familia", "X", "Y", "Z", "Desplazamiento"]).to_csv(path, index=False)
+    print(f"💾 Delta de revisión guardado en: {path}")
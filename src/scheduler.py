@@ -0,0 +1,71 @@
+# src/scheduler.py
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing as mp
+
+
+class TaskGraph:
+    """
+    Ejecutor mínimo de un grafo de tareas con dependencias declaradas.
+    Cada tarea recibe como argumentos posicionales los resultados de sus
+    dependencias (en el orden declarado) seguidos de sus propios argumentos;
+    las tareas independientes corren a la vez en el pool.
+
+    El resultado es un dict {nombre: valor} que no depende del orden en que
+    terminaron las tareas, así que el pipeline es determinista siempre que
+    cada tarea lo sea y no compartan estado mutable.
+
+    mode: 'thread' (por defecto: los registros con caras OCC no se pueden
+    serializar), 'process' (tareas y argumentos serializables) o 'serial'
+    (mismo grafo en el hilo actual, para depurar o comparar).
+    """
+
+    def __init__(self, mode='thread', workers=None):
+        self.mode = mode
+        self.workers = workers
+        self.tasks = {}
+
+    def add(self, name, fn, *args, deps=(), **kwargs):
+        if name in self.tasks:
+            raise ValueError(f"Tarea duplicada: {name}")
+        missing = [d for d in deps if d not in self.tasks]
+        if missing:
+            raise ValueError(f"La tarea {name} depende de tareas no declaradas: {missing}")
+        self.tasks[name] = (fn, tuple(deps), args, kwargs)
+        return name
+
+    def _call(self, name, results):
+        fn, deps, args, kwargs = self.tasks[name]
+        return fn, tuple(results[d] for d in deps) + args, kwargs
+
+    def run(self):
+        results = {}
+        if self.mode == 'serial' or len(self.tasks) <= 1:
+            # Las dependencias siempre se declaran antes: el orden de alta es topológico
+            for name in self.tasks:
+                fn, args, kwargs = self._call(name, results)
+                results[name] = fn(*args, **kwargs)
+            return results
+
+        workers = self.workers or min(len(self.tasks), os.cpu_count() or 1)
+        if self.mode == 'process':
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        pending = dict(self.tasks)
+        running = {}
+        try:
+            while pending or running:
+                for name in [n for n, (_, deps, _, _) in pending.items() if all(d in results for d in deps)]:
+                    fn, args, kwargs = self._call(name, results)
+                    running[pool.submit(fn, *args, **kwargs)] = name
+                    del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()  # Relanza el error de la tarea
+        finally:
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=True)
+        return results
@@ -0,0 +1,183 @@
+# src/signatures.py
+import os
+import glob
+import numpy as np
+from sklearn.neighbors import KDTree
+from src.members import stake_cylinders
+from src.coaxial import stake_axis
+
+RADIUS_STEP = 0.05    # mm: cuantización de radios
+LENGTH_STEP = 0.25    # mm: cuantización de alturas, posiciones axiales y desvío lateral
+MAX_MEMBERS = 8       # Cilindros que entran en el vector numérico (la clave usa todos)
+FIN_WEIGHT = 1.0      # mm equivalentes a una aleta de diferencia en el vector
+
+# Vector: [n_cilindros, aletas, largo axial, desvío lateral, (radio, altura, offset axial) x MAX_MEMBERS]
+VECTOR_SIZE = 4 + 3 * MAX_MEMBERS
+
+
+def _quantize(values, step):
+    return np.round(np.asarray(values, dtype=float) / step).astype(np.int64)
+
+
+def stake_signature(stake):
+    """
+    Firma geométrica de un stake a partir de sus cilindros: radios, alturas,
+    aletas y disposición a lo largo del eje común. Los cilindros se ordenan
+    por posición axial y el sentido del eje se elige de forma canónica, así
+    que dos stakes iguales en cualquier orientación dan la misma firma.
+    Devuelve (clave hashable, vector numérico cuantizado en mm).
+    """
+    cylinders = stake_cylinders(stake)
+    fins = int(stake['analysis'].get('connected_planes', 0))
+    if cylinders:
+        radii = np.array([c['radius'] for c in cylinders], dtype=float)
+        heights = np.array([c['height'] for c in cylinders], dtype=float)
+        centers = np.array([c['center'] for c in cylinders], dtype=float)
+        axis, origin = stake_axis(stake)
+        rel = centers - origin
+        t = rel @ axis
+        lateral = float(np.max(np.linalg.norm(rel - np.outer(t, axis), axis=1)))
+    else:
+        # Stake legacy (sin cilindros miembro): solo radio medio
+        radii = np.array([stake['analysis'].get('avg_radius', 0.0)], dtype=float)
+        heights = np.zeros(1)
+        t = np.zeros(1)
+        lateral = 0.0
+
+    q_r, q_h = _quantize(radii, RADIUS_STEP), _quantize(heights, LENGTH_STEP)
+    forward = np.argsort(t, kind='stable')
+    layouts = []
+    for order, offsets in ((forward, t[forward] - t[forward].min()),
+                           (forward[::-1], t[forward].max() - t[forward[::-1]])):
+        q_t = _quantize(offsets, LENGTH_STEP)
+        layouts.append(tuple(zip(q_r[order].tolist(), q_h[order].tolist(), q_t.tolist())))
+    layout = min(layouts)  # Sentido canónico del eje
+
+    span = layout[-1][2]
+    q_lateral = int(_quantize(lateral, LENGTH_STEP))
+    key = (len(layout), fins, span, q_lateral, layout)
+
+    vector = np.zeros(VECTOR_SIZE, dtype=np.float32)
+    vector[:4] = (len(layout), fins * FIN_WEIGHT, span * LENGTH_STEP, q_lateral * LENGTH_STEP)
+    members = np.array(layout[:MAX_MEMBERS], dtype=float).reshape(-1, 3)
+    members *= (RADIUS_STEP, LENGTH_STEP, LENGTH_STEP)
+    vector[4:4 + members.size] = members.ravel()
+    return key, vector
+
+
+def key_string(key):
+    """Clave como texto (para guardar en .npz y comparar entre piezas)."""
+    n, fins, span, lateral, layout = key
+    members = ";".join(f"{r},{h},{t}" for r, h, t in layout)
+    return f"{n}|{fins}|{span}|{lateral}|{members}"
+
+
+def signature_path(original_filepath):
+    base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    return os.path.join("Reportes", base_name, f"Firmas_{base_name}.npz")
+
+
+def build_signatures(part, stakes):
+    """Arreglos de firmas de una pieza (una fila por stake)."""
+    keys, vectors = [], []
+    for stake in stakes:
+        key, vector = stake_signature(stake)
+        keys.append(key_string(key))
+        vectors.append(vector)
+    return {
+        'part': np.full(len(stakes), part),
+        'stake_id': np.array([s.get('cluster_id', 'UNK') for s in stakes]).astype(str),
+        'family': np.array([s.get('family_id', 'UNK') for s in stakes]).astype(str),
+        'centroid': np.array([s['analysis']['centroid'] for s in stakes], dtype=float).reshape(-1, 3),
+        'key': np.array(keys).astype(str),
+        'vector': np.array(vectors, dtype=np.float32).reshape(-1, VECTOR_SIZE),
+    }
+
+
+def save_signatures(original_filepath, stakes):
+    """Guarda las firmas de la pieza en Reportes/<pieza>/Firmas_<pieza>.npz."""
+    path = signature_path(original_filepath)
+    part = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **build_signatures(part, stakes))
+    print(f"💾 Firmas geométricas guardadas en: {path}")
+    return path
+
+
+class SignatureIndex:
+    """
+    Índice de firmas de todas las piezas: dict clave -> filas (coincidencia
+    exacta en O(1)) y KD-tree sobre los vectores (coincidencias cercanas).
+    Se arma desde los Firmas_*.npz guardados junto a los reportes, sin
+    volver a correr el pipeline.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._by_key = {}
+        for row, key in enumerate(columns['key'].tolist()):
+            self._by_key.setdefault(key, []).append(row)
+        self._tree = None
+
+    @classmethod
+    def load(cls, paths=("Reportes",)):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(glob.glob(os.path.join(path, "**", "Firmas_*.npz"), recursive=True))
+            else:
+                files.append(path)
+        parts = []
+        for file in sorted(files):
+            with np.load(file, allow_pickle=False) as data:
+                parts.append({k: data[k] for k in data.files})
+        if not parts:
+            return cls(build_signatures("", []))
+        return cls({k: np.concatenate([p[k] for p in parts]) for k in parts[0]})
+
+    def __len__(self):
+        return len(self.columns['key'])
+
+    def find(self, part, stake_id):
+        rows = np.flatnonzero((self.columns['part'] == part) & (self.columns['stake_id'] == stake_id))
+        return int(rows[0]) if len(rows) else None
+
+    def exact(self, key):
+        """Filas con exactamente la misma firma cuantizada."""
+        return np.array(self._by_key.get(key, []), dtype=np.intp)
+
+    def near(self, vector, k=20, max_distance=None):
+        """Las k firmas más cercanas (distancia euclídea en mm equivalentes)."""
+        if not len(self):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        if self._tree is None:
+            self._tree = KDTree(self.columns['vector'])
+        dist, rows = self._tree.query(np.asarray(vector, dtype=float).reshape(1, -1), k=min(k, len(self)))
+        dist, rows = dist[0], rows[0]
+        if max_distance is not None:
+            keep = dist <= max_distance
+            dist, rows = dist[keep], rows[keep]
+        return rows, dist
+
+    def similar(self, row, k=20, max_distance=None):
+        """
+        Stakes parecidos a la fila 'row': primero los idénticos (todas las
+        piezas), luego los k vecinos más cercanos que no lo sean.
+        """
+        exact = self.exact(self.columns['key'][row])
+        rows, dist = self.near(self.columns['vector'][row], k=k + len(exact), max_distance=max_distance)
+        near = ~np.isin(rows, exact)
+        return exact[exact != row], rows[near][:k], dist[near][:k]
+
+    def table(self, rows, distances=None):
+        import pandas as pd
+        c = self.columns['centroid'][rows]
+        frame = pd.DataFrame({
+            "Pieza": self.columns['part'][rows], "ID": self.columns['stake_id'][rows],
+            "Familia": self.columns['family'][rows],
+            "X": np.round(c[:, 0], 3), "Y": np.round(c[:, 1], 3), "Z": np.round(c[:, 2], 3),
+            "Firma": self.columns['key'][rows]
+        })
+        if distances is not None:
+            frame["Distancia"] = np.round(distances, 3)
+        return frame
@@ -0,0 +1,203 @@
+# src/step_scanner.py
+import os
+import re
+import time
+import numpy as np
+
+# Entidades Part 21 que interesan (texto crudo, sin transferir a OCC)
+_CYLINDER = re.compile(rb"#(\d+)\s*=\s*CYLINDRICAL_SURFACE\s*\(\s*'[^']*'\s*,\s*#(\d+)\s*,\s*([-+0-9.Ee]+)\s*\)")
+_PLACEMENT = re.compile(rb"#(\d+)\s*=\s*AXIS2_PLACEMENT_3D\s*\(\s*'[^']*'\s*,\s*#(\d+)\s*,\s*(#\d+|\$)")
+_POINT = re.compile(rb"#(\d+)\s*=\s*CARTESIAN_POINT\s*\(\s*'[^']*'\s*,\s*\(([^)]*)\)\s*\)")
+_DIRECTION = re.compile(rb"#(\d+)\s*=\s*DIRECTION\s*\(\s*'[^']*'\s*,\s*\(([^)]*)\)\s*\)")
+_SI_LENGTH = re.compile(rb"SI_UNIT\s*\(\s*(\.\w+\.|\$)\s*,\s*\.METRE\.\s*\)")
+_INCH = re.compile(rb"CONVERSION_BASED_UNIT\s*\(\s*'INCH'")
+_ASSEMBLY = b"NEXT_ASSEMBLY_USAGE_OCCURRENCE"
+
+_SI_PREFIX = {b'$': 1000.0, b'.MILLI.': 1.0, b'.CENTI.': 10.0, b'.DECI.': 100.0, b'.MICRO.': 0.001}
+
+
+def _chunks(path, chunk_size):
+    """Bloques de texto cortados en el último ';' (cada entidad queda entera en un bloque)."""
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b";") + 1
+            tail = data[cut:]
+            yield data[:cut]
+    if tail:
+        yield tail
+
+
+def _coords(matches, wanted):
+    """(ids, xyz) de las entidades cuyo id está en 'wanted'; solo esas se parsean."""
+    if not matches:
+        return np.empty(0, dtype=np.int64), np.empty((0, 3))
+    ids = np.fromiter((int(m[0]) for m in matches), dtype=np.int64, count=len(matches))
+    keep = np.flatnonzero(np.isin(ids, wanted))
+    xyz = np.array([[float(v) for v in matches[i][1].split(b",")[:3]] for i in keep], dtype=float).reshape(-1, 3)
+    return ids[keep], xyz
+
+
+def _placements(matches, wanted):
+    """(ids, [punto, dirección]) de las AXIS2_PLACEMENT_3D cuyo id está en 'wanted' (-1 = '$')."""
+    if not matches:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2), dtype=np.int64)
+    ids = np.fromiter((int(m[0]) for m in matches), dtype=np.int64, count=len(matches))
+    keep = np.flatnonzero(np.isin(ids, wanted))
+    refs = np.array([[int(matches[i][1]), int(matches[i][2][1:]) if matches[i][2] != b'$' else -1]
+                     for i in keep], dtype=np.int64).reshape(-1, 2)
+    return ids[keep], refs
+
+
+class StepScanner:
+    """
+    Pre-escaneo de texto de un STEP (Part 21) sin STEPControl_Reader.
+
+    Pasada 1: superficies cilíndricas (radio y referencia a su
+    AXIS2_PLACEMENT_3D), unidades y marca de ensamble.
+    Pasada 2: solo las colocaciones de los cilindros de tamaño stake.
+    Pasada 3: solo los CARTESIAN_POINT / DIRECTION referenciados por esas
+    colocaciones. Cada bloque se filtra contra los ids buscados antes de
+    guardar nada: la memoria depende de la cantidad de cilindros, no del
+    tamaño del archivo ni del total de colocaciones.
+
+    En ensambles (NEXT_ASSEMBLY_USAGE_OCCURRENCE) las coordenadas están en el
+    sistema de cada componente: los radios valen para el veredicto pero no se
+    propone ROI.
+    """
+
+    def __init__(self, path, min_radius=0.3, max_radius=10.0, min_family=3, roi_margin=25.0,
+                 chunk_size=16 << 20):
+        self.path = path
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.min_family = min_family    # Igual que HeatStakeAnalyzer: familias de radio con >= 3 miembros
+        self.roi_margin = roi_margin    # mm alrededor de los candidatos (eps del respaldo legacy)
+        self.chunk_size = chunk_size
+
+    def scan(self):
+        t0 = time.perf_counter()
+        cyl_axis, cyl_radius = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        total_cylinders = 0
+        scale = None
+        assembly = False
+
+        # Pasada 1: solo superficies cilíndricas (un arreglo por bloque), unidades y ensamble
+        for chunk in _chunks(self.path, self.chunk_size):
+            if not assembly and _ASSEMBLY in chunk:
+                assembly = True
+            if scale is None:
+                unit = _SI_LENGTH.search(chunk)
+                if unit is not None:
+                    scale = _SI_PREFIX.get(unit.group(1), 1.0)
+                elif _INCH.search(chunk):
+                    scale = 25.4
+            found = _CYLINDER.findall(chunk)
+            total_cylinders += len(found)
+            cyl_axis.append(np.fromiter((int(f[1]) for f in found), dtype=np.int64, count=len(found)))
+            cyl_radius.append(np.fromiter((float(f[2]) for f in found), dtype=float, count=len(found)))
+        scale = scale or 1.0
+
+        radius = np.concatenate(cyl_radius) * scale
+        axis_ref = np.concatenate(cyl_axis)
+        sized = (radius >= self.min_radius) & (radius < self.max_radius)
+        radius, axis_ref = radius[sized], axis_ref[sized]
+        del cyl_axis, cyl_radius
+
+        # Pasada 2: solo las colocaciones de los candidatos -> puntos y direcciones a resolver
+        wanted_placements = np.unique(axis_ref)
+        pl_ids, pl_refs = [], []
+        if len(wanted_placements):
+            for chunk in _chunks(self.path, self.chunk_size):
+                ids, refs = _placements(_PLACEMENT.findall(chunk), wanted_placements)
+                pl_ids.append(ids)
+                pl_refs.append(refs)
+        refs = self._lookup(axis_ref, pl_ids, pl_refs, fill=-1)
+        loc_ref, dir_ref = refs[:, 0], refs[:, 1]
+        wanted_points = np.unique(loc_ref[loc_ref >= 0])
+        wanted_dirs = np.unique(dir_ref[dir_ref >= 0])
+
+        # Pasada 3: solo los CARTESIAN_POINT / DIRECTION de esas colocaciones
+        point_ids, point_xyz, dir_ids, dir_xyz = [], [], [], []
+        if len(wanted_points):
+            for chunk in _chunks(self.path, self.chunk_size):
+                ids, xyz = _coords(_POINT.findall(chunk), wanted_points)
+                point_ids.append(ids)
+                point_xyz.append(xyz)
+                ids, xyz = _coords(_DIRECTION.findall(chunk), wanted_dirs)
+                dir_ids.append(ids)
+                dir_xyz.append(xyz)
+
+        locations = self._lookup(loc_ref, point_ids, point_xyz) * scale
+        directions = self._lookup(dir_ref, dir_ids, dir_xyz)
+        no_dir = np.isnan(directions[:, 0])
+        directions[no_dir] = (0.0, 0.0, 1.0)  # Eje Z por defecto (dirección '$')
+
+        result = {
+            'path': self.path,
+            'bytes': os.path.getsize(self.path),
+            'unit_scale': scale,
+            'assembly': assembly,
+            'total_cylinders': total_cylinders,
+            'radii': radius,
+            'locations': locations,
+            'directions': directions,
+        }
+        result.update(self._verdict(radius, locations, assembly))
+        result['seconds'] = time.perf_counter() - t0
+        return result
+
+    @staticmethod
+    def _lookup(refs, id_parts, value_parts, fill=np.nan):
+        """Valores de las entidades 'refs' (búsqueda binaria sobre los ids ordenados)."""
+        width = value_parts[0].shape[1] if value_parts else 3
+        out = np.full((len(refs), width), fill, dtype=value_parts[0].dtype if value_parts else float)
+        if not id_parts:
+            return out
+        ids = np.concatenate(id_parts)
+        xyz = np.concatenate(value_parts).reshape(-1, width)
+        if not len(ids):
+            return out
+        order = np.argsort(ids)
+        ids, xyz = ids[order], xyz[order]
+        pos = np.clip(np.searchsorted(ids, refs), 0, len(ids) - 1)
+        hit = (refs >= 0) & (ids[pos] == refs)
+        out[hit] = xyz[pos[hit]]
+        return out
+
+    def _verdict(self, radius, locations, assembly):
+        """Familias de radio (redondeo a 0.1 mm, como el analizador) y ROI de sus miembros."""
+        if not len(radius):
+            return {'likely': False, 'families': {}, 'roi': None}
+        keys, inverse, counts = np.unique(np.round(radius, 1), return_inverse=True, return_counts=True)
+        in_family = counts[inverse] >= self.min_family
+        families = {float(k): int(c) for k, c in zip(keys, counts) if c >= self.min_family}
+
+        roi = None
+        located = in_family & ~np.isnan(locations[:, 0])
+        if not assembly and located.any():
+            pts = locations[located]
+            roi = tuple(np.concatenate([pts.min(axis=0) - self.roi_margin,
+                                        pts.max(axis=0) + self.roi_margin]).tolist())
+        return {'likely': bool(in_family.any()), 'families': families, 'roi': roi}
+
+
+def print_scan(result):
+    size_mb = result['bytes'] / (1 << 20)
+    print("\n" + "="*60)
+    print(f"📄 PRE-ESCANEO STEP ({size_mb:.0f} MB en {result['seconds']:.1f}s)")
+    print("="*60)
+    print(f"   Superficies cilíndricas: {result['total_cylinders']} | tamaño stake: {len(result['radii'])}")
+    if result['assembly']:
+        print("   🧩 Ensamble (NEXT_ASSEMBLY_USAGE_OCCURRENCE): sin ROI, coordenadas por componente")
+    for rad, count in sorted(result['families'].items(), key=lambda kv: -kv[1])[:8]:
+        print(f"   🔹 R~{rad}mm: {count} cilindros")
+    if result['roi'] is not None:
+        r = result['roi']
+        print(f"   📦 ROI: ({r[0]:.1f}, {r[1]:.1f}, {r[2]:.1f}) - ({r[3]:.1f}, {r[4]:.1f}, {r[5]:.1f})")
+    print(f"   {'✅ Probables heat stakes' if result['likely'] else '⏭️ Sin stakes probables'}")
+    print("="*60)
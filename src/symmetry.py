@@ -0,0 +1,158 @@
+# src/symmetry.py
+import numpy as np
+from sklearn.neighbors import KDTree
+
+MIN_MATCH = 0.98      # Fracción de caras de la muestra que deben tener espejo
+SAMPLE_SIZE = 2000    # Caras muestreadas para verificar cada plano candidato
+TOLERANCE = 0.05      # mm (se agranda con el tamaño de la pieza)
+AXIS_NAMES = 'XYZ'
+CANDIDATES = 8        # Centros de bbox vecinos que se prueban como espejo de cada cara
+
+
+def match_tolerance(bboxes, tolerance=TOLERANCE):
+    """Tolerancia de coincidencia: absoluta o 1e-5 de la diagonal, la mayor."""
+    lo, hi = bboxes[:, :3].min(axis=0), bboxes[:, 3:].max(axis=0)
+    return max(tolerance, 1e-5 * float(np.linalg.norm(hi - lo)))
+
+
+def reflect_points(points, plane):
+    out = np.array(points, dtype=float, copy=True)
+    out[..., plane['axis']] = 2.0 * plane['offset'] - out[..., plane['axis']]
+    return out
+
+
+def reflect_directions(directions, plane):
+    out = np.array(directions, dtype=float, copy=True)
+    out[..., plane['axis']] = -out[..., plane['axis']]
+    return out
+
+
+def _match(types, centers, extents, params, rows, plane, tree, tol, k=CANDIDATES):
+    """
+    Compañera espejo de cada fila de 'rows' (-1 si no hay): la más cercana
+    entre los k centros de bbox vecinos que coincida en tipo, bbox y
+    parámetro. Varias caras comparten centro (pared y agujero de un boss
+    hueco de igual altura), así que no alcanza con el vecino más cercano.
+    """
+    mirrored = reflect_points(centers[rows], plane)
+    dist, idx = tree.query(mirrored, k=min(k, len(centers)))
+    ok = dist <= tol
+    ok &= types[idx] == types[rows][:, None]
+    ok &= np.all(np.abs(extents[idx] - extents[rows][:, None, :]) <= tol, axis=2)
+    p_rows = params[rows][:, None]
+    ok &= (np.abs(params[idx] - p_rows) <= tol) | (np.isnan(params[idx]) & np.isnan(p_rows))
+    first = np.argmax(ok, axis=1)  # Vecinos ordenados por distancia: el primero válido
+    found = ok[np.arange(len(rows)), first]
+    return np.where(found, idx[np.arange(len(rows)), first], -1)
+
+
+def find_mirror_plane(types, bboxes, params, sample_size=SAMPLE_SIZE, min_match=MIN_MATCH,
+                      tolerance=TOLERANCE, seed=0):
+    """
+    Busca un plano de simetría especular alineado con los ejes a partir de
+    las bboxes de las caras: el candidato de cada eje pasa por el centro del
+    bbox global y se verifica en una muestra de caras (KD-tree sobre los
+    centros de bbox). Devuelve (plano o None, {eje: fracción con espejo}).
+    Plano: {'axis': 0|1|2, 'offset': mm, 'score': fracción, 'tolerance': mm}.
+    """
+    types = np.asarray(types)
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 6)
+    params = np.asarray(params, dtype=float)
+    n = len(types)
+    if n < 2:
+        return None, {}
+
+    tol = match_tolerance(bboxes, tolerance)
+    centers = 0.5 * (bboxes[:, :3] + bboxes[:, 3:])
+    extents = bboxes[:, 3:] - bboxes[:, :3]
+    tree = KDTree(centers)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(n, size=min(sample_size, n), replace=False)
+    global_box = np.concatenate([bboxes[:, :3].min(axis=0), bboxes[:, 3:].max(axis=0)])
+
+    best, scores = None, {}
+    for axis in range(3):
+        plane = {'axis': axis, 'offset': 0.5 * float(global_box[axis] + global_box[axis + 3]), 'tolerance': tol}
+        partners = _match(types, centers, extents, params, rows, plane, tree, tol)
+        # Las caras sobre el plano son su propio espejo y no prueban nada
+        off_plane = np.abs(centers[rows, axis] - plane['offset']) > tol
+        score = float(np.mean(partners[off_plane] >= 0)) if off_plane.any() else 0.0
+        scores[AXIS_NAMES[axis]] = score
+        if score >= min_match and (best is None or score > best['score']):
+            best = dict(plane, score=score)
+    return best, scores
+
+
+def split_halves(types, bboxes, params, plane):
+    """
+    Reparte las caras respecto del plano. Devuelve (analyze, mirror_of):
+    analyze[N] = caras que se extraen de verdad (la mitad negativa, las que
+    cruzan el plano y las de la mitad positiva sin espejo, que rompen la
+    simetría); mirror_of = {índice en la mitad negativa: índice de su espejo
+    en la mitad positiva} para reflejar los cilindros ya extraídos.
+    """
+    types = np.asarray(types)
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 6)
+    params = np.asarray(params, dtype=float)
+    tol = plane['tolerance']
+    axis = plane['axis']
+    centers = 0.5 * (bboxes[:, :3] + bboxes[:, 3:])
+    extents = bboxes[:, 3:] - bboxes[:, :3]
+    tree = KDTree(centers)
+
+    negative = np.flatnonzero(centers[:, axis] < plane['offset'] - tol)
+    partners = _match(types, centers, extents, params, negative, plane, tree, tol)
+    positive = centers[:, axis] > plane['offset'] + tol
+
+    # Pares espejo mutuos, uno a uno
+    mirror_of = {}
+    taken = set()
+    for i, j in zip(negative.tolist(), partners.tolist()):
+        if j >= 0 and positive[j] and j not in taken:
+            mirror_of[i] = j
+            taken.add(j)
+
+    analyze = np.ones(len(types), dtype=bool)
+    if taken:
+        analyze[np.fromiter(taken, dtype=np.intp)] = False
+    return analyze, mirror_of
+
+
+def unmatched_faces(bboxes, plane, mirror_of):
+    """Caras fuera del plano sin espejo (rompen la simetría): máscara [N]."""
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 6)
+    centers = 0.5 * (bboxes[:, :3] + bboxes[:, 3:])
+    off_plane = np.abs(centers[:, plane['axis']] - plane['offset']) > plane['tolerance']
+    paired = np.zeros(len(bboxes), dtype=bool)
+    if mirror_of:
+        paired[list(mirror_of.keys())] = True
+        paired[list(mirror_of.values())] = True
+    return off_plane & ~paired
+
+
+def release_near_breakers(bboxes, plane, analyze, mirror_of, margin=0.15):
+    """
+    Los pares espejo en los que alguna de las dos caras (bbox agrandado en
+    'margin' + tolerancia) toca una cara sin espejo dejan de reflejarse y la
+    gemela se extrae de verdad: una aleta junto a cualquiera de las dos hace
+    que sus conteos (topológicos o espaciales) no coincidan. Modifica
+    analyze y mirror_of; devuelve cuántas se liberaron.
+    """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 6)
+    breakers = bboxes[unmatched_faces(bboxes, plane, mirror_of)]
+    if not len(breakers) or not mirror_of:
+        return 0
+    pairs = np.array(list(mirror_of.items()), dtype=np.intp)
+    grow = margin + plane['tolerance']
+    touched = np.zeros(len(pairs), dtype=bool)
+    for side in (0, 1):
+        boxes = bboxes[pairs[:, side]]
+        for start in range(0, len(breakers), 256):
+            chunk = breakers[start:start + 256]
+            lo_ok = boxes[:, None, :3] - grow <= chunk[None, :, 3:]
+            hi_ok = boxes[:, None, 3:] + grow >= chunk[None, :, :3]
+            touched |= np.any(np.all(lo_ok & hi_ok, axis=2), axis=1)
+    for i, j in pairs[touched].tolist():
+        del mirror_of[i]
+        analyze[j] = True
+    return int(touched.sum())
@@ -0,0 +1,242 @@
+# src/toolpath.py
+import os
+import math
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from src.coaxial import stake_axis
+
+ANGLE_TOLERANCE = 5.0   # grados: ejes de aproximación dentro de esta tolerancia comparten grupo
+NEIGHBORS = 8           # Vecinos candidatos por punto en 2-opt / Or-opt
+MAX_SEGMENT = 3         # Largo máx. del tramo que mueve Or-opt
+MAX_PASSES = 50
+
+
+def approach_axis(stake):
+    """
+    Eje de aproximación del stake (unitario, con signo canónico: la mayor
+    componente positiva) o None si es legacy y no tiene cilindros miembro.
+    """
+    result = stake_axis(stake)
+    if result is None:
+        return None
+    axis = result[0]
+    return axis if axis[np.argmax(np.abs(axis))] > 0 else -axis
+
+
+def group_by_axis(axes, angle_tolerance=ANGLE_TOLERANCE):
+    """Etiqueta de grupo por stake (greedy sobre los ejes); -1 = sin eje conocido."""
+    cos_tol = math.cos(math.radians(angle_tolerance))
+    labels = np.full(len(axes), -1, dtype=np.intp)
+    representatives = []
+    for i, axis in enumerate(axes):
+        if axis is None:
+            continue
+        for label, rep in enumerate(representatives):
+            if abs(float(axis @ rep)) >= cos_tol:
+                labels[i] = label
+                break
+        else:
+            labels[i] = len(representatives)
+            representatives.append(axis)
+    return labels, representatives
+
+
+def path_length(points, order):
+    if len(order) < 2:
+        return 0.0
+    p = points[order]
+    return float(np.linalg.norm(np.diff(p, axis=0), axis=1).sum())
+
+
+def nearest_neighbor_order(points, start=0):
+    """Construcción por vecino más cercano (KD-tree, consultas crecientes hasta hallar uno libre)."""
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+    tree = KDTree(points)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.intp)
+    current = start
+    for step in range(n):
+        order[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        k = min(NEIGHBORS, n)
+        while True:
+            idx = tree.query(points[current:current + 1], k=k, return_distance=False)[0]
+            free = idx[~visited[idx]]
+            if len(free):
+                current = int(free[0])
+                break
+            if k == n:
+                break
+            k = min(2 * k, n)
+    return order
+
+
+def improve_order(points, order, neighbors=NEIGHBORS, max_passes=MAX_PASSES):
+    """
+    Mejora local de un recorrido abierto: 2-opt (incluida la inversión de un
+    extremo, el recorrido no vuelve al inicio) y Or-opt (mover tramos de 1 a
+    MAX_SEGMENT stakes). Los candidatos salen de los k vecinos más cercanos,
+    así cada pasada es O(n·k) y miles de stakes se resuelven en segundos.
+    """
+    n = len(order)
+    if n < 4:
+        return order
+    tour = np.array(order, dtype=np.intp)
+    pos = np.empty(n, dtype=np.intp)
+    pos[tour] = np.arange(n)
+    P = points.tolist()
+    dist = lambda a, b: math.dist(P[a], P[b])
+    near = KDTree(points).query(points, k=min(neighbors + 1, n), return_distance=False)[:, 1:].tolist()
+
+    def reverse(i, j):
+        tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+        pos[tour[i:j + 1]] = np.arange(i, j + 1)
+
+    for _ in range(max_passes):
+        improved = False
+
+        # 2-opt: cambiar (a,b)+(c,d) por (a,c)+(b,d) invirtiendo b..c
+        for i in range(n - 1):
+            a, b = tour[i], tour[i + 1]
+            d_ab = dist(a, b)
+            # Extremos libres: invertir el prefijo o el sufijo
+            if dist(tour[0], b) < d_ab - 1e-9:
+                reverse(0, i)
+                improved = True
+                continue
+            if dist(a, tour[-1]) < d_ab - 1e-9:
+                reverse(i + 1, n - 1)
+                improved = True
+                continue
+            for c in near[a]:
+                j = pos[c]
+                if j <= i + 1:
+                    continue
+                d_cd = dist(c, tour[j + 1]) if j + 1 < n else 0.0
+                new = dist(a, c) + (dist(b, tour[j + 1]) if j + 1 < n else 0.0)
+                if new < d_ab + d_cd - 1e-9:
+                    reverse(i + 1, j)
+                    improved = True
+                    break
+
+        # Or-opt: sacar un tramo corto y reinsertarlo (directo o invertido) junto a un vecino
+        for length in range(1, MAX_SEGMENT + 1):
+            i = 0
+            while i + length <= n:
+                seg = tour[i:i + length].tolist()
+                first, last = seg[0], seg[-1]
+                prev = tour[i - 1] if i > 0 else None
+                nxt = tour[i + length] if i + length < n else None
+                removal = ((dist(prev, first) if prev is not None else 0.0)
+                           + (dist(last, nxt) if nxt is not None else 0.0)
+                           - (dist(prev, nxt) if prev is not None and nxt is not None else 0.0))
+                best = None
+                for c in set(near[first]) | set(near[last]):
+                    j = pos[c]
+                    if i <= j < i + length:
+                        continue
+                    # Insertar entre c y su siguiente en el recorrido (sin el tramo)
+                    k = j + 1 if j + 1 != i else i + length
+                    e = tour[k] if k < n else None
+                    for head, tail in ((first, last), (last, first)):
+                        added = dist(c, head) + (dist(tail, e) - dist(c, e) if e is not None else 0.0)
+                        gain = removal - added
+                        if gain > 1e-9 and (best is None or gain > best[0]):
+                            best = (gain, c, head != first)
+                if best is None:
+                    i += 1
+                    continue
+                _, c, flipped = best
+                rest = np.concatenate([tour[:i], tour[i + length:]])
+                at = int(np.flatnonzero(rest == c)[0]) + 1
+                moved = np.array(seg[::-1] if flipped else seg, dtype=np.intp)
+                tour[:] = np.concatenate([rest[:at], moved, rest[at:]])
+                lo, hi = min(i, at), max(i + length, at + length)
+                pos[tour[lo:hi]] = np.arange(lo, hi)
+                improved = True
+                i += 1
+        if not improved:
+            break
+    return tour
+
+
+def plan_visit_order(stakes, angle_tolerance=ANGLE_TOLERANCE):
+    """
+    Orden de visita para la celda robotizada: grupos por eje de aproximación
+    (un cambio de orientación por grupo, de mayor a menor) y, dentro de cada
+    grupo, vecino más cercano + 2-opt / Or-opt sobre los centroides. Cada
+    grupo arranca en el stake más cercano al final del grupo anterior.
+    """
+    t0 = time.perf_counter()
+    points = np.array([s['analysis']['centroid'] for s in stakes], dtype=float).reshape(-1, 3)
+    axes = [approach_axis(s) for s in stakes]
+    labels, representatives = group_by_axis(axes, angle_tolerance)
+
+    groups = sorted(set(labels.tolist()), key=lambda g: (g == -1, -int(np.sum(labels == g)), g))
+    order, group_of, visited_axes, baseline, length = [], [], [], 0.0, 0.0
+    last = None
+    for g in groups:
+        members = np.flatnonzero(labels == g)
+        pts = points[members]
+        baseline += path_length(pts, np.arange(len(members)))  # Orden del reporte
+        start = 0 if last is None else int(np.argmin(np.linalg.norm(pts - last, axis=1)))
+        local = improve_order(pts, nearest_neighbor_order(pts, start))
+        length += path_length(pts, local)
+        order.extend(members[local].tolist())
+        group_of.extend([g if g < 0 else len(visited_axes)] * len(members))  # Grupos numerados en orden de visita
+        if g >= 0:
+            visited_axes.append(representatives[g])
+        last = pts[local[-1]]
+
+    order = np.array(order, dtype=np.intp)
+    return {
+        'order': order,
+        'group': np.array(group_of, dtype=np.intp),
+        'points': points[order],
+        'axes': np.array([axes[i] if axes[i] is not None else (np.nan,) * 3 for i in order], dtype=float).reshape(-1, 3),
+        'group_axes': visited_axes,
+        'baseline_length': baseline,
+        'length': length,
+        'seconds': time.perf_counter() - t0,
+    }
+
+
+def toolpath_path(original_filepath):
+    base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    return os.path.join("Reportes", base_name, f"Ruta_{base_name}.csv")
+
+
+def save_toolpath(original_filepath, stakes, angle_tolerance=ANGLE_TOLERANCE):
+    """Exporta el orden de visita a Reportes/<pieza>/Ruta_<pieza>.csv e imprime el ahorro."""
+    plan = plan_visit_order(stakes, angle_tolerance)
+    path = toolpath_path(original_filepath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    p, a, order = plan['points'], plan['axes'], plan['order']
+    step = np.zeros(len(order))
+    same_group = plan['group'][1:] == plan['group'][:-1]
+    step[1:] = np.where(same_group, np.linalg.norm(np.diff(p, axis=0), axis=1), 0.0)
+    pd.DataFrame({
+        "Orden": np.arange(1, len(order) + 1),
+        "Grupo": [f"EJE{g + 1}" if g >= 0 else "SIN_EJE" for g in plan['group']],
+        "ID": [stakes[i].get('cluster_id', 'UNK') for i in order],
+        "Familia": [stakes[i].get('family_id', 'UNK') for i in order],
+        "X": np.round(p[:, 0], 3), "Y": np.round(p[:, 1], 3), "Z": np.round(p[:, 2], 3),
+        "AX": np.round(a[:, 0], 4) + 0.0, "AY": np.round(a[:, 1], 4) + 0.0, "AZ": np.round(a[:, 2], 4) + 0.0,
+        "Tramo": np.round(step, 3),
+    }).to_csv(path, index=False)
+
+    saved = plan['baseline_length'] - plan['length']
+    pct = 100.0 * saved / plan['baseline_length'] if plan['baseline_length'] > 0 else 0.0
+    print(f"🤖 Ruta de visita: {len(order)} stakes en {len(plan['group_axes'])} ejes de aproximación "
+          f"({plan['seconds']:.2f}s)")
+    print(f"   Recorrido: {plan['baseline_length']:.1f} mm (orden del reporte) → {plan['length']:.1f} mm "
+          f"| ahorro {saved:.1f} mm ({pct:.1f}%)")
+    print(f"💾 Ruta guardada en: {path}")
+    return plan
@@ -0,0 +1,167 @@
+# src/trace.py
+import os
+import glob
+import numpy as np
+from src.members import stake_cylinders
+
+# Motivo final por el que un cilindro no terminó en un stake ('' = aceptado).
+# 'fins' queda solo si el cilindro no llegó al respaldo legacy.
+REASONS = ('', 'cascade_radius', 'cascade_bbox', 'cascade_topology', 'cascade_spatial',
+           'fins', 'family_size', 'legacy_radius', 'legacy_small', 'dbscan_noise')
+_CODE = {name: code for code, name in enumerate(REASONS)}
+
+NOT_CLUSTERED = -2   # legacy_label / family_cluster: el cilindro no pasó por esa etapa
+
+
+class DecisionTrace:
+    """
+    Traza de decisiones por cilindro registrada durante el pipeline real.
+    HeatStakeAnalyzer la llena si se le asigna (analyzer.trace) y finish()
+    anota el stake final de cada cilindro; todo queda en columnas tipadas
+    (una fila por cilindro) para filtrar sin volver a abrir el STEP.
+    """
+
+    def __init__(self, part=""):
+        self.part = part
+        self._rows = {}
+        self.cylinders = []
+        self.reason = np.empty(0, dtype=np.int8)
+        self.family = np.empty(0, dtype=object)
+        self.family_cluster = np.empty(0, dtype=np.int32)
+        self.legacy_label = np.empty(0, dtype=np.int32)
+        self.stake_id = np.empty(0, dtype=object)
+
+    def begin(self, cylinders):
+        """Registra la población completa (incluidos los descartados por la cascada)."""
+        self.cylinders = list(cylinders)
+        n = len(self.cylinders)
+        self._rows = {id(c): i for i, c in enumerate(self.cylinders)}
+        self.reason = np.zeros(n, dtype=np.int8)
+        self.family = np.full(n, '', dtype=object)
+        self.family_cluster = np.full(n, NOT_CLUSTERED, dtype=np.int32)
+        self.legacy_label = np.full(n, NOT_CLUSTERED, dtype=np.int32)
+        self.stake_id = np.full(n, '', dtype=object)
+        for i, c in enumerate(self.cylinders):
+            if 'rejected_by' in c:
+                self.reason[i] = _CODE[f"cascade_{c['rejected_by']}"]
+
+    def _index(self, cylinders):
+        return np.fromiter((self._rows[id(c)] for c in cylinders if id(c) in self._rows), dtype=np.intp)
+
+    def reject(self, cylinders, reason):
+        self.reason[self._index(cylinders)] = _CODE[reason]
+
+    def accept(self, cylinders):
+        self.reason[self._index(cylinders)] = 0
+
+    def set_family(self, cylinders, family_id):
+        self.family[self._index(cylinders)] = family_id
+
+    def set_cluster(self, cylinders, label, stake_id):
+        idx = self._index(cylinders)
+        self.family_cluster[idx] = label
+        self.stake_id[idx] = stake_id
+
+    def set_legacy(self, cylinders, labels, stake_ids=None):
+        """Etiquetas DBSCAN del respaldo (-1 = ruido) y stake legacy de cada cilindro."""
+        idx = self._index(cylinders)
+        self.legacy_label[idx] = labels
+        if stake_ids is not None:
+            self.stake_id[idx] = stake_ids
+
+    def finish(self, stakes):
+        """Stake final de cada cilindro (tras las fusiones, incluida --custom-rules)."""
+        for stake in stakes:
+            members = stake_cylinders(stake)
+            if members:
+                self.stake_id[self._index(members)] = stake.get('cluster_id', '')
+        return self
+
+    def columns(self):
+        """Columnas tipadas (arreglos NumPy); la posición sale del CoG si ya se calculó."""
+        n = len(self.cylinders)
+        position = np.full((n, 3), np.nan)
+        exact = np.zeros(n, dtype=bool)
+        for i, c in enumerate(self.cylinders):
+            if dict.__contains__(c, 'center'):
+                position[i] = c['center']
+                exact[i] = not c.get('center_approx', False)
+            elif 'axis_location' in c:
+                position[i] = c['axis_location']
+        return {
+            'part': np.full(n, self.part),
+            'face_index': np.array([c.get('face_index', -1) for c in self.cylinders], dtype=np.int32),
+            'x': position[:, 0], 'y': position[:, 1], 'z': position[:, 2],
+            'center_exact': exact,
+            'radius': np.array([c['radius'] for c in self.cylinders], dtype=float),
+            'connected_planes': np.array([c.get('connected_planes', -1) for c in self.cylinders], dtype=np.int32),
+            'reason': self.reason,
+            'family': self.family.astype(str),
+            'family_cluster': self.family_cluster,
+            'legacy_label': self.legacy_label,
+            'stake_id': self.stake_id.astype(str),
+        }
+
+    def save(self, path):
+        """Guarda en .npz (siempre disponible) o .parquet (si hay pyarrow; si no, cae a .npz)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        columns = self.columns()
+        if path.endswith(".parquet"):
+            try:
+                to_frame(columns).to_parquet(path, index=False)
+                print(f"💾 Traza de decisiones guardada en: {path}")
+                return path
+            except ImportError:
+                path = os.path.splitext(path)[0] + ".npz"
+                print("⚠️ Parquet no disponible (falta pyarrow), se guarda como .npz")
+        np.savez_compressed(path, reason_names=np.array(REASONS), **columns)
+        print(f"💾 Traza de decisiones guardada en: {path}")
+        return path
+
+    def summary(self):
+        counts = np.bincount(self.reason, minlength=len(REASONS))
+        return {REASONS[code] or 'accepted': int(count) for code, count in enumerate(counts) if count}
+
+
+def trace_path(original_filepath, ext=".npz"):
+    base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    return os.path.join("Reportes", base_name, f"Traza_{base_name}{ext}")
+
+
+def to_frame(columns):
+    import pandas as pd
+    frame = pd.DataFrame({k: v for k, v in columns.items() if k != 'reason_names'})
+    names = columns.get('reason_names', REASONS)
+    frame['reason'] = pd.Categorical.from_codes(np.asarray(frame['reason'], dtype=np.int8),
+                                                categories=[n or 'accepted' for n in names])
+    return frame
+
+
+def load_trace(path):
+    """Lee una traza (.npz o .parquet) como DataFrame con 'reason' categórico."""
+    import pandas as pd
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    with np.load(path, allow_pickle=False) as data:
+        return to_frame({k: data[k] for k in data.files})
+
+
+def load_traces(paths):
+    """
+    Concatena trazas de varias piezas. 'paths' puede mezclar archivos y
+    carpetas (se buscan Traza_*.npz / Traza_*.parquet recursivamente).
+    """
+    import pandas as pd
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("Traza_*.npz", "Traza_*.parquet"):
+                files.extend(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            files.append(path)
+    if not files:
+        return pd.DataFrame()
+    frames = [load_trace(f) for f in sorted(files)]
+    frame = pd.concat(frames, ignore_index=True)
+    frame['reason'] = frame['reason'].astype(pd.CategoricalDtype([n or 'accepted' for n in REASONS]))
+    return frame
@@ -4,6 +4,7 @@ import os
 import numpy as np
 import pandas as pd
 from collections import defaultdict
+from src.retune import marker_key, diff_markers
 
 # Importaciones de PythonOCC
 from OCC.Display.SimpleGui import init_display
@@ -13,6 +14,14 @@ from OCC.Core.gp import gp_Pnt
 from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
 from OCC.Core.V3d import V3d_TypeOfOrientation
 
+# Vistas fijas para las capturas offscreen (nombre -> orientación de cámara)
+SNAPSHOT_VIEWS = {
+    'iso': V3d_TypeOfOrientation.V3d_XposYposZpos,
+    'superior': V3d_TypeOfOrientation.V3d_Zpos,
+    'frontal': V3d_TypeOfOrientation.V3d_Yneg,
+    'lateral': V3d_TypeOfOrientation.V3d_Xpos,
+}
+
 class ResultVisualizer:
     def __init__(self, shape, valid_stakes, rejected_clusters):
         self.shape = shape
@@ -31,6 +40,35 @@ class ResultVisualizer:
         
         self.ais_groups = defaultdict(list)
         self.visibility_states = {} 
+        self._marker_shapes = {}   # (rechazado, índice) -> esfera ya construida (prepare_display)
+        self._markers = {}         # marker_key -> (grupo, AIS, texto) de lo que está en pantalla
+        self.retuner = None        # Retuner opcional (menú 'AJUSTE EN VIVO')
+        self.show_rejected = False
+
+    def prepare_display(self, show_rejected=False):
+        """
+        Trabajo previo a la visualización que no necesita el visor: malla de la
+        pieza (con la misma flecha relativa que usa AIS por defecto) y esferas
+        de los marcadores. Puede correr en paralelo con la exportación.
+        """
+        from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+        from OCC.Core.Bnd import Bnd_Box
+        from OCC.Core.BRepBndLib import brepbndlib_Add
+
+        if self.shape:
+            bbox = Bnd_Box()
+            brepbndlib_Add(self.shape, bbox)
+            xmin, ymin, zmin, xmax, ymax, zmax = bbox.Get()
+            deflection = 0.001 * max(xmax - xmin, ymax - ymin, zmax - zmin)
+            BRepMesh_IncrementalMesh(self.shape, deflection, False, np.radians(20.0), True)
+
+        items = [(False, i, hs) for i, hs in enumerate(self.valid_stakes)]
+        if show_rejected:
+            items += [(True, i, r) for i, r in enumerate(self.rejected_clusters)]
+        for is_rejected, index, item in items:
+            pnt, radius = self._marker_geometry(item, is_rejected)
+            self._marker_shapes[(is_rejected, index)] = BRepPrimAPI_MakeSphere(pnt, radius).Shape()
+        return len(self._marker_shapes)
 
     def show_3d(self, show_rejected=False):
         print("\n🎨 Iniciando visualización...")
@@ -39,6 +77,7 @@ class ResultVisualizer:
         sys.stdout.flush()
         
         self.display, self.start_display, self.add_menu, self.add_function = init_display()
+        self.show_rejected = show_rejected
         
         # 1. Dibujar Pieza
         if self.shape:
@@ -56,6 +95,8 @@ class ResultVisualizer:
 
         # 3. Construir UI
         self._build_menu()
+        if self.retuner is not None:
+            self._build_retune_menu()
         self._focus_camera()
         
         # Mostrar todo
@@ -73,18 +114,21 @@ class ResultVisualizer:
         sorted_groups = sorted(self.ais_groups.keys())
         
         for group_id in sorted_groups:
-            self.visibility_states[group_id] = True
-            
-            # Crear nombre bonito
-            color_name = self.config.get(group_id, self.config['DEFAULT'])['name']
-            # Reemplazamos espacios por guiones bajos porque a veces SimpleGui corta nombres con espacios
-            item_label = f"Alternar_{group_id}_({color_name})" 
-            
-            # --- SOLUCIÓN: Usar un método fábrica ---
-            # Esto crea una función única para este grupo y le asigna el nombre correcto.
-            callback_function = self._create_menu_item(group_id, item_label)
-            
-            self.add_function(menu_name, callback_function)
+            self._add_layer_item(menu_name, group_id)
+
+    def _add_layer_item(self, menu_name, group_id):
+        self.visibility_states[group_id] = True
+        
+        # Crear nombre bonito
+        color_name = self.config.get(group_id, self.config['DEFAULT'])['name']
+        # Reemplazamos espacios por guiones bajos porque a veces SimpleGui corta nombres con espacios
+        item_label = f"Alternar_{group_id}_({color_name})" 
+        
+        # --- SOLUCIÓN: Usar un método fábrica ---
+        # Esto crea una función única para este grupo y le asigna el nombre correcto.
+        callback_function = self._create_menu_item(group_id, item_label)
+        
+        self.add_function(menu_name, callback_function)
 
     def _create_menu_item(self, group_id, label_text):
         """
@@ -127,6 +171,72 @@ class ResultVisualizer:
             print(f"❌ ERROR: {e}")
             sys.stdout.flush()
 
+    def _build_retune_menu(self):
+        menu_name = 'AJUSTE EN VIVO'
+        self.add_menu(menu_name)
+        names = ['merge_distance', 'eps'] + sorted(self.retuner.params['rules'])
+        for name in names:
+            for direction, sign in ((+1, 'mas'), (-1, 'menos')):
+                self.add_function(menu_name, self._create_retune_item(name, direction, f"{name}_{sign}"))
+
+    def _create_retune_item(self, name, direction, label_text):
+        def callback(*args):
+            self._retune(name, direction)
+        callback.__name__ = label_text
+        return callback
+
+    def _retune(self, name, direction):
+        """Re-analiza con el parámetro ajustado y actualiza solo los marcadores que cambiaron."""
+        try:
+            value = self.retuner.adjust(name, direction)
+            valid, rejected = self.retuner.run()
+            removed, added = self._apply_markers(valid, rejected)
+            print(f"🎛️ {name} = {value:g} | {len(valid)} stakes | -{removed} / +{added} marcadores "
+                  f"| análisis {self.retuner.last_seconds*1000:.0f} ms")
+            print(f"   {self.retuner.describe()}")
+            sys.stdout.flush()
+        except Exception as e:
+            print(f"❌ ERROR: {e}")
+            sys.stdout.flush()
+
+    def _apply_markers(self, valid_stakes, rejected_clusters):
+        """
+        Diferencia entre los marcadores en pantalla y el nuevo resultado:
+        borra los que ya no están, dibuja los nuevos y deja el resto (y la
+        pieza) intactos. Devuelve (quitados, agregados).
+        """
+        ctx = self.display.Context
+        self._marker_shapes = {}  # Las esferas precalculadas eran por índice del resultado anterior
+        shown = set(self._markers)
+        removed, added = diff_markers(shown, valid_stakes)
+        added = [(k, item, False) for k, item in added]
+        if self.show_rejected:
+            removed_r, added_r = diff_markers(shown, rejected_clusters, is_rejected=True)
+            removed = [k for k in removed if k[0] != 'REJECTED'] + removed_r
+            added += [(k, item, True) for k, item in added_r]
+        else:
+            removed = [k for k in removed if k[0] != 'REJECTED']
+
+        for key in removed:
+            group_id, ais, text = self._markers.pop(key)
+            ctx.Remove(ais, False)
+            if text is not None:
+                text.Erase()
+            self.ais_groups[group_id].remove(ais)
+        for key, item, is_rejected in added:
+            group_id = self._draw_marker(item, None, is_rejected=is_rejected)
+            if group_id not in self.visibility_states:
+                self._add_layer_item('CONTROL DE CAPAS', group_id)
+            elif not self.visibility_states[group_id]:
+                ctx.Erase(self._markers[key][1], False)
+
+        self.valid_stakes = valid_stakes
+        self.rejected_clusters = rejected_clusters
+        ctx.UpdateCurrentViewer()
+        if hasattr(self.display, 'Repaint'):
+            self.display.Repaint()
+        return len(removed), len(added)
+
     def _print_status(self):
         print("\n" + "="*30)
         print("   ESTADO DE VISIBILIDAD")
@@ -151,6 +261,46 @@ class ResultVisualizer:
         self.display.View.SetProj(V3d_TypeOfOrientation.V3d_XposYposZpos)
         self.display.View.SetUp(0, 0, 1)
 
+    def render_snapshots(self, original_filepath, views=None, size=(1024, 768), show_rejected=False):
+        """
+        Captura PNG de la pieza y los marcadores desde vistas fijas, sin abrir
+        ventana (visor offscreen). Devuelve [(vista, ruta), ...] en
+        Reportes/<pieza>/Vistas/.
+        """
+        from OCC.Display.OCCViewer import OffscreenRenderer
+
+        planned = snapshot_paths(original_filepath, views)
+        output_dir = os.path.dirname(planned[0][1])
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.display = OffscreenRenderer(screen_size=size)
+        self.ais_groups = defaultdict(list)
+        self._markers = {}
+        if self.shape:
+            ais_shape = AIS_Shape(self.shape)
+            self.display.Context.Display(ais_shape, False)
+            self.display.Context.SetTransparency(ais_shape, 0.8, False)
+        for i, hs in enumerate(self.valid_stakes):
+            self._draw_marker(hs, i, is_rejected=False)
+        if show_rejected:
+            for i, r in enumerate(self.rejected_clusters):
+                self._draw_marker(r, i, is_rejected=True)
+
+        snapshots = []
+        for name, path in planned:
+            self.display.View.SetProj(SNAPSHOT_VIEWS[name])
+            self.display.FitAll()
+            self.display.View.Dump(path)
+            snapshots.append((name, path))
+        print(f"📸 {len(snapshots)} vistas guardadas en: {output_dir}")
+        sys.stdout.flush()
+        return snapshots
+
+    def _marker_geometry(self, item, is_rejected):
+        c = item['analysis']['centroid']
+        radius = 2.0 if is_rejected else (6.0 if item.get('family_id', 'DEFAULT') == 'MERGED' else 4.0)
+        return gp_Pnt(c[0], c[1], c[2]), radius
+
     def _draw_marker(self, item, index, is_rejected):
         c = item['analysis']['centroid']
         pnt = gp_Pnt(c[0], c[1], c[2])
@@ -170,7 +320,9 @@ class ResultVisualizer:
 
         rgb = cfg['color']
         occ_color = Quantity_Color(rgb[0], rgb[1], rgb[2], Quantity_TOC_RGB)
-        sphere = BRepPrimAPI_MakeSphere(pnt, radius).Shape()
+        sphere = self._marker_shapes.get((is_rejected, index))
+        if sphere is None:
+            sphere = BRepPrimAPI_MakeSphere(pnt, radius).Shape()
         ais_sphere = AIS_Shape(sphere)
         
         self.display.Context.Display(ais_sphere, False)
@@ -178,9 +330,11 @@ class ResultVisualizer:
         
         self.ais_groups[group_id].append(ais_sphere)
         text_pos = gp_Pnt(c[0], c[1], c[2] + radius * 1.5)
-        self.display.DisplayMessage(text_pos, label, height=radius*0.8, message_color=(0,0,0))
+        text = self.display.DisplayMessage(text_pos, label, height=radius*0.8, message_color=(0,0,0))
+        self._markers[marker_key(item, is_rejected)] = (group_id, ais_sphere, text)
+        return group_id
 
-    def export_reports(self, original_filepath):
+    def export_reports(self, original_filepath, snapshots=None):
         if not original_filepath: base_name = "Sin_Nombre"
         else: base_name = os.path.splitext(os.path.basename(original_filepath))[0]
         
@@ -199,9 +353,111 @@ class ResultVisualizer:
                     "Radio": round(hs['analysis'].get('avg_radius', 0.0), 3)
                 })
             df = pd.DataFrame(data)
-            if not df.empty: df.to_excel(xlsx_filename, index=False)
+            if not df.empty:
+                with pd.ExcelWriter(xlsx_filename) as writer:
+                    df.to_excel(writer, index=False)
+                    if snapshots:
+                        # Hoja con enlaces a las capturas (rutas relativas al reporte)
+                        pd.DataFrame([{
+                            "Vista": name,
+                            "Imagen": f'=HYPERLINK("{os.path.relpath(path, output_dir)}", "{os.path.basename(path)}")'
+                        } for name, path in snapshots]).to_excel(writer, sheet_name="Vistas", index=False)
             print(f"💾 Reporte Excel guardado en: {xlsx_filename}")
             sys.stdout.flush()
         except Exception as e:
             print(f"❌ Error Excel: {e}")
-            sys.stdout.flush()
\ No newline at end of file
+            sys.stdout.flush()
+
+
+def snapshot_paths(original_filepath, views=None):
+    """Rutas [(vista, png)] de las capturas en Reportes/<pieza>/Vistas/ (se conocen antes de renderizar)."""
+    base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    output_dir = os.path.join("Reportes", base_name, "Vistas")
+    return [(name, os.path.join(output_dir, f"{base_name}_{name}.png")) for name in (views or SNAPSHOT_VIEWS)]
+
+
+def _stake_summary(stake):
+    """Copia mínima (serializable) de un stake para mandarla a otro proceso."""
+    analysis = stake['analysis']
+    return {
+        'cluster_id': stake.get('cluster_id', 'UNK'),
+        'family_id': stake.get('family_id', 'DEFAULT'),
+        'analysis': {'centroid': tuple(analysis['centroid']), 'avg_radius': analysis.get('avg_radius', 0.0)}
+    }
+
+
+def report_path(original_filepath):
+    """Ruta de Reporte_<pieza>.xlsx (la misma que usa export_reports)."""
+    base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+    return os.path.join("Reportes", base_name, f"Reporte_{base_name}.xlsx")
+
+
+def attach_snapshots(original_filepath, snapshots):
+    """
+    Reemplaza solo la hoja 'Vistas' de un Reporte_<pieza>.xlsx existente; la
+    hoja de stakes (la de la corrida que lo generó) queda intacta.
+    """
+    xlsx_filename = report_path(original_filepath)
+    output_dir = os.path.dirname(xlsx_filename)
+    try:
+        with pd.ExcelWriter(xlsx_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+            pd.DataFrame([{
+                "Vista": name,
+                "Imagen": f'=HYPERLINK("{os.path.relpath(path, output_dir)}", "{os.path.basename(path)}")'
+            } for name, path in snapshots]).to_excel(writer, sheet_name="Vistas", index=False)
+        print(f"💾 Vistas añadidas a: {xlsx_filename}")
+    except Exception as e:
+        print(f"❌ Error Excel: {e}")
+    sys.stdout.flush()
+
+
+def _render_worker(job):
+    """
+    Proceso del pool: carga su propio STEP (las formas OCC no se serializan) y
+    renderiza. Si la pieza ya tiene reporte solo se actualiza su hoja 'Vistas'.
+    """
+    from src.events import EventBus
+    from src.geometry import GeometryProcessor
+    step_file, stakes, views, size, config = job
+    events = EventBus(quiet=True)
+    geo = GeometryProcessor(step_file, events=events)
+    geo.load_step()
+    if stakes is None:
+        from src.api import detect
+        stakes = [_stake_summary(s) for s in detect(geo.shape, config=config, events=events).stakes]
+
+    viz = ResultVisualizer(geo.shape, stakes, [])
+    snapshots = viz.render_snapshots(step_file, views=views, size=size)
+    if os.path.exists(report_path(step_file)):
+        attach_snapshots(step_file, snapshots)
+    else:
+        viz.export_reports(step_file, snapshots)
+    return step_file, snapshots
+
+
+def render_parts(jobs, workers=None, views=None, size=(1024, 768), config=None):
+    """
+    Renderiza capturas de muchas piezas en paralelo (un proceso por núcleo).
+    jobs: lista de (step_file, stakes); con stakes=None la detección corre en el
+    worker con 'config' (claves de api.DEFAULT_CONFIG, las de la corrida original).
+    Devuelve {step_file: [(vista, ruta), ...]}; las piezas que fallan quedan fuera.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    payload = [(step_file, None if stakes is None else [_stake_summary(s) for s in stakes], views, size, config)
+               for step_file, stakes in jobs]
+    results = {}
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {pool.submit(_render_worker, job): job[0] for job in payload}
+        for future in as_completed(futures):
+            step_file = futures[future]
+            try:
+                _, snapshots = future.result()
+                results[step_file] = snapshots
+                print(f"✓ {os.path.basename(step_file)}: {len(snapshots)} vistas")
+            except Exception as e:
+                print(f"❌ {os.path.basename(step_file)}: {e}")
+            sys.stdout.flush()
+    return results
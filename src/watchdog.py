@@ -0,0 +1,206 @@
+# src/watchdog.py
+import os
+import time
+import tempfile
+import multiprocessing
+from src.events import default_bus
+
+
+class FaceWatchdog:
+    """
+    Presupuesto de tiempo por llamada OCC costosa y límite global por archivo.
+
+    Modos:
+      'sandbox' : la llamada corre en un subproceso aislado; si no responde a
+                  tiempo el subproceso se mata (y se relanza) y la cara se omite.
+                  Es el único modo que puede cortar una cara que no termina.
+      'flag'    : solo informe. La llamada corre en el proceso principal y no
+                  se puede interrumpir: si excede el presupuesto la cara queda
+                  en el reporte de cuarentena y solo se omiten las operaciones
+                  posteriores sobre esa misma cara (p. ej. el CoG tras el
+                  conteo espacial). Útil para perfilar sin subproceso.
+
+    El reloj del deadline arranca al crear el watchdog (incluye la carga del STEP).
+    Cuando vence el deadline, run() ya no ejecuta nada y devuelve (False, None)
+    para que el pipeline termine con resultados parciales.
+    """
+
+    def __init__(self, budget=2.0, deadline=None, mode='sandbox', events=None):
+        if mode not in ('flag', 'sandbox'):
+            raise ValueError(f"Modo de watchdog desconocido: {mode}")
+        self.events = events or default_bus
+        self.budget = budget
+        self.deadline = deadline
+        self.mode = mode
+        self.quarantined = []
+        self.skipped_after_deadline = 0
+        self._slow_faces = set()
+        self._t0 = time.perf_counter()
+        self._shape = None
+        self._sandbox = None
+        self._brep_path = None
+
+    def attach(self, shape):
+        """Asocia la forma cargada; en modo sandbox lanza el subproceso aislado."""
+        self._shape = shape
+        if self.mode == 'sandbox' and shape is not None:
+            self._spawn_sandbox()
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def expired(self):
+        return self.deadline is not None and self.elapsed() > self.deadline
+
+    def run(self, op, cyl, fn):
+        """
+        Ejecuta una operación costosa sobre la cara del cilindro 'cyl'.
+        Devuelve (ok, resultado); ok=False si se omitió (deadline vencido, cara ya
+        en cuarentena o subproceso sin respuesta dentro del presupuesto).
+        """
+        face_index = cyl.get('face_index')
+        if self.expired():
+            self.skipped_after_deadline += 1
+            return False, None
+        if face_index in self._slow_faces:
+            return False, None
+
+        if self.mode == 'sandbox' and self._sandbox is not None:
+            return self._run_sandboxed(op, cyl)
+
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        if elapsed > self.budget:
+            self._quarantine(op, cyl, elapsed, 'lenta')
+        return True, result
+
+    def _quarantine(self, op, cyl, elapsed, status):
+        face_index = cyl.get('face_index')
+        self._slow_faces.add(face_index)
+        location = cyl.get('axis_location', (float('nan'),) * 3)
+        self.quarantined.append({
+            'face_index': face_index,
+            'op': op,
+            'elapsed': round(elapsed, 3),
+            'status': status,
+            'radius': cyl.get('radius', float('nan')),
+            'location': location
+        })
+        self.events.message(f"   ⏱️ Cara {face_index} en cuarentena ({op}, {elapsed:.1f}s, {status})", hot=True)
+
+    # --- Subproceso aislado ---
+    def _spawn_sandbox(self):
+        from OCC.Core.BRepTools import breptools
+        if self._brep_path is None:
+            fd, self._brep_path = tempfile.mkstemp(suffix=".brep")
+            os.close(fd)
+            breptools.Write(self._shape, self._brep_path)
+
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_sandbox_worker, args=(self._brep_path, child), daemon=True)
+        proc.start()
+        self._sandbox = (proc, parent, False)
+
+    def _wait_ready(self):
+        proc, conn, ready = self._sandbox
+        if ready:
+            return True
+        # La carga del BREP no cuenta contra el presupuesto de la cara, sí contra el deadline
+        while not conn.poll(0.1):
+            if self.expired() or not proc.is_alive():
+                return False
+        conn.recv()
+        self._sandbox = (proc, conn, True)
+        return True
+
+    def _run_sandboxed(self, op, cyl):
+        if not self._wait_ready():
+            return False, None
+        proc, conn, _ = self._sandbox
+        start = time.perf_counter()
+        conn.send((op, cyl.get('face_index')))
+        budget = self.budget
+        if self.deadline is not None:
+            budget = min(budget, max(0.0, self.deadline - self.elapsed()))
+        if conn.poll(budget):
+            return True, conn.recv()
+
+        proc.kill()
+        proc.join()
+        self._quarantine(op, cyl, time.perf_counter() - start, 'omitida')
+        self._spawn_sandbox()
+        return False, None
+
+    def close(self):
+        if self._sandbox is not None:
+            proc, conn, _ = self._sandbox
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            proc.join(timeout=1.0)
+            if proc.is_alive():
+                proc.kill()
+            self._sandbox = None
+        if self._brep_path and os.path.exists(self._brep_path):
+            os.remove(self._brep_path)
+            self._brep_path = None
+
+    def export_quarantine(self, original_filepath):
+        """Guarda las caras en cuarentena en Reportes/<pieza>/Cuarentena_<pieza>.csv."""
+        if not self.quarantined:
+            return None
+        import pandas as pd
+        base_name = os.path.splitext(os.path.basename(original_filepath or "Sin_Nombre"))[0]
+        output_dir = os.path.join("Reportes", base_name)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"Cuarentena_{base_name}.csv")
+
+        data = []
+        for q in self.quarantined:
+            loc = q['location']
+            data.append({
+                "Cara": q['face_index'], "Operacion": q['op'], "Segundos": q['elapsed'],
+                "Estado": q['status'], "Radio": round(q['radius'], 3),
+                "X": round(loc[0], 3), "Y": round(loc[1], 3), "Z": round(loc[2], 3)
+            })
+        pd.DataFrame(data).to_csv(path, index=False)
+        print(f"💾 Caras en cuarentena guardadas en: {path}")
+        return path
+
+    def print_summary(self):
+        if self.expired():
+            print(f"⚠️ Límite de {self.deadline:.0f}s alcanzado: resultados PARCIALES "
+                  f"({self.skipped_after_deadline} operaciones omitidas)")
+        if self.quarantined:
+            print(f"⚠️ Caras en cuarentena: {len(self.quarantined)}")
+
+
+def _sandbox_worker(brep_path, conn):
+    """Subproceso: carga la forma desde BREP y atiende operaciones por índice de cara."""
+    from OCC.Core.BRepTools import breptools
+    from OCC.Core.BRep import BRep_Builder
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from src.geometry import GeometryProcessor, exact_center
+
+    shape = TopoDS_Shape()
+    breptools.Read(shape, brep_path, BRep_Builder())
+    geo = GeometryProcessor(None)
+    geo.shape = shape
+    geo._cache_all_planes()
+    conn.send('ready')
+
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        op, face_index = msg
+        face = geo.get_face(face_index)
+        if op == 'spatial':
+            conn.send(geo._count_connected_planes_spatial(face))
+        elif op == 'cog':
+            conn.send(exact_center(face))
+        else:
+            conn.send(None)
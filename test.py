@@ -1,29 +1,105 @@
 # diagnostico.py
 """
 Script de diagnóstico para verificar por qué la fusión no funciona.
-Ejecuta: python diagnostico.py tu_archivo.step
+Ejecuta: python test.py tu_archivo.step [--factor 1.5] [--output pares.csv]
+
+Solo se evalúan pares de stakes vecinos (búsqueda por rejilla, sin doble bucle)
+y se guarda una tabla compacta con los candidatos a fusión y los casi-candidatos
+(distancia menor que factor × umbral de la regla vigente en FamilyMerger.merge_rules).
 """
 import sys
+import os
 import argparse
+import numpy as np
+import pandas as pd
 from src.geometry import GeometryProcessor
 from src.analyzer import HeatStakeAnalyzer
-import numpy as np
+from src.family_merger import FamilyMerger
+from src.clustering import radius_pairs
+
+DEFAULT_RULE_DISTANCE = 20.0  # Mismo valor por defecto que FamilyMerger._process_fusion_rule
+
+def rule_matrix(merger, families):
+    """
+    Umbral de fusión vigente para cada par de familias (NaN = la combinación
+    no está en fusion_priority y el merger nunca la evalúa).
+    """
+    index = {f: k for k, f in enumerate(families)}
+    thresholds = np.full((len(families), len(families)), np.nan)
+    for family1, family2 in merger.fusion_priority:
+        if family1 not in index or family2 not in index:
+            continue
+        value = merger.merge_rules.get(f"{family1}+{family2}", DEFAULT_RULE_DISTANCE)
+        a, b = index[family1], index[family2]
+        thresholds[a, b] = thresholds[b, a] = value
+    return thresholds
+
+def fusion_pairs(stakes, merger, factor):
+    """Tabla de pares vecinos con sus separaciones XZ, Y, Z y el estado frente a la regla."""
+    centroids = np.array([s['analysis']['centroid'] for s in stakes], dtype=float).reshape(-1, 3)
+    families = np.array([s.get('family_id', 'DEFAULT') for s in stakes])
+    names, fam_idx = np.unique(families, return_inverse=True)
+    thresholds = rule_matrix(merger, names)
+
+    # Radio de búsqueda: el mayor umbral de cualquier regla (o el de defecto) por el factor
+    known = list(merger.merge_rules.values()) + [DEFAULT_RULE_DISTANCE]
+    i, j = radius_pairs(centroids, factor * max(known))
 
-def distance_xz(p1, p2):
-    """Distancia en plano horizontal."""
-    dx = p1[0] - p2[0]
-    dz = p1[2] - p2[2]
-    return np.sqrt(dx**2 + dz**2)
+    diff = centroids[i] - centroids[j]
+    dist = np.linalg.norm(diff, axis=1)
+    limit = thresholds[fam_idx[i], fam_idx[j]]
+    has_rule = ~np.isnan(limit)
+
+    status = np.full(len(i), 'SIN_REGLA', dtype=object)
+    status[has_rule & (dist < limit)] = 'CANDIDATO'
+    status[has_rule & (dist >= limit) & (dist < factor * limit)] = 'CASI'
+    keep = (status != 'SIN_REGLA') | (dist < factor * DEFAULT_RULE_DISTANCE)
+    keep &= ~(has_rule & (dist >= factor * limit))
+
+    with np.errstate(invalid='ignore'):
+        ratio = dist / limit
+    table = pd.DataFrame({
+        "Stake_A": [stakes[k]['cluster_id'] for k in i[keep]],
+        "Stake_B": [stakes[k]['cluster_id'] for k in j[keep]],
+        "Familia_A": families[i[keep]],
+        "Familia_B": families[j[keep]],
+        "Dist_3D": np.round(dist[keep], 3),
+        "Dist_XZ": np.round(np.hypot(diff[keep, 0], diff[keep, 2]), 3),
+        "Dif_Y": np.round(np.abs(diff[keep, 1]), 3),
+        "Dif_Z": np.round(np.abs(diff[keep, 2]), 3),
+        "Umbral": limit[keep],
+        "Relacion": np.round(ratio[keep], 3),
+        "Estado": status[keep]
+    })
+    return table.sort_values(["Estado", "Relacion", "Dist_3D"]).reset_index(drop=True)
+
+def save_table(table, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".parquet"):
+        try:
+            table.to_parquet(path, index=False)
+        except ImportError:
+            path = os.path.splitext(path)[0] + ".csv"
+            print("⚠️ Parquet no disponible (falta pyarrow), se guarda como CSV")
+            table.to_csv(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+    print(f"💾 Pares guardados en: {path}")
 
 def main():
     parser = argparse.ArgumentParser(description="Diagnóstico de Fusión")
     parser.add_argument("file", help="Archivo .step")
+    parser.add_argument("--factor", type=float, default=1.5,
+                        help="Se listan los pares con distancia < factor × umbral de su regla")
+    parser.add_argument("--eps", type=float, default=15.0, help="eps del clustering de respaldo")
+    parser.add_argument("--output", default=None, help="CSV o .parquet (por defecto en Reportes/<pieza>/)")
+    parser.add_argument("--top", type=int, default=10, help="Pares a mostrar en consola")
     args = parser.parse_args()
-    
+
     print("=" * 80)
     print("🔍 DIAGNÓSTICO DE FUSIÓN DE HEAT STAKES")
     print("=" * 80)
-    
+
     # Cargar geometría
     print("\n[1] Cargando geometría...")
     try:
@@ -34,98 +110,62 @@ def main():
     except Exception as e:
         print(f"❌ Error: {e}")
         return 1
-    
+
     # Analizar familias
     print("\n[2] Detectando familias...")
     analyzer = HeatStakeAnalyzer()
     topo_stakes, remaining = analyzer.analyze_topology(cylinders)
-    cluster_stakes, _ = analyzer.analyze_clusters_legacy(remaining, eps=15.0)
-    
+    cluster_stakes, _ = analyzer.analyze_clusters_legacy(remaining, eps=args.eps)
+
     all_stakes = topo_stakes + cluster_stakes
     print(f"✓ Familias detectadas: {len(all_stakes)}")
-    
+
     if not all_stakes:
         print("❌ No se detectaron familias. Fin del diagnóstico.")
         return 0
-    
-    # Análisis detallado
-    print("\n[3] Analizando posiciones y distancias...")
-    print("=" * 80)
-    
-    for i, stake in enumerate(all_stakes):
-        c = stake['analysis']['centroid']
-        fam = stake.get('family_id', stake['cluster_id'])
-        rad = stake['analysis'].get('avg_radius', 0)
-        
-        print(f"\n[{i+1}] {stake['cluster_id']} (Familia: {fam})")
-        print(f"    Centroide: X={c[0]:8.2f}, Y={c[1]:8.2f}, Z={c[2]:8.2f}")
-        print(f"    Radio promedio: {rad:.2f} mm")
-        print(f"    Cilindros: {stake['analysis'].get('num_cylinders', 0)}")
-    
-    # Matriz de distancias
-    print("\n" + "=" * 80)
-    print("\n[4] Matriz de Distancias (para detectar pares):")
-    print("=" * 80)
-    print("\nCriterios de fusión:")
-    print("   • Distancia XZ < 12.0 mm")
-    print("   • Diferencia Y < 8.0 mm")
-    print("   • Diferencia Z < 40.0 mm")
-    print("\n" + "-" * 80)
-    
-    found_pairs = []
-    
-    for i, stake_a in enumerate(all_stakes):
-        ca = stake_a['analysis']['centroid']
-        
-        for j, stake_b in enumerate(all_stakes):
-            if i >= j:  # Evitar duplicados
-                continue
-            
-            cb = stake_b['analysis']['centroid']
-            
-            dist_xz = distance_xz(ca, cb)
-            dist_y = abs(ca[1] - cb[1])
-            dist_z = abs(ca[2] - cb[2])
-            
-            print(f"\n{stake_a['cluster_id']} vs {stake_b['cluster_id']}:")
-            print(f"   Distancia XZ: {dist_xz:6.2f} mm {'✓' if dist_xz < 12.0 else '✗'}")
-            print(f"   Diferencia Y: {dist_y:6.2f} mm {'✓' if dist_y < 8.0 else '✗'}")
-            print(f"   Diferencia Z: {dist_z:6.2f} mm {'✓' if dist_z < 40.0 else '✗'}")
-            
-            if dist_xz < 12.0 and dist_y < 8.0 and dist_z < 40.0:
-                print(f"   ✅ CANDIDATOS A FUSIÓN")
-                found_pairs.append((i, j, dist_xz))
-            else:
-                print(f"   ❌ No cumplen criterios")
-    
-    # Resumen
+
+    # Reglas vigentes del merger
+    merger = FamilyMerger()
+    print("\n[3] Reglas de fusión vigentes (FamilyMerger):")
+    for family1, family2 in merger.fusion_priority:
+        value = merger.merge_rules.get(f"{family1}+{family2}", DEFAULT_RULE_DISTANCE)
+        print(f"   • {family1}+{family2}: distancia 3D < {value:.1f} mm")
+
+    # Pares vecinos
+    print(f"\n[4] Buscando pares vecinos (factor {args.factor})...")
+    table = fusion_pairs(all_stakes, merger, args.factor)
+    counts = table["Estado"].value_counts()
+
     print("\n" + "=" * 80)
     print("\n[5] RESUMEN DEL DIAGNÓSTICO")
     print("=" * 80)
-    print(f"\nFamilias totales: {len(all_stakes)}")
-    print(f"Pares candidatos a fusión: {len(found_pairs)}")
-    
-    if found_pairs:
-        print("\n✅ Se detectaron pares que DEBERÍAN fusionarse:")
-        for idx_a, idx_b, dist in found_pairs:
-            print(f"   • {all_stakes[idx_a]['cluster_id']} + {all_stakes[idx_b]['cluster_id']} (dist={dist:.2f}mm)")
-        print("\n🔧 La fusión debería funcionar correctamente.")
-        print("   Si ves 2 esferas, ejecuta con --debug para más info:")
-        print(f"   python main.py {args.file} --view --debug")
-    else:
-        print("\n⚠️ NO se detectaron pares cercanos.")
-        print("\nPosibles causas:")
-        print("   1. Las familias están muy separadas (>12mm en XZ)")
-        print("   2. Diferentes alturas Y (>8mm de diferencia)")
-        print("   3. Muy distantes verticalmente (>40mm en Z)")
-        print("\nSoluciones:")
-        print("   • Edita src/merger.py y aumenta los límites:")
-        print("     self.MAX_DISTANCE_XZ = 20.0  # Aumentar si están lejos")
-        print("     self.MAX_DISTANCE_Y = 15.0")
-        print("     self.MAX_DISTANCE_Z = 50.0")
-    
+    print(f"\nStakes totales: {len(all_stakes)}")
+    print(f"Pares candidatos a fusión: {counts.get('CANDIDATO', 0)}")
+    print(f"Pares casi candidatos: {counts.get('CASI', 0)}")
+    print(f"Pares cercanos sin regla: {counts.get('SIN_REGLA', 0)}")
+
+    if len(table):
+        by_rule = table.groupby(["Familia_A", "Familia_B", "Estado"]).size()
+        print("\nPor combinación de familias:")
+        for (fam_a, fam_b, status), n in by_rule.items():
+            print(f"   • {fam_a} + {fam_b} [{status}]: {n}")
+
+        print(f"\nPares más cercanos a su umbral (máx. {args.top}):")
+        for _, row in table.head(args.top).iterrows():
+            print(f"   • {row['Stake_A']} + {row['Stake_B']} | d={row['Dist_3D']:.2f}mm "
+                  f"(XZ {row['Dist_XZ']:.2f}, Y {row['Dif_Y']:.2f}, Z {row['Dif_Z']:.2f}) | {row['Estado']}")
+
+    if counts.get('CASI', 0):
+        print("\n🔧 Hay pares justo por encima del umbral: ajusta merge_rules en src/family_merger.py")
+    if counts.get('SIN_REGLA', 0):
+        print("🔧 Hay pares cercanos de familias sin regla: añade la combinación a fusion_priority")
+
+    base_name = os.path.splitext(os.path.basename(args.file))[0]
+    output = args.output or os.path.join("Reportes", base_name, f"Fusion_{base_name}.csv")
+    save_table(table, output)
+
     print("\n" + "=" * 80)
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
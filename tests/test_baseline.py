@@ -0,0 +1,37 @@
+# tests/test_baseline.py
+import sys
+import numpy as np
+import compare_baseline
+from src.results_store import ResultsStore
+from src.baseline import load_source
+
+
+def fill(root, offset=0.0):
+    store = ResultsStore(str(root))
+    centroids = np.array([[0.0, 0.0, 0.0], [100.0, 0.0, 0.0]]) + offset
+    store.append_arrays("PIEZA", {'stake_ids': np.array(['GRP1-1', 'GRP1-2']),
+                                  'stake_families': np.array(['GRP1', 'GRP1']),
+                                  'stake_centroids': centroids, 'stake_radii': np.full(2, 2.5)})
+
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['compare_baseline.py', *map(str, argv)])
+    return compare_baseline.main()
+
+
+def test_store_without_compaction_is_read(tmp_path):
+    fill(tmp_path / "base")
+    assert not (tmp_path / "base" / "manifest.json").exists()
+    assert list(load_source(str(tmp_path / "base"))) == ["PIEZA"]
+
+
+def test_store_difference_fails_the_gate(tmp_path, monkeypatch):
+    fill(tmp_path / "base")
+    fill(tmp_path / "cur", offset=50.0)
+    assert run(monkeypatch, tmp_path / "base", tmp_path / "cur") != 0
+
+
+def test_nothing_compared_is_not_a_pass(tmp_path, monkeypatch):
+    (tmp_path / "vacia").mkdir()
+    fill(tmp_path / "cur")
+    assert run(monkeypatch, tmp_path / "vacia", tmp_path / "cur") != 0
@@ -0,0 +1,33 @@
+# tests/test_coaxial.py
+import numpy as np
+from src.coaxial import coaxial_labels, axis_points, stake_axis
+
+
+def split_wall(x, y, r=3.0, z=5.0):
+    """Pared de un boss partida en dos mitades (como en muchos STEP): CoG a ±2r/π del eje."""
+    off = 2.0 * r / np.pi
+    return [
+        {'center': (x + off, y, z), 'axis_location': (x, y, 0.0), 'direction': (0.0, 0.0, 1.0), 'radius': r},
+        {'center': (x - off, y, z), 'axis_location': (x, y, 0.0), 'direction': (0.0, 0.0, 1.0), 'radius': r},
+    ]
+
+
+def test_split_halves_share_axis():
+    cyls = split_wall(10.0, 20.0) + split_wall(40.0, 20.0)
+    points = np.array([c['center'] for c in cyls])
+    directions = np.array([c['direction'] for c in cyls])
+    labels = coaxial_labels(points, directions, radial_tolerance=0.5, on_axis=axis_points(cyls))
+    assert labels[0] == labels[1] and labels[2] == labels[3]
+    assert labels[0] != labels[2]
+
+
+def test_records_without_axis_location_fall_back_to_center():
+    cyls = [{'center': (1.0, 2.0, 3.0), 'direction': (0.0, 0.0, 1.0)}]
+    assert np.allclose(axis_points(cyls), [[1.0, 2.0, 3.0]])
+
+
+def test_stake_axis_point_lies_on_axis():
+    stake = {'cylinders': split_wall(10.0, 20.0), 'analysis': {'centroid': (10.0, 20.0 + 0.3, 5.0)}}
+    axis, point = stake_axis(stake)
+    assert np.allclose(np.abs(axis), [0.0, 0.0, 1.0])
+    assert np.allclose(point, [10.0, 20.0, 5.0])
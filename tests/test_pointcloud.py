@@ -0,0 +1,58 @@
+# tests/test_pointcloud.py
+import numpy as np
+from sklearn.neighbors import KDTree
+from src.pointcloud import PointCloudProcessor, voxel_downsample
+from src.events import EventBus
+
+
+def hollow_boss_scan(r_out=2.65, r_in=2.35, height=8.0, seed=0, noise=0.02):
+    """Boss hueco de pared fina sobre una placa: paredes con normales hacia afuera del material."""
+    rng = np.random.default_rng(seed)
+    points, normals = [], []
+    for r, sign in ((r_out, 1.0), (r_in, -1.0)):
+        n = int(2 * np.pi * r * height * 8)
+        a, z = rng.uniform(0, 2 * np.pi, n), rng.uniform(0, height, n)
+        u = np.column_stack([np.cos(a), np.sin(a), np.zeros(n)])
+        points.append(r * u + np.column_stack([np.zeros((n, 2)), z]) + rng.normal(0, noise, (n, 3)))
+        normals.append(sign * u)
+    m = 4000
+    a, rr = rng.uniform(0, 2 * np.pi, m), np.sqrt(rng.uniform(r_in ** 2, r_out ** 2, m))
+    points.append(np.column_stack([rr * np.cos(a), rr * np.sin(a), np.full(m, height)]))
+    normals.append(np.tile([0.0, 0.0, 1.0], (m, 1)))
+    m = 60000
+    points.append(np.column_stack([rng.uniform(-10, 110, m), rng.uniform(-10, 10, m), np.zeros(m)]))
+    normals.append(np.tile([0.0, 0.0, 1.0], (m, 1)))
+    return np.vstack(points), np.vstack(normals)
+
+
+def processor(points=None, normals=None, seed=0):
+    geo = PointCloudProcessor('escaneo.xyz', events=EventBus(quiet=True))
+    geo.seed = seed
+    if points is not None:
+        points, normals = voxel_downsample(points, normals, geo.VOXEL_SIZE)
+        geo.points, geo.normals, geo.tree = points, normals, KDTree(points)
+    return geo
+
+
+def record(radius, t0=0.0, t1=8.0):
+    return {'center': (0.0, 0.0, 0.5 * (t0 + t1)), 'radius': radius, 'height': t1 - t0,
+            'direction': (0.0, 0.0, 1.0), 'axis_location': (0.0, 0.0, t0), 'inliers': 500}
+
+
+def test_no_phantom_between_thin_walls():
+    points, normals = hollow_boss_scan(seed=2)
+    radii = [r['radius'] for r in processor(points, normals, seed=2).extract_features()]
+    assert not any(2.4 < r < 2.6 for r in radii), radii
+
+
+def test_deduplicate_drops_record_between_coaxial_walls():
+    kept = processor()._deduplicate([record(2.8), record(2.2), record(2.5)])
+    assert sorted(r["radius"] for r in kept) == [2.2, 2.8]
+
+
+def test_harmonize_radii_does_not_chain():
+    records = [record(r) for r in (2.0, 2.1, 2.2, 2.3, 2.4)]
+    processor()._harmonize_radii(records)
+    radii = [r['radius'] for r in records]
+    assert max(radii) - min(radii) > 0.15
+    assert len(set(radii)) >= 2
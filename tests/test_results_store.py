@@ -0,0 +1,57 @@
+# tests/test_results_store.py
+import numpy as np
+from src.results_store import ResultsStore
+
+
+def arrays(n, rng, family='GRP1'):
+    return {'stake_ids': np.array([f"{family}-{k + 1}" for k in range(n)]),
+            'stake_families': np.array([family] * n),
+            'stake_centroids': rng.uniform(0, 100, (n, 3)),
+            'stake_radii': np.full(n, 2.5)}
+
+
+def test_append_compacts_and_reopens_from_log(tmp_path):
+    rng = np.random.default_rng(0)
+    store = ResultsStore(str(tmp_path), auto_compact=4)
+    for i in range(10):
+        store.append_arrays(f"P{i % 6}", arrays(5, rng))
+    assert len(store.manifest['segments']) <= 4 + 1
+
+    reopened = ResultsStore(str(tmp_path), auto_compact=4)
+    assert reopened.parts() == [f"P{i}" for i in range(6)]
+    assert reopened.manifest['parts'] == store.manifest['parts']
+    # Las piezas reemplazadas solo cuentan una vez
+    everything = reopened.query_box((-1, -1, -1), (101, 101, 101))
+    assert len(everything['radius']) == 6 * 5
+
+
+def test_replaced_part_hides_old_rows(tmp_path):
+    rng = np.random.default_rng(1)
+    store = ResultsStore(str(tmp_path), auto_compact=0)
+    store.append_arrays("A", arrays(3, rng, 'OLD'))
+    store.append_arrays("A", arrays(2, rng, 'NEW'))
+    result = ResultsStore(str(tmp_path)).query_box((-1, -1, -1), (101, 101, 101))
+    assert sorted(set(result['family'].tolist())) == ['NEW']
+    assert len(result['radius']) == 2
+
+
+def _append_worker(root, worker, n_parts):
+    rng = np.random.default_rng(worker)
+    store = ResultsStore(root, auto_compact=3)
+    for i in range(n_parts):
+        store.append_arrays(f"W{worker}-{i}", arrays(4, rng))
+
+
+def test_concurrent_writers_keep_every_part(tmp_path):
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_append_worker, args=(str(tmp_path), w, 12)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    store = ResultsStore(str(tmp_path))
+    assert store.parts() == sorted(f"W{w}-{i}" for w in range(4) for i in range(12))
+    assert len(store.query_box((-1, -1, -1), (101, 101, 101))['radius']) == 4 * 12 * 4
@@ -0,0 +1,22 @@
+# tests/test_retune.py
+from src.retune import diff_markers, marker_key
+
+
+def stake(family, cluster_id, centroid):
+    return {'family_id': family, 'cluster_id': cluster_id, 'analysis': {'centroid': centroid}}
+
+
+def test_renumbered_stakes_keep_their_markers():
+    before = [stake('GRP1', 'GRP1-1', (0.0, 0.0, 0.0)), stake('GRP1', 'GRP1-2', (50.0, 0.0, 0.0))]
+    # Al re-fusionar desaparece el primero y el segundo pasa a ser GRP1-1
+    after = [stake('GRP1', 'GRP1-1', (50.0, 0.0, 0.0))]
+    removed, added = diff_markers({marker_key(s) for s in before}, after)
+    assert removed == [marker_key(before[0])]
+    assert added == []
+
+
+def test_family_change_redraws_marker():
+    before = [stake('GRP1', 'GRP1-1', (0.0, 0.0, 0.0))]
+    after = [stake('MERGED', 'MERGED-1', (0.0, 0.0, 0.0))]
+    removed, added = diff_markers({marker_key(s) for s in before}, after)
+    assert len(removed) == 1 and len(added) == 1
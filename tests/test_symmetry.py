@@ -0,0 +1,98 @@
+# tests/test_symmetry.py
+import numpy as np
+from src.symmetry import find_mirror_plane, split_halves, release_near_breakers, MIN_MATCH
+
+CYLINDER, PLANE = 1, 0
+
+
+def hollow_boss_panel(n_pairs=100, with_bores=True, seed=0):
+    """
+    Panel simétrico respecto de X = 0: pares de bosses huecos espejados.
+    Pared exterior (r=3) y agujero (r=2) de igual altura comparten el
+    centro del bbox; cada boss lleva además una aleta plana.
+    """
+    rng = np.random.default_rng(seed)
+    types, boxes, params = [], [], []
+    for _ in range(n_pairs):
+        x, y, height = rng.uniform(20, 400), rng.uniform(0, 300), rng.uniform(4, 10)
+        for sign in (-1.0, 1.0):
+            cx = sign * x
+            walls = [3.0, 2.0] if with_bores else [3.0]
+            for r in walls:
+                types.append(CYLINDER)
+                boxes.append([cx - r, y - r, 0.0, cx + r, y + r, height])
+                params.append(r)
+            types.append(PLANE)
+            boxes.append([cx - 0.5, y + 3.0, 0.0, cx + 0.5, y + 8.0, height])
+            params.append(np.nan)
+    return np.array(types), np.array(boxes), np.array(params)
+
+
+def test_coaxial_same_height_faces_are_matched():
+    types, boxes, params = hollow_boss_panel()
+    plane, scores = find_mirror_plane(types, boxes, params)
+    assert plane is not None, scores
+    assert plane['axis'] == 0 and abs(plane['offset']) < 1e-9
+    assert scores['X'] >= MIN_MATCH
+
+    analyze, mirror_of = split_halves(types, boxes, params, plane)
+    # Cada cara de la mitad negativa tiene su espejo: solo se extrae esa mitad
+    assert len(mirror_of) == len(types) // 2
+    assert int(analyze.sum()) == len(types) // 2
+    for i, j in mirror_of.items():
+        assert types[i] == types[j]
+        assert np.isnan(params[i]) and np.isnan(params[j]) or params[i] == params[j]
+
+
+def test_symmetry_breaker_is_extracted():
+    types, boxes, params = hollow_boss_panel(n_pairs=20)
+    # Aleta extra solo en la mitad positiva
+    types = np.append(types, PLANE)
+    boxes = np.vstack([boxes, [100.0, 50.0, 0.0, 101.0, 55.0, 5.0]])
+    params = np.append(params, np.nan)
+    plane, _ = find_mirror_plane(types, boxes, params)
+    analyze, mirror_of = split_halves(types, boxes, params, plane)
+    assert analyze[-1]
+    assert len(types) - 1 not in mirror_of.values()
+
+
+def test_asymmetric_part_has_no_plane():
+    types, boxes, params = hollow_boss_panel(n_pairs=50)
+    keep = boxes[:, 0] < 0  # Solo la mitad negativa
+    plane, _ = find_mirror_plane(types[keep], boxes[keep], params[keep])
+    assert plane is None
+
+
+def test_mirrored_cylinder_next_to_breaker_is_released():
+    types, boxes, params = hollow_boss_panel(n_pairs=20)
+    plane, _ = find_mirror_plane(types, boxes, params)
+    # Aleta extra pegada a la pared exterior de un boss de la mitad positiva
+    wall = next(j for j in range(len(types)) if types[j] == CYLINDER and params[j] == 3.0 and boxes[j, 0] > 0)
+    x1, y0 = boxes[wall, 3], boxes[wall, 1]
+    types = np.append(types, PLANE)
+    boxes = np.vstack([boxes, [x1, y0 + 2.0, 0.0, x1 + 4.0, y0 + 2.5, 5.0]])
+    params = np.append(params, np.nan)
+
+    analyze, mirror_of = split_halves(types, boxes, params, plane)
+    assert not analyze[wall]
+    released = release_near_breakers(boxes, plane, analyze, mirror_of)
+    assert released >= 1
+    assert analyze[wall] and wall not in mirror_of.values()
+
+
+def test_negative_cylinder_next_to_breaker_is_released():
+    types, boxes, params = hollow_boss_panel(n_pairs=20)
+    plane, _ = find_mirror_plane(types, boxes, params)
+    # Aleta extra pegada a la pared exterior de un boss de la mitad negativa
+    wall = next(i for i in range(len(types)) if types[i] == CYLINDER and params[i] == 3.0 and boxes[i, 0] < 0)
+    x0, y0 = boxes[wall, 0], boxes[wall, 1]
+    types = np.append(types, PLANE)
+    boxes = np.vstack([boxes, [x0 - 4.0, y0 + 2.0, 0.0, x0, y0 + 2.5, 5.0]])
+    params = np.append(params, np.nan)
+
+    analyze, mirror_of = split_halves(types, boxes, params, plane)
+    assert wall in mirror_of
+    twin = mirror_of[wall]
+    released = release_near_breakers(boxes, plane, analyze, mirror_of)
+    assert released >= 1
+    assert wall not in mirror_of and analyze[wall] and analyze[twin]